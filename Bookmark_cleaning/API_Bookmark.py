@@ -1,9 +1,15 @@
 from flask import Flask, request, send_file, jsonify, render_template_string
 from werkzeug.utils import secure_filename
 import os
+import sys
 import tempfile
 from datetime import datetime
-from pdfixsdk import GetPdfix, kSaveFull
+from pdfixsdk import GetPdfix
+
+from bookmark_filter import compile_filters, filter_outline
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pdfix_save import save_doc
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
@@ -19,32 +25,10 @@ def remove_filtered_bookmarks(input_pdf, output_pdf, filters):
     if doc is None:
         raise Exception("Failed to open PDF: " + pdfix.GetError())
 
-    root = doc.GetBookmarkRoot()
-    if root is not None:
-        filters_lower = [f.lower() for f in filters]
-
-        def clean(parent):
-            i = 0
-            count = parent.GetNumChildren()
-            while i < count:
-                child = parent.GetChild(i)
-                clean(child)
-                title = (child.GetTitle() or "").lower()
-                if any(f in title for f in filters_lower):
-                    sub_count = child.GetNumChildren()
-                    for s in range(sub_count):
-                        sub = child.GetChild(s)
-                        parent.AddChild(i, sub)
-                        i += 1
-                        count += 1
-                    parent.RemoveChild(i)
-                    count -= 1
-                    continue
-                i += 1
-
-        clean(root)
-
-    if not doc.Save(output_pdf, kSaveFull):
+    outline = filter_outline(doc, compile_filters(filters))
+
+    # outline-only edit: append the changed items instead of rewriting the file
+    if not save_doc(pdfix, doc, output_pdf, changes=outline[1] if outline else 0):
         err = pdfix.GetError()
         doc.Close()
         print("save Sccess")
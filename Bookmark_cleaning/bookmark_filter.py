@@ -0,0 +1,222 @@
+"""
+Compiled bookmark title filters.
+
+A filter list is compiled once into a TitleMatcher and reused for every
+bookmark of every document in a batch (compile_filters caches by filter
+list). Plain filters keep the old meaning, a case-insensitive substring of
+the title, and are matched together by one Aho-Corasick automaton, so a title
+costs about its own length however many filters there are. Two prefixes add
+rules that a substring cannot express; they are combined into one regex:
+
+    "outline placeholder"     substring (default)
+    "word:ch"                 whole word only ("ch" but not "chapter")
+    "re:^\\d+\\.pdf$"          regular expression, searched case-insensitively
+
+    matcher = compile_filters([".pdf", "outline placeholder"])
+    if matcher(bookmark.GetTitle()):
+        ...
+
+filter_outline(doc, matcher) applies a matcher to a whole PDFix document's
+outline, rewriting each bookmark's child chain once and touching only the
+items whose links change.
+"""
+
+import re
+from collections import deque
+from functools import lru_cache
+
+WORD_PREFIX = "word:"
+REGEX_PREFIX = "re:"
+
+
+class _AhoCorasick:
+    """Multi-substring automaton: does any pattern occur in a text."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._out = [False]
+        for pattern in patterns:
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(False)
+                state = nxt
+            self._out[state] = True
+
+        # failure links, breadth first; a state also matches if its fallback does
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] or self._out[self._fail[nxt]]
+
+    def search(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                return True
+        return False
+
+
+class TitleMatcher:
+    """Callable: True if a bookmark title matches any of the compiled filters."""
+
+    def __init__(self, filters):
+        literals, patterns = [], []
+        self.match_all = False
+        for f in filters:
+            if f.startswith(REGEX_PREFIX):
+                patterns.append(f[len(REGEX_PREFIX):])
+            elif f.startswith(WORD_PREFIX):
+                patterns.append(r"\b" + re.escape(f[len(WORD_PREFIX):].lower()) + r"\b")
+            elif f:
+                literals.append(f.lower())
+            else:
+                self.match_all = True        # "" is a substring of every title
+        self._automaton = _AhoCorasick(literals) if literals else None
+        self._regex = re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE) if patterns else None
+        self.filters = tuple(filters)
+
+    def __call__(self, title):
+        if self.match_all:
+            return True
+        title = (title or "").lower()
+        if self._automaton is not None and self._automaton.search(title):
+            return True
+        return self._regex is not None and self._regex.search(title) is not None
+
+    matches = __call__
+
+
+@lru_cache(maxsize=32)
+def _compile(filters):
+    return TitleMatcher(filters)
+
+
+def compile_filters(filters):
+    """TitleMatcher for a filter list; compiled once per distinct list."""
+    return _compile(tuple(filters))
+
+
+# --- outline rewrite ---------------------------------------------------------
+def _outline_kids(node, seen):
+    kid = node.GetDictionary("First")
+    while kid is not None and kid.GetId() not in seen:
+        seen.add(kid.GetId())
+        yield kid
+        kid = kid.GetDictionary("Next")
+
+
+def _put_ref(node, key, target, changed):
+    current = node.GetDictionary(key)
+    if current is None or current.GetId() != target.GetId():
+        node.Put(key, target)
+        changed.add(node.GetId())
+
+
+def _remove_key(node, key, changed):
+    if node.Get(key) is not None:
+        node.RemoveKey(key)
+        changed.add(node.GetId())
+
+
+def _relink(parent, children, changed):
+    """
+    Write `children` as the kid chain of `parent` (one rewrite per parent).
+    Only links that differ are written; ids of modified items go to `changed`.
+    """
+    for i, child in enumerate(children):
+        _put_ref(child, "Parent", parent, changed)
+        if i > 0:
+            _put_ref(child, "Prev", children[i - 1], changed)
+        else:
+            _remove_key(child, "Prev", changed)
+        if i < len(children) - 1:
+            _put_ref(child, "Next", children[i + 1], changed)
+        else:
+            _remove_key(child, "Next", changed)
+    if children:
+        _put_ref(parent, "First", children[0], changed)
+        _put_ref(parent, "Last", children[-1], changed)
+    else:
+        _remove_key(parent, "First", changed)
+        _remove_key(parent, "Last", changed)
+        if parent.GetNumber("Count"):
+            _remove_key(parent, "Count", changed)
+
+
+def filter_outline(doc, matcher):
+    """
+    Drop the bookmarks of a PDFix document whose title matches `matcher`
+    (a TitleMatcher); a dropped bookmark's children take its place.
+
+    Works on the outline dictionaries: one traversal computes the final child
+    list of every item, then each item's /First /Last and its children's
+    /Parent /Prev /Next /Count are written once, instead of shifting sibling
+    lists with AddChild/RemoveChild per moved bookmark; links that are
+    already right are left alone. Returns (bookmarks removed, outline items
+    modified) - the latter sizes the save (pdfix_save.save_doc) - or None if
+    the document has no outline.
+    """
+    catalog = doc.GetRootObject()
+    outlines = catalog.GetDictionary("Outlines") if catalog else None
+    if outlines is None:
+        return None
+    seen = set()
+    changed = set()
+    opened = set()          # ids of items given the children of a removed, open bookmark
+    removed = 0
+
+    def final_kids(node):
+        # children `node` ends up with; kept kids are relinked on the way back up
+        nonlocal removed
+        kept = []
+        for kid in list(_outline_kids(node, seen)):
+            grandkids = final_kids(kid)
+            if matcher(kid.GetText("Title")):
+                removed += 1
+                if grandkids and kid.GetNumber("Count") > 0:
+                    opened.add(node.GetId())
+                kept.extend(grandkids)
+            else:
+                _relink(kid, grandkids, changed)
+                kept.append(kid)
+        return kept
+
+    def count(node):
+        visible = 0
+        kid = node.GetDictionary("First")
+        while kid is not None:
+            n = count(kid)
+            visible += 1 + (n if kid.GetNumber("Count") > 0 else 0)
+            kid = kid.GetDictionary("Next")
+        if node is not outlines and visible:
+            old = node.GetNumber("Count")
+            # a former leaf shows its new children as the removed bookmark did
+            is_open = old > 0 if old else node.GetId() in opened
+            new = visible if is_open else -visible
+            if new != old:
+                node.PutNumber("Count", new)
+                changed.add(node.GetId())
+        return visible
+
+    _relink(outlines, final_kids(outlines), changed)
+    total = count(outlines)
+    if total and outlines.GetNumber("Count") != total:
+        outlines.PutNumber("Count", total)
+        changed.add(outlines.GetId())
+    return removed, len(changed)
@@ -0,0 +1,258 @@
+"""
+Background job queue for the bookmark filter web services (final.py,
+Bookmark_URL.py).
+
+An upload is saved to disk and handed to a pool of worker processes; the
+request returns a job id at once and the browser follows the job with
+/jobs/<id> (polling) or /jobs/<id>/events (server-sent events) before it
+downloads the result. Each worker process creates its PDFix instance once
+(pool initializer) and reuses it for every job, so a slow 300 MB book only
+occupies one worker instead of the Flask request thread every user shares.
+
+The work function must be a module-level function (it is pickled by name)
+taking (input_pdf, output_pdf, *args, pdfix=...). init_worker and
+call_with_pdfix give other process pools (code2.py folder mode) the same
+one-PDFix-per-worker setup.
+
+jobs_blueprint(jobs, ...) holds the routes both apps share (upload, job
+status, SSE events, download); an app only registers it:
+
+    app.register_blueprint(jobs_blueprint(jobs, filters))
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+DEFAULT_WORKERS = int(os.environ.get("BOOKMARK_WORKERS", "2"))
+JOB_TTL_SECONDS = 60 * 60          # finished jobs and their files are purged after an hour
+
+_worker_pdfix = None
+
+
+def init_worker():
+    """Process pool initializer: create this worker's PDFix instance."""
+    global _worker_pdfix
+    from pdfixsdk import GetPdfix
+    _worker_pdfix = GetPdfix()
+    if _worker_pdfix is None:
+        raise Exception("PDFix initialization failed")
+
+
+def call_with_pdfix(fn, *args):
+    """Run fn(*args, pdfix=<this worker's instance>) in an init_worker pool."""
+    return fn(*args, pdfix=_worker_pdfix)
+
+
+def _run_job(fn, input_pdf, output_pdf, args):
+    try:
+        call_with_pdfix(fn, input_pdf, output_pdf, *args)
+    finally:
+        try:
+            os.remove(input_pdf)
+        except OSError:
+            pass
+
+
+class JobQueue:
+    """
+    Jobs by id: {"status": "queued" | "running" | "done" | "error", "error",
+    "filename" (download name), "output_path", "submitted", "finished"}.
+    The process pool is started on the first submit, so importing the Flask
+    module in a worker process (spawn start method) does not start another.
+    When a worker dies (PDFix crash, failed init) the jobs on that pool fail
+    and the next submit gets a new pool.
+    """
+
+    def __init__(self, fn, max_workers=DEFAULT_WORKERS, initializer=init_worker):
+        self.fn = fn
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=self.initializer)
+        return self._executor
+
+    def _restart_pool(self, broken):
+        # called with self._lock held; only the first job to see the broken pool replaces it
+        if self._executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, input_pdf, output_pdf, download_name, *args):
+        self.purge()
+        job_id = uuid.uuid4().hex
+        job = {
+            "status": "queued",
+            "error": None,
+            "filename": download_name,
+            "output_path": output_pdf,
+            "submitted": time.time(),
+            "finished": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            pool = self._pool()
+            try:
+                job["future"] = pool.submit(_run_job, self.fn, input_pdf, output_pdf, args)
+            except BrokenProcessPool:
+                self._restart_pool(pool)
+                pool = self._pool()
+                job["future"] = pool.submit(_run_job, self.fn, input_pdf, output_pdf, args)
+        job["future"].add_done_callback(lambda fut, job=job, pool=pool: self._finished(job, fut, pool))
+        return job_id
+
+    def _finished(self, job, future, pool):
+        job["finished"] = time.time()
+        if future.cancelled():
+            job["status"], job["error"] = "error", "cancelled"
+        elif isinstance(future.exception(), BrokenProcessPool):
+            job["status"], job["error"] = "error", "worker process died, please upload the file again"
+            with self._lock:
+                self._restart_pool(pool)
+        elif future.exception() is not None:
+            job["status"], job["error"] = "error", str(future.exception())
+        else:
+            job["status"] = "done"
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """JSON-ready status of a job, or None for an unknown id."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        status = job["status"]
+        if status == "queued" and job["future"].running():
+            status = "running"
+        info = {"job_id": job_id, "status": status, "filename": job["filename"]}
+        if status == "queued":
+            info["position"] = sum(
+                1 for other in list(self._jobs.values())
+                if other["status"] == "queued" and not other["future"].running()
+                and other["submitted"] < job["submitted"]
+            )
+        if job["error"]:
+            info["error"] = job["error"]
+        if job["finished"]:
+            info["seconds"] = round(job["finished"] - job["submitted"], 1)
+        return info
+
+    def purge(self):
+        """Forget finished jobs older than JOB_TTL_SECONDS and delete their output."""
+        cutoff = time.time() - JOB_TTL_SECONDS
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items()
+                       if job["finished"] and job["finished"] < cutoff]
+            for jid in expired:
+                job = self._jobs.pop(jid)
+                try:
+                    os.remove(job["output_path"])
+                except OSError:
+                    pass
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def jobs_blueprint(jobs, *job_args):
+    """
+    Flask blueprint with the job routes. Uploads are saved to the app's
+    UPLOAD_FOLDER and queued as jobs.submit(input, output, download name,
+    *job_args):
+
+        POST /filter-bookmarks      -> {"success", "job_id"} (202)
+        GET  /jobs/<id>             -> JobQueue.status()
+        GET  /jobs/<id>/events      -> the same, as server-sent events
+        GET  /download/<id>         -> the result as <name>_output.pdf
+    """
+    # flask is only needed by the web apps, not by the folder / daemon tools
+    from flask import Blueprint, Response, current_app, jsonify, request, send_file
+    from werkzeug.utils import secure_filename
+
+    bp = Blueprint("bookmark_jobs", __name__)
+
+    @bp.route('/filter-bookmarks', methods=['POST'])
+    def filter_bookmarks():
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+
+        file = request.files['file']
+        if not file.filename.lower().endswith('.pdf'):
+            return jsonify({'success': False, 'error': 'File must be a PDF'}), 400
+
+        try:
+            upload_folder = current_app.config['UPLOAD_FOLDER']
+            filename = secure_filename(file.filename)
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            input_path = os.path.join(upload_folder, f"input_{stamp}_{filename}")
+
+            # Output file name: <name>_output.pdf (stored per upload, renamed on download)
+            name, ext = os.path.splitext(filename)
+            output_filename = f"{name}_output{ext}"
+            output_path = os.path.join(upload_folder, f"output_{stamp}_{filename}")
+
+            file.save(input_path)
+            job_id = jobs.submit(input_path, output_path, output_filename, *job_args)
+
+            return jsonify({'success': True, 'job_id': job_id}), 202
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @bp.route('/jobs/<job_id>')
+    def job_status(job_id):
+        info = jobs.status(job_id)
+        if info is None:
+            return jsonify({'success': False, 'error': 'Unknown job'}), 404
+        return jsonify(info)
+
+    @bp.route('/jobs/<job_id>/events')
+    def job_events(job_id):
+        if jobs.status(job_id) is None:
+            return jsonify({'success': False, 'error': 'Unknown job'}), 404
+
+        def stream():
+            last = None
+            while True:
+                info = jobs.status(job_id)
+                if info != last:
+                    yield f"data: {json.dumps(info)}\n\n"
+                    last = info
+                if info is None or info["status"] in ("done", "error"):
+                    return
+                time.sleep(1)
+
+        return Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @bp.route('/download/<job_id>')
+    def download_file(job_id):
+        job = jobs.get(job_id)
+        if job is None or job["status"] != "done":
+            return jsonify({'success': False, 'error': 'Result not available'}), 404
+        filename = job["filename"]
+
+        response = send_file(
+            job["output_path"],
+            as_attachment=True,
+            download_name=filename,
+            mimetype="application/pdf"
+        )
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        response.headers["Pragma"] = "no-cache"
+        response.headers["Expires"] = "0"
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    return bp
@@ -1,5 +1,7 @@
 import pypdf
 
+from bookmark_filter import compile_filters
+
 
 def remove_bookmarks(input_pdf, output_pdf, remove_items=None):
     """
@@ -10,7 +12,8 @@ def remove_bookmarks(input_pdf, output_pdf, remove_items=None):
         output_pdf (str): Path to output PDF file
         remove_items (list): List of strings to match. Can be exact titles or partial matches.
                             Example: [".pdf", "Outline placeholder"]
-                            Will remove any bookmark containing these strings.
+                            Will remove any bookmark containing these strings
+                            ("word:" / "re:" rules: see bookmark_filter.py).
     """
     try:
         # Read the PDF
@@ -44,7 +47,12 @@ def remove_bookmarks(input_pdf, output_pdf, remove_items=None):
         print(f"Error: {e}")
 
 
-def copy_bookmarks_recursive(outline, writer, reader, remove_items, parent=None):
+def _page_key(page):
+    ref = getattr(page, "indirect_reference", None) or page
+    return getattr(ref, "idnum", id(page))
+
+
+def copy_bookmarks_recursive(outline, writer, reader, remove_items, parent=None, page_index=None):
     """
     Recursively copy bookmarks, skipping those in remove_items list.
     Preserves the hierarchical structure.
@@ -55,26 +63,25 @@ def copy_bookmarks_recursive(outline, writer, reader, remove_items, parent=None)
         reader: PdfReader object
         remove_items (list): List of strings - remove any bookmark containing these strings
         parent: Parent bookmark (for nested bookmarks)
+        page_index (dict): page object number -> page number, built once on the
+                           first call and passed down to the nested calls
 
     Returns:
         The last added bookmark at this level (needed for parent tracking)
     """
     last_outline_item = parent
+    if page_index is None:
+        page_index = {_page_key(page): idx for idx, page in enumerate(reader.pages)}
 
     for bookmark in outline:
         # Check if this is a list (nested bookmarks)
         if isinstance(bookmark, list):
             # Recursively process nested bookmarks with current parent
-            copy_bookmarks_recursive(bookmark, writer, reader, remove_items, last_outline_item)
+            copy_bookmarks_recursive(bookmark, writer, reader, remove_items, last_outline_item, page_index)
         else:
             # Check if bookmark should be removed
-            should_remove = False
-
             # Check if bookmark title contains any of the remove_items strings
-            for item in remove_items:
-                if item.lower() in bookmark.title.lower():
-                    should_remove = True
-                    break
+            should_remove = compile_filters(remove_items)(bookmark.title)
 
             if not should_remove:
                 try:
@@ -83,18 +90,7 @@ def copy_bookmarks_recursive(outline, writer, reader, remove_items, parent=None)
                         target_page = bookmark.page
 
                         # Find the page number in the reader
-                        page_num = 0
-                        try:
-                            page_num = reader.pages.index(target_page)
-                        except:
-                            # Try to find by page reference
-                            for idx, page in enumerate(reader.pages):
-                                try:
-                                    if page.get_object() == target_page.get_object():
-                                        page_num = idx
-                                        break
-                                except:
-                                    pass
+                        page_num = page_index.get(_page_key(target_page), 0)
 
                         # Add bookmark using add_outline_item
                         outline_item = writer.add_outline_item(
@@ -1,5 +1,12 @@
+import os
+import sys
 from pdfixsdk import *
 
+from bookmark_filter import compile_filters, filter_outline
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pdfix_save import save_doc
+
 
 def remove_filtered_bookmarks(input_pdf, output_pdf, filters):
     pdfix = GetPdfix()
@@ -10,46 +17,12 @@ def remove_filtered_bookmarks(input_pdf, output_pdf, filters):
     if doc is None:
         raise Exception("Failed to open PDF: " + pdfix.GetError())
 
-    root = doc.GetBookmarkRoot()
-    if root is None:
+    outline = filter_outline(doc, compile_filters(filters))
+    if outline is None:
         print("No bookmarks found.")
-    else:
-        filters_lower = [f.lower() for f in filters]
-
-        def clean(parent):
-            i = 0
-            count = parent.GetNumChildren()
-            while i < count:
-                child = parent.GetChild(i)
-
-                # Recurse first
-                clean(child)
-
-                title = (child.GetTitle() or "").lower()
-                match = any(f in title for f in filters_lower)
-
-                if match:
-                    # Move child's children into parent at the same position
-                    sub_count = child.GetNumChildren()
-                    for s in range(sub_count):
-                        sub = child.GetChild(s)
-                        # Insert this sub-bookmark into parent, before removing pdf bookmark
-                        parent.AddChild(i, sub)
-                        i += 1
-                        count += 1
-
-                    # Now remove .pdf bookmark itself
-                    parent.RemoveChild(i)
-
-                    # Do NOT increment i here (because next bookmark is already at same index)
-                    count -= 1
-                    continue
-
-                i += 1
-
-        clean(root)
 
-    if not doc.Save(output_pdf, kSaveFull):
+    # outline-only edit: append the changed items instead of rewriting the file
+    if not save_doc(pdfix, doc, output_pdf, changes=outline[1] if outline else 0):
         err = pdfix.GetError()
         doc.Close()
         raise Exception("Save failed: " + err)
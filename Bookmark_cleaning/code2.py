@@ -1,8 +1,26 @@
+import hashlib
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pdfixsdk import *
 
-def remove_filtered_bookmarks(input_pdf, output_pdf, filters):
-    pdfix = GetPdfix()
+from bookmark_filter import compile_filters, filter_outline
+from bookmark_jobs import DEFAULT_WORKERS, call_with_pdfix, init_worker
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pdfix_save import save_doc
+from staging import Staging
+
+# Kept in the output folder: per input file, the hashes its output was made from
+MANIFEST_NAME = ".bookmark_manifest.json"
+HASH_CHUNK = 1024 * 1024
+
+
+def remove_filtered_bookmarks(input_pdf, output_pdf, filters, pdfix=None):
+    if pdfix is None:
+        pdfix = GetPdfix()
     if pdfix is None:
         raise Exception("PDFix initialization failed")
 
@@ -10,67 +28,170 @@ def remove_filtered_bookmarks(input_pdf, output_pdf, filters):
     if doc is None:
         raise Exception("Failed to open PDF: " + pdfix.GetError())
 
-    root = doc.GetBookmarkRoot()
-    if root is not None:
-        filters_lower = [f.lower() for f in filters]
+    outline = filter_outline(doc, compile_filters(filters))
 
-        def clean(parent):
-            i = 0
-            count = parent.GetNumChildren()
-            while i < count:
-                child = parent.GetChild(i)
+    # outline-only edit: append the changed items instead of rewriting the file
+    if not save_doc(pdfix, doc, output_pdf, changes=outline[1] if outline else 0):
+        err = pdfix.GetError()
+        doc.Close()
+        raise Exception("Save failed: " + err)
 
-                clean(child)  # recurse first
+    doc.Close()
 
-                title = (child.GetTitle() or "").lower()
-                match = any(f in title for f in filters_lower)
 
-                if match:
-                    sub_count = child.GetNumChildren()
-                    for s in range(sub_count):
-                        sub = child.GetChild(s)
-                        parent.AddChild(i, sub)
-                        i += 1
-                        count += 1
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-                    parent.RemoveChild(i)
-                    count -= 1
-                    continue
 
-                i += 1
+def filters_sha256(filters):
+    return hashlib.sha256(json.dumps(list(filters)).encode("utf-8")).hexdigest()
 
-        clean(root)
 
-    if not doc.Save(output_pdf, kSaveFull):
-        err = pdfix.GetError()
-        doc.Close()
-        raise Exception("Save failed: " + err)
+def load_manifest(output_folder):
+    try:
+        with open(os.path.join(output_folder, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    doc.Close()
 
+def save_manifest(output_folder, manifest):
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _clean_file(input_pdf, output_pdf, filters, known_sha, sha=None, pdfix=None):
+    """
+    Worker task. Hashes the input (unless staging already did) and skips it if
+    the hash matches the manifest entry (the file was touched but not
+    changed); otherwise cleans it. Returns (status, input sha256, seconds).
+    """
+    start = time.time()
+    if sha is None:
+        sha = file_sha256(input_pdf)
+    if sha == known_sha and os.path.exists(output_pdf):
+        return "unchanged", sha, time.time() - start
+    remove_filtered_bookmarks(input_pdf, output_pdf, filters, pdfix=pdfix)
+    return "cleaned", sha, time.time() - start
+
+
+def process_folder(input_folder, output_folder, filters, workers=DEFAULT_WORKERS, force=False, stage=None):
+    """
+    Clean every PDF of input_folder into output_folder (same names) in a pool
+    of `workers` processes with one PDFix instance each.
+
+    A manifest in output_folder records, per file, the input's sha256 and the
+    filter set it was cleaned with. A file is skipped without being read when
+    its size and mtime match the manifest, and after hashing when only the
+    mtime changed; force=True rebuilds everything.
 
-def process_folder(input_folder, output_folder, filters):
+    Files on a network share are staged (staging.py): inputs are copied to
+    local disk, PDFix works there, outputs are copied back and renamed into
+    place. stage=True/False forces staging on/off.
+    """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    pdf_files = [f for f in os.listdir(input_folder) if f.lower().endswith(".pdf")]
+    pdf_files = sorted(f for f in os.listdir(input_folder) if f.lower().endswith(".pdf"))
 
     if not pdf_files:
         print("⚠ No PDF files found in folder:", input_folder)
         return
 
+    manifest = {} if force else load_manifest(output_folder)
+    filters_hash = filters_sha256(filters)
+    started = time.time()
+    counts = {"cleaned": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    failures = []
+
+    pending = {}
     for pdf_name in pdf_files:
         input_pdf = os.path.join(input_folder, pdf_name)
-        output_pdf = os.path.join(output_folder, pdf_name)  # same name
-
-        print(f"🔄 Processing: {pdf_name}")
-        try:
-            remove_filtered_bookmarks(input_pdf, output_pdf, filters)
-            print(f"✅ Saved → {output_pdf}\n")
-        except Exception as e:
-            print(f"❌ Failed: {pdf_name} → {e}\n")
-
-    print("🎉 Folder processing complete!")
+        st = os.stat(input_pdf)
+        entry = manifest.get(pdf_name)
+        if entry and entry.get("filters_sha256") != filters_hash:
+            entry = None
+        if (entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime
+                and os.path.exists(os.path.join(output_folder, pdf_name))):
+            counts["skipped"] += 1
+            continue
+        pending[input_pdf] = (pdf_name, st, entry["input_sha256"] if entry else None)
+
+    total = len(pending)
+    print(f"🔄 {len(pdf_files)} PDFs: {counts['skipped']} up to date, {total} to check "
+          f"with {min(workers, total) if total else 0} worker(s)")
+    done = 0
+
+    def record(pdf_name, st, sha, status, seconds):
+        counts[status] += 1
+        manifest[pdf_name] = {
+            "input_sha256": sha,
+            "filters_sha256": filters_hash,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+        }
+        save_manifest(output_folder, manifest)
+        mark = "✅ Saved" if status == "cleaned" else "⏭ Unchanged"
+        print(f"[{done}/{total}] {mark}: {pdf_name} ({seconds:.1f}s)")
+
+    def fail(pdf_name, error):
+        counts["failed"] += 1
+        failures.append(pdf_name)
+        manifest.pop(pdf_name, None)
+        print(f"[{done}/{total}] ❌ Failed: {pdf_name} → {error}")
+
+    if pending:
+        with Staging(stage=stage, verbose=False) as staging, \
+                ProcessPoolExecutor(max_workers=min(workers, total), initializer=init_worker) as pool:
+            futures = {}
+            # workers start on the first staged file while the rest are still copying
+            for input_pdf, local_pdf, error in staging.fetch_iter(pending):
+                pdf_name, st, known_sha = pending[input_pdf]
+                if error is not None:
+                    done += 1
+                    fail(pdf_name, error)
+                    continue
+                output_pdf = os.path.join(output_folder, pdf_name)  # same name
+                sha = staging.sha256.get(input_pdf)
+                if sha is not None and sha == known_sha and os.path.exists(output_pdf):
+                    done += 1
+                    record(pdf_name, st, sha, "unchanged", 0.0)
+                    continue
+                future = pool.submit(call_with_pdfix, _clean_file, local_pdf, staging.output(output_pdf),
+                                     filters, known_sha, sha)
+                futures[future] = (input_pdf, output_pdf)
+
+            for future in as_completed(futures):
+                input_pdf, output_pdf = futures[future]
+                pdf_name, st, _ = pending[input_pdf]
+                done += 1
+                try:
+                    status, sha, seconds = future.result()
+                    staging.publish(output_pdf)
+                except Exception as e:
+                    staging.discard(output_pdf)
+                    fail(pdf_name, e)
+                    continue
+                record(pdf_name, st, sha, status, seconds)
+
+    # forget files that are no longer in the input folder
+    for pdf_name in set(manifest) - set(pdf_files):
+        del manifest[pdf_name]
+    save_manifest(output_folder, manifest)
+
+    print(f"🎉 Folder processing complete in {time.time() - started:.1f}s: "
+          f"{counts['cleaned']} cleaned, {counts['skipped'] + counts['unchanged']} unchanged, "
+          f"{counts['failed']} failed")
+    for pdf_name in failures:
+        print("   failed:", pdf_name)
+    return counts
 
 
 if __name__ == "__main__":
@@ -1,9 +1,14 @@
-from flask import Flask, request, send_file, jsonify, render_template_string
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template_string
 import os
+import sys
 import tempfile
-from datetime import datetime
-from pdfixsdk import GetPdfix, kSaveFull
+from pdfixsdk import GetPdfix
+
+from bookmark_filter import compile_filters, filter_outline
+from bookmark_jobs import JobQueue, jobs_blueprint
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pdfix_save import save_doc
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
@@ -11,46 +16,29 @@ app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp()
 
 
 # ===================== BOOKMARK FILTER FUNCTION =====================
-def remove_filtered_bookmarks(input_pdf, output_pdf, filters):
-    pdfix = GetPdfix()
+def remove_filtered_bookmarks(input_pdf, output_pdf, filters, pdfix=None):
+    if pdfix is None:
+        pdfix = GetPdfix()
     if pdfix is None:
         raise Exception("PDFix initialization failed")
     doc = pdfix.OpenDoc(input_pdf, "")
     if doc is None:
         raise Exception("Failed to open PDF: " + pdfix.GetError())
 
-    root = doc.GetBookmarkRoot()
-    if root is not None:
-        filters_lower = [f.lower() for f in filters]
-
-        def clean(parent):
-            i = 0
-            count = parent.GetNumChildren()
-            while i < count:
-                child = parent.GetChild(i)
-                clean(child)
-                title = (child.GetTitle() or "").lower()
-                if any(f in title for f in filters_lower):
-                    sub_count = child.GetNumChildren()
-                    for s in range(sub_count):
-                        sub = child.GetChild(s)
-                        parent.AddChild(i, sub)
-                        i += 1
-                        count += 1
-                    parent.RemoveChild(i)
-                    count -= 1
-                    continue
-                i += 1
-
-        clean(root)
-
-    if not doc.Save(output_pdf, kSaveFull):
+    outline = filter_outline(doc, compile_filters(filters))
+
+    # outline-only edit: append the changed items instead of rewriting the file
+    if not save_doc(pdfix, doc, output_pdf, changes=outline[1] if outline else 0):
         err = pdfix.GetError()
         doc.Close()
         raise Exception("Save failed: " + err)
     doc.Close()
 
 
+# Filtering runs in PDFix worker processes; requests only queue and report jobs
+jobs = JobQueue(remove_filtered_bookmarks)
+
+
 # ===================== FRONT-END UI (AUTO-DOWNLOAD) =====================
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -86,24 +74,50 @@ document.getElementById("uploadForm").addEventListener("submit", async (e) => {
     e.preventDefault();
     const formData = new FormData(e.target);
 
+    const result = document.getElementById("result");
     document.getElementById("submitBtn").disabled = true;
-    document.getElementById("result").innerHTML = "<p>⏳ Processing PDF...</p>";
+    result.innerHTML = "<p>⏳ Uploading PDF...</p>";
 
     const res = await fetch("/filter-bookmarks", { method: "POST", body: formData });
     const data = await res.json();
 
-    if (data.success) {
-        document.getElementById("result").innerHTML =
-            "<div class='success'>✔ Completed! Saved in Downloads Folder</div>";
+    if (!data.success) {
+        result.innerHTML = `<div class='error'>❌ ${data.error}</div>`;
+        document.getElementById("submitBtn").disabled = false;
+        return;
+    }
 
-        // 🔥 Auto-start download
-        window.location.href = `/download/${data.filename}`;
+    const show = (job) => {
+        if (job.status === "queued") {
+            result.innerHTML = `<p>⏳ Waiting for a worker (${job.position} job(s) ahead)...</p>`;
+        } else if (job.status === "running") {
+            result.innerHTML = "<p>⏳ Processing PDF...</p>";
+        } else if (job.status === "done") {
+            result.innerHTML = "<div class='success'>✔ Completed! Saved in Downloads Folder</div>";
+            // 🔥 Auto-start download
+            window.location.href = `/download/${job.job_id}`;
+        } else {
+            result.innerHTML = `<div class='error'>❌ ${job.error || "Job failed"}</div>`;
+        }
+        if (job.status === "done" || job.status === "error") {
+            document.getElementById("submitBtn").disabled = false;
+            return true;
+        }
+        return false;
+    };
+
+    // Follow the job with server-sent events, fall back to polling
+    const poll = async () => {
+        const job = await (await fetch(`/jobs/${data.job_id}`)).json();
+        if (!show(job)) setTimeout(poll, 1500);
+    };
+    if (window.EventSource) {
+        const events = new EventSource(`/jobs/${data.job_id}/events`);
+        events.onmessage = (msg) => { if (show(JSON.parse(msg.data))) events.close(); };
+        events.onerror = () => { events.close(); poll(); };
     } else {
-        document.getElementById("result").innerHTML =
-            `<div class='error'>❌ ${data.error}</div>`;
+        poll();
     }
-
-    document.getElementById("submitBtn").disabled = false;
 });
 </script>
 </body>
@@ -117,51 +131,8 @@ def index():
     return render_template_string(HTML_TEMPLATE)
 
 
-@app.route('/filter-bookmarks', methods=['POST'])
-def filter_bookmarks():
-    if 'file' not in request.files:
-        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
-
-    file = request.files['file']
-    if not file.filename.lower().endswith('.pdf'):
-        return jsonify({'success': False, 'error': 'File must be a PDF'}), 400
-
-    try:
-        filters = [".pdf", "outline placeholder"]
-
-        filename = secure_filename(file.filename)
-        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"input_{stamp}_{filename}")
-
-        # Output file name: <name>_output.pdf
-        name, ext = os.path.splitext(filename)
-        output_filename = f"{name}_output{ext}"
-        output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
-
-        file.save(input_path)
-        remove_filtered_bookmarks(input_path, output_path, filters)
-        os.remove(input_path)
-
-        return jsonify({'success': True, 'filename': output_filename})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/download/<filename>')
-def download_file(filename):
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
-    response = send_file(
-        file_path,
-        as_attachment=True,
-        download_name=filename,
-        mimetype="application/pdf"
-    )
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+# upload, /jobs/<id>, /jobs/<id>/events, /download/<id>
+app.register_blueprint(jobs_blueprint(jobs, [".pdf", "outline placeholder"]))
 
 
 # ===================== START SERVER =====================
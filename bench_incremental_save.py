@@ -0,0 +1,217 @@
+"""
+Full vs incremental save for small edits.
+
+Merges the bundled chapters (repeated `copies` times) into one book, then
+applies the three small edits the PDFix tools make - page labels
+(task/Roman_integer_pagenumberpart.py), link alt text (task/link_index.py)
+and an outline edit (Bookmark_cleaning, filter_outline) - and saves each
+result in full and incrementally. Reports the save time and how many bytes
+the output adds to the input (an incremental save keeps the original bytes
+and appends the update). Every output is re-opened with pikepdf to check
+that the edit is there.
+
+PDFix (pdfix_save.save_doc with SAVE_FULL / SAVE_INCREMENTAL) is measured
+when pdfixsdk is installed; pypdf (clone + write vs PdfWriter(incremental=
+True)) always runs as a reference.
+
+Usage: python bench_incremental_save.py [copies] [links]
+"""
+
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pikepdf
+from pypdf import PdfWriter
+from pypdf.generic import NameObject, TextStringObject
+
+from working_internal_external import merge_pdfs_preserve_links
+
+try:
+    from pdfixsdk import GetPdfix, PdfLinkAnnot, kAnnotLink
+    from pdfix_save import SAVE_FULL, SAVE_INCREMENTAL, save_doc
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Bookmark_cleaning"))
+    from bookmark_filter import compile_filters, filter_outline
+    USE_PDFIX = True
+except Exception:
+    USE_PDFIX = False
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ALT_TEXT = "bench alt text"
+# outline edit: drop the chapter-level entries, promoting their children
+OUTLINE_FILTERS = ["re:_9780443184529_"]
+
+
+def bundled_chapters():
+    return sorted(glob.glob(os.path.join(HERE, "0*_9780443184529_*.pdf")))
+
+
+# --- checks (pikepdf) ---
+def has_labels(path):
+    with pikepdf.open(path) as pdf:
+        return "/PageLabels" in pdf.Root
+
+
+def count_alt_text(path):
+    with pikepdf.open(path) as pdf:
+        return sum(1 for page in pdf.pages for annot in page.get("/Annots", [])
+                   if str(annot.get("/Contents", "")) == ALT_TEXT)
+
+
+def count_outline(path):
+    with pikepdf.open(path) as pdf:
+        with pdf.open_outline() as outline:
+            return len(outline.root)
+
+
+# --- pypdf edits ---
+def pypdf_labels(writer, links):
+    writer.set_page_label(0, 0, prefix="Cover")
+    writer.set_page_label(1, 9, style="/r")
+    writer.set_page_label(10, len(writer.pages) - 1, style="/D", start=11)
+
+
+def pypdf_alt_text(writer, links):
+    done = 0
+    for page in writer.pages:
+        for annot in page.get("/Annots") or []:
+            annot = annot.get_object()
+            if annot.get("/Subtype") == "/Link" and done < links:
+                annot[NameObject("/Contents")] = TextStringObject(ALT_TEXT)
+                done += 1
+
+
+def pypdf_outline(writer, links):
+    # pypdf has no outline editing API; promote the first level's children by hand
+    outlines = writer._root_object["/Outlines"].get_object()
+    kids = []
+    item = outlines.get("/First")
+    while item is not None:
+        item = item.get_object()
+        child = item.get("/First")
+        while child is not None:
+            kids.append(child.get_object())
+            child = child.get_object().get("/Next")
+        item = item.get("/Next")
+    for i, kid in enumerate(kids):
+        kid[NameObject("/Parent")] = outlines.indirect_reference
+        for key, other in (("/Prev", kids[i - 1] if i else None),
+                           ("/Next", kids[i + 1] if i + 1 < len(kids) else None)):
+            if other is None:
+                kid.pop(key, None)
+            else:
+                kid[NameObject(key)] = other.indirect_reference
+    outlines[NameObject("/First")] = kids[0].indirect_reference
+    outlines[NameObject("/Last")] = kids[-1].indirect_reference
+
+
+def pypdf_save(src, dst, edit, links, incremental):
+    t0 = time.perf_counter()
+    writer = PdfWriter(src, incremental=True) if incremental else PdfWriter(clone_from=src)
+    edit(writer, links)
+    writer.write(dst)
+    return time.perf_counter() - t0
+
+
+# --- PDFix edits ---
+def pdfix_labels(doc, links):
+    root = doc.GetRootObject()
+    labels = root.PutDict("PageLabels")
+    nums = labels.PutArray("Nums")
+    for start, key, value in ((0, "P", "Cover"), (1, "S", "r"), (10, "S", "D")):
+        nums.PutNumber(nums.GetNumObjects(), start)
+        label = nums.InsertDict(nums.GetNumObjects())
+        if key == "P":
+            label.PutString(key, value)
+        else:
+            label.PutName(key, value)
+    return 2 + 3
+
+
+def pdfix_alt_text(doc, links):
+    done = 0
+    for p in range(doc.GetNumPages()):
+        page = doc.AcquirePage(p)
+        try:
+            for i in range(page.GetNumAnnots()):
+                annot = page.GetAnnot(i)
+                if annot.GetSubtype() == kAnnotLink and done < links:
+                    PdfLinkAnnot(annot.obj).SetContents(ALT_TEXT)
+                    done += 1
+        finally:
+            page.Release()
+    return done
+
+
+def pdfix_outline(doc, links):
+    result = filter_outline(doc, compile_filters(OUTLINE_FILTERS))
+    return result[1] if result else 0
+
+
+def pdfix_save(src, dst, edit, links, incremental):
+    pdfix = GetPdfix()
+    doc = pdfix.OpenDoc(src, "")
+    if not doc:
+        raise RuntimeError(f"PDFix could not open {src}: {pdfix.GetError()}")
+    try:
+        t0 = time.perf_counter()
+        changes = edit(doc, links)
+        mode = save_doc(pdfix, doc, dst, changes=changes,
+                        mode=SAVE_INCREMENTAL if incremental else SAVE_FULL)
+        if mode != (SAVE_INCREMENTAL if incremental else SAVE_FULL):
+            raise RuntimeError(f"PDFix saved {mode}: {pdfix.GetError()}")
+        return time.perf_counter() - t0
+    finally:
+        doc.Close()
+
+
+EDITS = [
+    ("page labels", pypdf_labels, pdfix_labels, lambda path, links: has_labels(path)),
+    ("link alt text", pypdf_alt_text, pdfix_alt_text, lambda path, links: count_alt_text(path) == links),
+    ("outline", pypdf_outline, pdfix_outline, None),
+]
+
+
+def bench(pdf_files, links):
+    engines = [("pypdf", pypdf_save)]
+    if USE_PDFIX:
+        engines.insert(0, ("PDFix", pdfix_save))
+    else:
+        print("pdfixsdk not installed: PDFix rows skipped")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        book = os.path.join(tmp, "book.pdf")
+        with contextlib.redirect_stdout(io.StringIO()):
+            merge_pdfs_preserve_links(pdf_files, book, verbose=False, merge_outlines=True)
+        size = os.path.getsize(book)
+        outline_before = count_outline(book)
+        print(f"{len(pdf_files)} chapters, {size / 1e6:.1f} MB, {links} links edited")
+        print(f"{'edit':<15}{'engine':<8}{'full':>10}{'incremental':>13}{'full size':>12}{'appended':>11}")
+        for label, pypdf_edit, pdfix_edit, check in EDITS:
+            for engine, save in engines:
+                edit = pypdf_edit if engine == "pypdf" else pdfix_edit
+                row = {}
+                for incremental in (False, True):
+                    out = os.path.join(tmp, f"{engine}_{label}_{incremental}.pdf".replace(" ", "_"))
+                    row[incremental] = (save(book, out, edit, links, incremental), os.path.getsize(out))
+                    ok = check(out, links) if check else count_outline(out) != outline_before
+                    if not ok:
+                        print(f"  {engine} {label} ({'incremental' if incremental else 'full'}): edit missing")
+                (t_full, s_full), (t_inc, s_inc) = row[False], row[True]
+                print(f"{label:<15}{engine:<8}{t_full:>9.2f}s{t_inc:>12.2f}s"
+                      f"{s_full / 1e6:>10.2f}MB{(s_inc - size) / 1e3:>9.1f}KB")
+
+
+def main(argv):
+    copies = int(argv[1]) if len(argv) > 1 else 4
+    links = int(argv[2]) if len(argv) > 2 else 50
+    bench(bundled_chapters() * copies, links)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
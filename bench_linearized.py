@@ -0,0 +1,225 @@
+"""
+Time-to-first-page of plain vs linearized merged output over HTTP byte ranges.
+
+Merges the bundled chapters twice (plain and linearize=True), serves both from
+a local HTTP server that honours Range requests and throttles like a slow link
+(per-request latency + bandwidth), then emulates a web reader that fetches the
+file in fixed-size chunks:
+
+  plain       first chunk, the xref at the end of the file, then every chunk
+              holding the catalog, the page tree and page 1 with everything it
+              references (offsets taken from the xref)
+  linearized  first chunk (linearization dictionary), then the chunks up to
+              its /E offset, i.e. the first-page section incl. the hint stream
+
+and reports requests, bytes and wall time until page 1 can be drawn, next to
+the time for downloading the whole file.
+
+Usage: python bench_linearized.py [latency_ms] [kbytes_per_s] [pdf ...]
+"""
+
+import contextlib
+import glob
+import io
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+from pdf_output import check_linearization
+from working_internal_external import merge_pdfs_preserve_links
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHUNK = 65536                     # pdf.js range chunk size
+
+
+def bundled_chapters():
+    return sorted(glob.glob(os.path.join(HERE, "0*_9780443184529_*.pdf")))
+
+
+# --- local HTTP stand-in ------------------------------------------------------
+class ThrottledRangeHandler(SimpleHTTPRequestHandler):
+    latency = 0.05
+    bytes_per_second = 1024 * 1024
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        size = os.path.getsize(path)
+        m = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        start, end = 0, size - 1
+        if m:
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+        with open(path, "rb") as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        time.sleep(self.latency + len(body) / self.bytes_per_second)
+        self.send_response(206 if m else 200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        if m:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@contextlib.contextmanager
+def serve(directory):
+    handler = lambda *a, **kw: ThrottledRangeHandler(*a, directory=directory, **kw)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def fetch(url, start=None, end=None):
+    req = urllib.request.Request(url)
+    if start is not None:
+        req.add_header("Range", f"bytes={start}-{end}")
+    with urllib.request.urlopen(req) as resp:
+        return resp.read()
+
+
+# --- which bytes does page 1 need --------------------------------------------
+def _first_page_objects(reader):
+    """Object numbers of the catalog, the page tree nodes and page 1 with everything it uses."""
+    needed = set()
+    stack = [reader.trailer.raw_get("/Root")]
+    page = reader.pages[0]
+    node = page.indirect_reference
+    while node is not None:                      # page and its ancestors
+        stack.append(node)
+        node = node.get_object().raw_get("/Parent") if "/Parent" in node.get_object() else None
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, IndirectObject):
+            if obj.idnum in needed:
+                continue
+            needed.add(obj.idnum)
+            resolved = obj.get_object()
+            if isinstance(resolved, DictionaryObject) and resolved.get("/Type") in ("/Catalog", "/Pages"):
+                continue                         # only the path to page 1, not the whole tree
+            obj = resolved
+        if isinstance(obj, DictionaryObject):
+            stack.extend(v for k, v in obj.items() if k not in ("/Parent", "/P", "/StructTreeRoot"))
+        elif isinstance(obj, ArrayObject):
+            stack.extend(obj)
+    return needed
+
+
+def plain_first_page_ranges(path):
+    """Byte ranges a reader needs for page 1 of a non-linearized file."""
+    reader = PdfReader(path)
+    size = os.path.getsize(path)
+    offsets = {}
+    for gen_table in reader.xref.values():
+        offsets.update(gen_table)
+    in_stream = getattr(reader, "xref_objStm", {})
+    starts = sorted(set(offsets.values()) | {size})
+    ranges = [(0, min(CHUNK, size)), (max(0, size - 1024), size)]
+    with open(path, "rb") as f:
+        f.seek(max(0, size - 1024))
+        m = re.search(rb"startxref\s+(\d+)", f.read())
+    if m:
+        ranges.append((int(m.group(1)), size))   # the xref table / stream itself
+    for idnum in _first_page_objects(reader):
+        if idnum in in_stream:
+            idnum = in_stream[idnum][0]          # whole object stream
+        start = offsets.get(idnum)
+        if start is None:
+            continue
+        i = starts.index(start)
+        ranges.append((start, starts[i + 1] if i + 1 < len(starts) else size))
+    return ranges
+
+
+def linearized_first_page_ranges(path, head):
+    """Byte ranges up to /E of the linearization dictionary (first-page section)."""
+    m = re.search(rb"/E\s+(\d+)", head)
+    if not m:
+        raise ValueError(f"{path}: no linearization dictionary in the first chunk")
+    return [(0, int(m.group(1)))]
+
+
+def to_chunks(ranges):
+    chunks = set()
+    for start, end in ranges:
+        chunks.update(range(start // CHUNK, (max(start, end - 1)) // CHUNK + 1))
+    return sorted(chunks)
+
+
+def time_to_first_page(url, path, linearized):
+    """(requests, bytes, seconds) until page 1 can be drawn."""
+    size = os.path.getsize(path)
+    t0 = time.perf_counter()
+    head = fetch(url, 0, min(CHUNK, size) - 1)
+    got, requests, received = {0}, 1, len(head)
+    if linearized:
+        chunks = to_chunks(linearized_first_page_ranges(path, head))
+    else:
+        chunks = to_chunks(plain_first_page_ranges(path))
+        last = (size - 1) // CHUNK                # trailer first, as a reader would
+        chunks = [last] + [c for c in chunks if c != last]
+    for c in chunks:
+        if c in got:
+            continue
+        data = fetch(url, c * CHUNK, min((c + 1) * CHUNK, size) - 1)
+        got.add(c)
+        requests += 1
+        received += len(data)
+    return requests, received, time.perf_counter() - t0
+
+
+def bench(pdf_files, latency, bytes_per_second):
+    ThrottledRangeHandler.latency = latency
+    ThrottledRangeHandler.bytes_per_second = bytes_per_second
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        for label, linearize in (("plain", False), ("linearized", True)):
+            out = os.path.join(tmp, f"merged_{label}.pdf")
+            with contextlib.redirect_stdout(io.StringIO()):
+                merge_pdfs_preserve_links(pdf_files, out, verbose=False, linearize=linearize)
+            outputs[label] = out
+
+        check = check_linearization(outputs["linearized"])
+        print(f"linearization check: {'passed' if check['ok'] else 'FAILED'} {check['messages']}".rstrip())
+
+        with serve(tmp) as base:
+            print(f"{'output':<12}{'size':>12}{'requests':>10}{'bytes':>12}{'first page':>12}{'full file':>11}")
+            for label, out in outputs.items():
+                url = f"{base}/{os.path.basename(out)}"
+                requests, received, seconds = time_to_first_page(url, out, label == "linearized")
+                t0 = time.perf_counter()
+                fetch(url)
+                full = time.perf_counter() - t0
+                print(f"{label:<12}{os.path.getsize(out):>12,}{requests:>10}{received:>12,}"
+                      f"{seconds:>11.2f}s{full:>10.2f}s")
+
+
+def main(argv):
+    latency = float(argv[1]) / 1000 if len(argv) > 1 else 0.05
+    bytes_per_second = float(argv[2]) * 1024 if len(argv) > 2 else 1024 * 1024
+    pdf_files = argv[3:] or bundled_chapters()
+    print(f"{len(pdf_files)} input(s), {latency * 1000:g} ms per request, "
+          f"{bytes_per_second / 1024:g} KB/s")
+    bench(pdf_files, latency, bytes_per_second)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,112 @@
+"""
+Benchmark the pypdf and pikepdf merge engines on the bundled chapters.
+
+Both engines run merge_pdfs_preserve_links on the same inputs; the script
+reports wall time and output size per engine and checks that the two outputs
+carry the same links (same page, action and resolved target for every link).
+
+Usage: python bench_merge_backends.py [runs] [pdf ...]
+"""
+
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pikepdf
+
+from working_internal_external import MERGE_BACKENDS, merge_pdfs_preserve_links
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def bundled_chapters():
+    return sorted(glob.glob(os.path.join(HERE, "0*_9780443184529_*.pdf")))
+
+
+def link_table(pdf_path):
+    """[(page, annot_no, action, target)] for every link annotation of a PDF."""
+    rows = []
+    with pikepdf.open(pdf_path) as pdf:
+        page_index = {p.obj.objgen: i for i, p in enumerate(pdf.pages)}
+
+        def _target(dest):
+            if isinstance(dest, pikepdf.Array) and len(dest) > 0:
+                first = dest[0]
+                if isinstance(first, pikepdf.Dictionary):
+                    return ("page", page_index.get(first.objgen), repr(list(dest[1:])))
+                return ("raw", repr(list(dest)))
+            return ("raw", repr(dest))
+
+        for p_idx, page in enumerate(pdf.pages):
+            annots = page.obj.get("/Annots")
+            if not isinstance(annots, pikepdf.Array):
+                continue
+            for a_idx, annot in enumerate(annots):
+                if annot.get("/Subtype") != pikepdf.Name.Link:
+                    continue
+                action = annot.get("/A")
+                if "/Dest" in annot:
+                    rows.append((p_idx, a_idx, "Dest", _target(annot["/Dest"])))
+                if not isinstance(action, pikepdf.Dictionary):
+                    continue
+                s = str(action.get("/S"))
+                if s == "/GoTo":
+                    rows.append((p_idx, a_idx, s, _target(action.get("/D"))))
+                elif s == "/URI":
+                    rows.append((p_idx, a_idx, s, str(action.get("/URI"))))
+                elif s == "/GoToR":
+                    rows.append((p_idx, a_idx, s, repr(action.get("/F"))))
+                else:
+                    rows.append((p_idx, a_idx, s, None))
+    return rows
+
+
+def bench(pdf_files, runs=3):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in MERGE_BACKENDS:
+            out = os.path.join(tmp, f"merged_{backend}.pdf")
+            times = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    merge_pdfs_preserve_links(pdf_files, out, backend=backend, verbose=False)
+                times.append(time.perf_counter() - t0)
+            results[backend] = {
+                "best": min(times),
+                "mean": sum(times) / len(times),
+                "size": os.path.getsize(out),
+                "links": link_table(out),
+            }
+
+    total_pages = 0
+    for f in pdf_files:
+        with pikepdf.open(f) as pdf:
+            total_pages += len(pdf.pages)
+
+    print(f"Inputs: {len(pdf_files)} files, {total_pages} pages, {runs} run(s) per engine\n")
+    print(f"{'engine':<10}{'best s':>10}{'mean s':>10}{'size bytes':>14}{'links':>8}")
+    for backend, r in results.items():
+        print(f"{backend:<10}{r['best']:>10.3f}{r['mean']:>10.3f}{r['size']:>14,}{len(r['links']):>8}")
+
+    base = results[MERGE_BACKENDS[0]]
+    for backend in MERGE_BACKENDS[1:]:
+        other = results[backend]
+        same = other["links"] == base["links"]
+        print(f"\n{backend} vs {MERGE_BACKENDS[0]}: speedup x{base['best'] / other['best']:.2f}, "
+              f"links identical: {'yes' if same else 'NO'}")
+        if not same:
+            diff = [(a, b) for a, b in zip(base["links"], other["links"]) if a != b]
+            for a, b in diff[:10]:
+                print(f"  {MERGE_BACKENDS[0]}: {a}\n  {backend}: {b}")
+    return results
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    files = sys.argv[2:] or bundled_chapters()
+    bench(files, runs)
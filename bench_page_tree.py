@@ -0,0 +1,116 @@
+"""
+Random page access on flat vs balanced page trees of merged output.
+
+Merges the bundled chapters (repeated `copies` times to get a book-sized page
+count) once with the flat /Kids array and once with a balanced page tree
+(merge_pdfs_preserve_links(backend="pikepdf", page_tree_fanout=...); the
+balanced tree is only built by the pikepdf backend), then opens each output and
+times looking up `lookups` random pages with pypdf, pikepdf and, when
+pdfixsdk is installed, PDFix (AcquirePage). The open time is included, since
+some libraries index the page tree when the document is opened.
+
+Usage: python bench_page_tree.py [copies] [fanout] [lookups]
+"""
+
+import contextlib
+import glob
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pikepdf
+from pypdf import PdfReader
+
+from page_tree import DEFAULT_PAGE_TREE_FANOUT
+from working_internal_external import merge_pdfs_preserve_links
+
+try:
+    from pdfixsdk import GetPdfix
+    USE_PDFIX = True
+except Exception:
+    USE_PDFIX = False
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def bundled_chapters():
+    return sorted(glob.glob(os.path.join(HERE, "0*_9780443184529_*.pdf")))
+
+
+def access_pypdf(path, order):
+    reader = PdfReader(path)
+    for i in order:
+        reader.pages[i].mediabox
+
+
+def access_pikepdf(path, order):
+    with pikepdf.open(path) as pdf:
+        for i in order:
+            pdf.pages[i].mediabox
+
+
+def access_pdfix(path, order):
+    pdfix = GetPdfix()
+    doc = pdfix.OpenDoc(path, "")
+    if not doc:
+        raise RuntimeError(f"PDFix could not open {path}: {pdfix.GetError()}")
+    try:
+        for i in order:
+            page = doc.AcquirePage(i)
+            page.GetCropBox()
+            page.Release()
+    finally:
+        doc.Close()
+
+
+def timed(fn, path, order, runs=3):
+    best = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(path, order)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench(pdf_files, fanout, lookups):
+    readers = [("pypdf", access_pypdf), ("pikepdf", access_pikepdf)]
+    if USE_PDFIX:
+        readers.append(("PDFix", access_pdfix))
+    else:
+        print("pdfixsdk not installed: PDFix column skipped")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        for label, tree_fanout in (("flat", None), (f"fanout {fanout}", fanout)):
+            out = os.path.join(tmp, f"merged_{tree_fanout or 'flat'}.pdf")
+            with contextlib.redirect_stdout(io.StringIO()):
+                merge_pdfs_preserve_links(pdf_files, out, backend="pikepdf", verbose=False,
+                                          dedupe_resources=False, merge_outlines=False,
+                                          page_tree_fanout=tree_fanout)
+            outputs[label] = out
+
+        with pikepdf.open(next(iter(outputs.values()))) as pdf:
+            num_pages = len(pdf.pages)
+        order = [random.randrange(num_pages) for _ in range(lookups)]
+        print(f"{num_pages} pages, {lookups} random lookups (best of 3, incl. open)")
+        print(f"{'page tree':<14}" + "".join(f"{name:>12}" for name, _ in readers))
+        for label, out in outputs.items():
+            row = "".join(f"{timed(fn, out, order) * 1000:>10.1f}ms" for _, fn in readers)
+            print(f"{label:<14}{row}")
+
+
+def main(argv):
+    copies = int(argv[1]) if len(argv) > 1 else 23
+    fanout = int(argv[2]) if len(argv) > 2 else DEFAULT_PAGE_TREE_FANOUT
+    lookups = int(argv[3]) if len(argv) > 3 else 2000
+    random.seed(0)
+    bench(bundled_chapters() * copies, fanout, lookups)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
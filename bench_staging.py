@@ -0,0 +1,114 @@
+"""
+Direct reads from a (simulated) network share vs staging to local disk.
+
+A temporary directory stands in for the share: every read from it goes
+through staging.Throttle (per-request latency + shared bandwidth). For each
+bundled chapter (repeated `copies` times) the bench parses the PDF the way
+the link tools do - every page, its annotations and its link actions - once
+reading straight from the "share" and once after Staging.fetch_all() has
+copied the files to local disk, then writes the result back, directly vs
+through Staging.publish(). Request counts show where the time goes.
+
+Usage: python bench_staging.py [copies] [latency_ms] [bandwidth_MBps]
+"""
+
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pypdf import PdfReader, PdfWriter
+
+from staging import Staging, Throttle, open_throttled
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def bundled_chapters():
+    return sorted(glob.glob(os.path.join(HERE, "0*_9780443184529_*.pdf")))
+
+
+def parse(stream):
+    reader = PdfReader(stream)
+    links = 0
+    for page in reader.pages:
+        for annot in page.get("/Annots") or []:
+            annot = annot.get_object()
+            if annot.get("/Subtype") == "/Link":
+                action = annot.get("/A")
+                if action is not None:
+                    action.get_object().get("/S")
+                links += 1
+    return links
+
+
+def write_copy(path):
+    writer = PdfWriter(clone_from=path)
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def run_direct(share, names, out_dir, throttle):
+    links = 0
+    for name in names:
+        with open_throttled(os.path.join(share, name), throttle) as f:
+            links += parse(f)
+        data = write_copy(os.path.join(share, name))
+        with open(os.path.join(out_dir, name), "wb") as out:
+            # a PDF writer emits many small writes; model them as 64 KB requests
+            for pos in range(0, len(data), 64 * 1024):
+                throttle.wait(min(64 * 1024, len(data) - pos))
+                out.write(data[pos:pos + 64 * 1024])
+    return links
+
+
+def run_staged(share, names, out_dir, throttle):
+    links = 0
+    with Staging(stage=True, throttle=throttle, verbose=False) as staging:
+        local = staging.fetch_all(os.path.join(share, name) for name in names)
+        for name in names:
+            local_in = local[os.path.join(share, name)]
+            with open(local_in, "rb") as f:
+                links += parse(f)
+            with open(staging.output(os.path.join(out_dir, name)), "wb") as out:
+                out.write(write_copy(local_in))
+    return links
+
+
+def bench(pdf_files, latency, bandwidth):
+    with tempfile.TemporaryDirectory() as tmp:
+        share = os.path.join(tmp, "share")
+        os.makedirs(share)
+        names = []
+        for i, path in enumerate(pdf_files):
+            name = f"{i:03d}_{os.path.basename(path)}"
+            shutil.copy(path, os.path.join(share, name))
+            names.append(name)
+        total_mb = sum(os.path.getsize(os.path.join(share, n)) for n in names) / 1e6
+        print(f"{len(names)} files, {total_mb:.1f} MB on a share with {latency * 1000:.0f} ms latency, "
+              f"{bandwidth / 1e6:.0f} MB/s")
+        print(f"{'mode':<10}{'time':>10}{'requests':>10}{'MB moved':>10}{'links':>8}")
+        for label, run in (("direct", run_direct), ("staged", run_staged)):
+            out_dir = os.path.join(tmp, f"out_{label}")
+            os.makedirs(out_dir)
+            throttle = Throttle(bandwidth=bandwidth, latency=latency)
+            t0 = time.perf_counter()
+            links = run(share, names, out_dir, throttle)
+            elapsed = time.perf_counter() - t0
+            print(f"{label:<10}{elapsed:>9.2f}s{throttle.requests:>10}{throttle.bytes / 1e6:>10.1f}{links:>8}")
+
+
+def main(argv):
+    copies = int(argv[1]) if len(argv) > 1 else 1
+    latency = float(argv[2]) / 1000 if len(argv) > 2 else 0.001
+    bandwidth = float(argv[3]) * 1e6 if len(argv) > 3 else 50e6
+    bench(bundled_chapters() * copies, latency, bandwidth)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,120 @@
+"""
+Benchmark: indexed smart_merge_xmp vs the old nested-XPath merge.
+
+Builds an existing packet and a sidecar packet shaped like an Extensis /
+FontSense font report: one rdf:Description per font (rdf:about = font id)
+with a handful of properties each. The sidecar updates every existing
+property and adds new ones. The old merge re-ran the rdf:Description XPath
+for every sidecar Description (quadratic in the number of fonts) and split
+tag strings per property; the current one indexes both once.
+
+The current merge is checked to carry every property of both packets, with
+the sidecar's values where they overlap. The old one lost every other added
+property (it appended while iterating), so its output is only timed.
+
+Usage: python bench_xmp_index.py [fonts ...]
+"""
+
+import sys
+import time
+
+from lxml import etree
+
+from xmp_Final import NSMAP, RDF_ABOUT, smart_merge_xmp
+
+STF = "http://ns.adobe.com/xap/1.0/sType/Font#"
+PACKET = """<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="{rdf}" xmlns:stFnt="{stf}">
+{descriptions}
+ </rdf:RDF>
+</x:xmpmeta>"""
+OLD_PROPS = ("fontName", "fontFamily", "fontFace", "fontType", "versionString")
+NEW_PROPS = ("fontFileName", "composite", "childFontFiles")
+
+
+def font_packet(fonts, props, value):
+    descriptions = "\n".join(
+        f'  <rdf:Description rdf:about="font:{n}">'
+        + "".join(f"<stFnt:{p}>{value} {p} {n}</stFnt:{p}>" for p in props)
+        + "</rdf:Description>"
+        for n in range(fonts)
+    )
+    return PACKET.format(rdf=NSMAP["rdf"], stf=STF, descriptions=descriptions).encode("utf-8")
+
+
+def legacy_merge_xmp(existing_bytes, new_bytes):
+    """smart_merge_xmp as it was before the index (nested XPath per Description)."""
+    existing_root = etree.fromstring(existing_bytes)
+    new_root = etree.fromstring(new_bytes)
+    existing_rdf = existing_root.xpath("//rdf:RDF", namespaces=NSMAP)[0]
+    new_rdf = new_root.xpath("//rdf:RDF", namespaces=NSMAP)[0]
+
+    prop_map = {}
+    for desc in existing_rdf.xpath("rdf:Description", namespaces=NSMAP):
+        about = desc.get("{%s}about" % NSMAP['rdf'], "")
+        for prop in desc:
+            ns = prop.tag.split("}")[0][1:]
+            name = prop.tag.split("}")[-1]
+            prop_map[(about, ns, name)] = prop
+
+    for new_desc in new_rdf.xpath("rdf:Description", namespaces=NSMAP):
+        about = new_desc.get("{%s}about" % NSMAP['rdf'], "")
+        target = None
+        for d in existing_rdf.xpath("rdf:Description", namespaces=NSMAP):
+            if d.get("{%s}about" % NSMAP['rdf'], "") == about:
+                target = d
+                break
+        if target is None:
+            existing_rdf.append(new_desc)
+            continue
+        for new_prop in new_desc:
+            ns = new_prop.tag.split("}")[0][1:]
+            name = new_prop.tag.split("}")[-1]
+            key = (about, ns, name)
+            if key in prop_map:
+                old = prop_map[key]
+                old.clear()
+                old.text = new_prop.text
+                for c in new_prop:
+                    old.append(c)
+            else:
+                target.append(new_prop)
+                prop_map[key] = new_prop
+
+    return etree.tostring(existing_root, pretty_print=True, encoding="utf-8")
+
+
+def properties_of(packet):
+    root = etree.fromstring(packet)
+    return {
+        (desc.get(RDF_ABOUT), etree.QName(prop).localname): prop.text
+        for desc in root.iter("{%s}Description" % NSMAP["rdf"])
+        for prop in desc
+    }
+
+
+def timed(merge, existing, new):
+    t0 = time.perf_counter()
+    result = merge(existing, new)
+    return time.perf_counter() - t0, result
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [500, 2000, 5000]
+    print(f"{'fonts':>7}{'properties':>12}{'nested XPath':>14}{'indexed':>10}{'speed-up':>10}  complete")
+    for fonts in sizes:
+        existing = font_packet(fonts, OLD_PROPS, "old")
+        new = font_packet(fonts, OLD_PROPS + NEW_PROPS, "new")
+        t_old, _ = timed(legacy_merge_xmp, existing, new)
+        t_new, merged = timed(smart_merge_xmp, existing, new)
+
+        expected = properties_of(existing)
+        expected.update(properties_of(new))
+        complete = properties_of(merged) == expected
+        total = fonts * (len(OLD_PROPS) * 2 + len(NEW_PROPS))
+        print(f"{fonts:>7}{total:>12}{t_old:>13.2f}s{t_new:>9.3f}s{t_old / t_new:>9.0f}x  {complete}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
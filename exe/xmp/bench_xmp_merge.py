@@ -0,0 +1,110 @@
+"""
+Benchmark: XMP merge with three opens / two saves vs one open / one save.
+
+For a batch of PDFs (the bundled chapters plus a book merged from them,
+repeated `copies` times) merges the same sidecar XMP packet into each file
+twice: the old way (read_existing_xmp, write_merged_xmp,
+write_custom_properties: the PDF is opened three times and written twice)
+and with smart_merge_into_pdf (one open, one save). Checks that both give
+the same XMP and docinfo.
+
+Usage: python bench_xmp_merge.py [copies]
+"""
+
+import contextlib
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import pikepdf
+
+from xmp_Final import (
+    extract_custom_properties, read_existing_xmp, read_new_xmp,
+    smart_merge_into_pdf, smart_merge_xmp, write_custom_properties,
+    write_merged_xmp,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.abspath(os.path.join(HERE, "..", ".."))
+
+SIDECAR_XMP = b"""<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:pdfx="http://ns.adobe.com/pdfx/1.3/"
+    xmlns:prism="http://prismstandard.org/namespaces/basic/2.0/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/">
+   <pdfx:CrossmarkDomainExclusive>true</pdfx:CrossmarkDomainExclusive>
+   <pdfx:CrossmarkMajorVersionDate>2025-01-01</pdfx:CrossmarkMajorVersionDate>
+   <pdfx:ElsevierWebPDFSpecifications>7.0</pdfx:ElsevierWebPDFSpecifications>
+   <pdfx:doi>10.1016/B978-0-443-18452-9.00001-1</pdfx:doi>
+   <pdfx:robots>noindex</pdfx:robots>
+   <prism:doi>10.1016/B978-0-443-18452-9.00001-1</prism:doi>
+   <dc:format>application/pdf</dc:format>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+
+def legacy_merge(pdf_path, xmp_path, output_path):
+    merged = smart_merge_xmp(read_existing_xmp(pdf_path), read_new_xmp(xmp_path))
+    write_merged_xmp(pdf_path, merged, output_path)
+    write_custom_properties(output_path, extract_custom_properties(merged))
+
+
+def metadata_of(path):
+    with pikepdf.open(path) as pdf:
+        return pdf.Root.Metadata.read_bytes(), {str(k): str(v) for k, v in pdf.docinfo.items()}
+
+
+def make_batch(tmp, copies):
+    chapters = sorted(glob.glob(os.path.join(REPO, "0*_9780443184529_*.pdf")))
+    book = os.path.join(tmp, "book.pdf")
+    with pikepdf.new() as pdf, warnings.catch_warnings():
+        warnings.simplefilter("ignore")           # links do not matter here
+        for path in chapters:
+            with pikepdf.open(path) as src:
+                pdf.pages.extend(src.pages)
+        pdf.save(book)
+    batch = []
+    for n in range(copies):
+        for path in chapters + [book]:
+            dst = os.path.join(tmp, f"in_{n}_{os.path.basename(path)}")
+            shutil.copy(path, dst)
+            batch.append(dst)
+    return batch
+
+
+def main(argv):
+    copies = int(argv[1]) if len(argv) > 1 else 3
+    with tempfile.TemporaryDirectory() as tmp:
+        batch = make_batch(tmp, copies)
+        xmp_path = os.path.join(tmp, "sidecar.xmp")
+        with open(xmp_path, "wb") as f:
+            f.write(SIDECAR_XMP)
+        total_mb = sum(os.path.getsize(p) for p in batch) / 1e6
+        print(f"{len(batch)} PDFs, {total_mb:.1f} MB")
+
+        times = {}
+        for label, merge in (("3 opens, 2 saves", legacy_merge), ("1 open, 1 save", smart_merge_into_pdf)):
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for path in batch:
+                    merge(path, xmp_path, path[:-4] + f"_{len(times)}.pdf")
+            times[label] = time.perf_counter() - t0
+            print(f"{label:<18}{times[label]:>8.2f}s")
+
+        same = all(metadata_of(p[:-4] + "_0.pdf") == metadata_of(p[:-4] + "_1.pdf") for p in batch)
+        print(f"speed-up {times['3 opens, 2 saves'] / times['1 open, 1 save']:.1f}x, "
+              f"identical metadata: {same}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
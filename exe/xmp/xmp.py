@@ -1,11 +1,18 @@
 
 """
 Transfer XMP metadata from .xmp sidecar file to PDF — SAFE version (preserves bookmarks & tags).
+
+A PDF whose metadata already has the sidecar's values is not rewritten;
+process() returns SAVED / UNCHANGED and can log it to a CSV report.
 """
 
 import xml.etree.ElementTree as ET
+import csv
+import hashlib
+import json
 import os
 import shutil
+import time
 from datetime import datetime
 
 # Prefer pikepdf
@@ -23,6 +30,12 @@ except Exception:
     USE_PYPDF = False
 
 
+SAVED = "saved"
+UNCHANGED = "unchanged"     # save skipped: the PDF already carries this metadata
+
+REPORT_FIELDS = ["PDF", "Output", "Decision", "Metadata sha256", "Seconds"]
+
+
 class XMPtoPDFUpdater:
     """Read XMP and update PDF metadata without losing bookmarks/tags."""
 
@@ -139,13 +152,75 @@ class XMPtoPDFUpdater:
 
         return has_outlines, has_struct
 
+    # -------------------------------------------------------------
+    # NO-OP DETECTION (skip the rewrite when nothing changes)
+    # -------------------------------------------------------------
+
+    def _xmp_values(self, metadata):
+        """XMP properties update_pdf_with_pikepdf writes, by key."""
+        values = {}
+        if "title" in metadata:
+            values["dc:title"] = metadata["title"]
+        if "creator" in metadata:
+            values["dc:creator"] = [c.strip() for c in metadata["creator"].split(";")]
+        if "description" in metadata:
+            values["dc:description"] = metadata["description"]
+        if "keywords" in metadata:
+            values["dc:subject"] = [k.strip() for k in metadata["keywords"].split(",")]
+            values["pdf:Keywords"] = metadata["keywords"]
+        return values
+
+    def _info_values(self, metadata):
+        """Document info entries update_pdf_with_pypdf writes, by key."""
+        keys = {"title": "/Title", "creator": "/Author", "description": "/Subject", "keywords": "/Keywords"}
+        return {keys[k]: metadata[k] for k in keys if k in metadata}
+
+    def metadata_digest(self, values):
+        """sha256 of the values in canonical form (sorted keys; bags are unordered)."""
+        canonical = {}
+        for key, value in values.items():
+            if value is None:
+                continue
+            if isinstance(value, (set, frozenset)) or key == "dc:subject":
+                value = sorted(str(v) for v in value)
+            elif isinstance(value, (list, tuple)):
+                value = [str(v) for v in value]
+            else:
+                value = str(value)
+            canonical[key] = value
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _same_file(self, a, b):
+        return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+    def _keep_unchanged(self, pdf_path, output_path):
+        print("✓ Metadata already up to date, PDF not rewritten")
+        if not self._same_file(pdf_path, output_path):
+            shutil.copy2(pdf_path, output_path)
+
+    def append_report(self, report_path, row):
+        new_file = not os.path.exists(report_path)
+        with open(report_path, "a", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            if new_file:
+                w.writeheader()
+            w.writerow(row)
+
     # -------------------------------------------------------------
     # SAFE METADATA UPDATE USING PIKEPDF
     # -------------------------------------------------------------
 
     def update_pdf_with_pikepdf(self, pdf_path, metadata, output_path):
+        """Returns SAVED, or UNCHANGED when the XMP already has these values."""
+
+        pdf = pikepdf.Pdf.open(pdf_path, allow_overwriting_input=self._same_file(pdf_path, output_path))
 
-        pdf = pikepdf.Pdf.open(pdf_path)
+        values = self._xmp_values(metadata)
+        current = pdf.open_metadata()
+        if self.metadata_digest(values) == self.metadata_digest({k: current.get(k) for k in values}):
+            pdf.close()
+            self._keep_unchanged(pdf_path, output_path)
+            return UNCHANGED
 
         has_out_before, has_struct_before = self._inspect_pdf_structure(pdf)
         print(f"Before update: Outlines={has_out_before}, StructureTags={has_struct_before}")
@@ -157,15 +232,8 @@ class XMPtoPDFUpdater:
             print(f"Backup saved: {backup_path}")
 
         with pdf.open_metadata() as meta:
-            if "title" in metadata:
-                meta["dc:title"] = metadata["title"]
-            if "creator" in metadata:
-                meta["dc:creator"] = [c.strip() for c in metadata["creator"].split(";")]
-            if "description" in metadata:
-                meta["dc:description"] = metadata["description"]
-            if "keywords" in metadata:
-                meta["dc:subject"] = [k.strip() for k in metadata["keywords"].split(",")]
-                meta["pdf:Keywords"] = metadata["keywords"]
+            for key, value in values.items():
+                meta[key] = value
 
         pdf.save(output_path)
 
@@ -182,28 +250,28 @@ class XMPtoPDFUpdater:
             print("⚠ TAG STRUCTURE LOSS DETECTED! Backup kept.")
 
         print(f"✓ PDF updated safely using pikepdf: {output_path}")
+        return SAVED
 
     # -------------------------------------------------------------
     # DANGEROUS pypdf UPDATE (ONLY IF FORCED)
     # -------------------------------------------------------------
 
     def update_pdf_with_pypdf(self, pdf_path, metadata, output_path):
+        """Returns SAVED, or UNCHANGED when the document info already has these values."""
         reader = PdfReader(pdf_path)
+        values = self._info_values(metadata)
+        current = reader.metadata or {}
+        if self.metadata_digest(values) == self.metadata_digest({k: current.get(k) for k in values}):
+            self._keep_unchanged(pdf_path, output_path)
+            return UNCHANGED
+
         writer = PdfWriter()
 
         for page in reader.pages:
             writer.add_page(page)
 
         pdf_meta = dict(reader.metadata or {})
-
-        if "title" in metadata:
-            pdf_meta["/Title"] = metadata["title"]
-        if "creator" in metadata:
-            pdf_meta["/Author"] = metadata["creator"]
-        if "description" in metadata:
-            pdf_meta["/Subject"] = metadata["description"]
-        if "keywords" in metadata:
-            pdf_meta["/Keywords"] = metadata["keywords"]
+        pdf_meta.update(values)
 
         writer.add_metadata(pdf_meta)
 
@@ -211,12 +279,18 @@ class XMPtoPDFUpdater:
             writer.write(f)
 
         print("⚠ WARNING: pypdf rebuilt PDF — bookmarks/tags may be lost.")
+        return SAVED
 
     # -------------------------------------------------------------
     # MAIN PROCESS
     # -------------------------------------------------------------
 
-    def process(self, pdf_path, xmp_path, output_path=None, debug=True, allow_pypdf=False):
+    def process(self, pdf_path, xmp_path, output_path=None, debug=True, allow_pypdf=False, report_path=None):
+        """
+        Returns SAVED / UNCHANGED (None on error). report_path: CSV the
+        decision is added to, one row per call.
+        """
+        started = time.time()
 
         if not os.path.exists(pdf_path):
             print("PDF not found:", pdf_path)
@@ -238,18 +312,29 @@ class XMPtoPDFUpdater:
         # Prefer PikePDF
         if USE_PIKEPDF:
             print("Using safe PikePDF path...")
-            self.update_pdf_with_pikepdf(pdf_path, metadata, output_path)
-            return
+            decision = self.update_pdf_with_pikepdf(pdf_path, metadata, output_path)
+            digest = self.metadata_digest(self._xmp_values(metadata))
 
         # Fallback only if user explicitly allows it
-        if USE_PYPDF and allow_pypdf:
+        elif USE_PYPDF and allow_pypdf:
             print("Using UNSAFE PyPDF path...")
-            self.update_pdf_with_pypdf(pdf_path, metadata, output_path)
+            decision = self.update_pdf_with_pypdf(pdf_path, metadata, output_path)
+            digest = self.metadata_digest(self._info_values(metadata))
+
+        else:
+            print("ERROR: Neither pikepdf installed nor pypdf allowed.")
+            print("Run: pip install pikepdf")
             return
 
-        print("ERROR: Neither pikepdf installed nor pypdf allowed.")
-        print("Run: pip install pikepdf")
-        return
+        if report_path:
+            self.append_report(report_path, {
+                "PDF": pdf_path,
+                "Output": output_path,
+                "Decision": decision,
+                "Metadata sha256": digest,
+                "Seconds": f"{time.time() - started:.2f}",
+            })
+        return decision
 
 
 # -------------------------------------------------------------
@@ -259,13 +344,15 @@ class XMPtoPDFUpdater:
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 3:
-        print("Usage: xmp.exe <pdf_file> <xmp_file>")
+        print("Usage: xmp.exe <pdf_file> <xmp_file> [report.csv]")
         sys.exit(1)
     pdf_path = sys.argv[1]
     xmp_path = sys.argv[2]
+    report_path = sys.argv[3] if len(sys.argv) > 3 else None
 
     updater = XMPtoPDFUpdater()
-    updater.process(pdf_path, xmp_path, output_path=None, debug=True, allow_pypdf=False)
+    updater.process(pdf_path, xmp_path, output_path=None, debug=True, allow_pypdf=False,
+                    report_path=report_path)
 
 
 # if __name__ == "__main__":
@@ -1,9 +1,26 @@
 """
 SMART MERGE XMP into PDF + CUSTOM PROPERTIES
 Works with PikePDF 5.x – 9.x safely
+
+smart_merge_into_pdf opens the PDF once, merges the XMP, updates the
+docinfo custom properties and saves once. The path-based helpers
+(read_existing_xmp, write_merged_xmp, write_custom_properties) each open and
+save the file on their own; they are kept for scripts that need one step.
+
+When the PDF already carries the merged packet and custom properties
+(compared as hashes of their canonical forms) the save is skipped, so a
+re-sync of unchanged files rewrites nothing. smart_merge_folder runs a
+folder of PDFs with .xmp sidecars and records saved/unchanged per file in a
+CSV report.
 """
 
+import csv
+import hashlib
+import json
 import os
+import shutil
+import sys
+import time
 from lxml import etree
 import pikepdf
 
@@ -13,33 +30,66 @@ NSMAP = {
     "prism": "http://prismstandard.org/namespaces/basic/2.0/",
 }
 
+RDF_ABOUT = "{%s}about" % NSMAP["rdf"]
+
+# compiled once, not per call
+FIND_RDF = etree.XPath("//rdf:RDF", namespaces=NSMAP)
+FIND_DESCRIPTIONS = etree.XPath("rdf:Description", namespaces=NSMAP)
+
+# XMP property (local name, any namespace) -> Acrobat custom property key.
+# Edit custom_properties.json to add publisher fields; this is the fallback.
+CUSTOM_PROPERTIES_FILE = "custom_properties.json"
+DEFAULT_CUSTOM_PROPERTIES = {
+    "CrossmarkDomainExclusive": "CrossmarkDomainExclusive",
+    "CrossmarkMajorVersionDate": "CrossmarkMajorVersionDate",
+    "ElsevierWebPDFSpecifications": "ElsevierWebPDFSpecifications",
+    "doi": "doi",
+    "robots": "robots",
+}
+
 
 # =====================================================================
 # READ existing XMP
 # =====================================================================
-def read_existing_xmp(pdf_path):
-    pdf = pikepdf.open(pdf_path)
-
+def existing_xmp(pdf):
+    """XMP packet of an open pikepdf.Pdf (b"" if it has none)."""
     try:
-        meta_stream = pdf.Root.Metadata
-        raw = meta_stream.read_bytes()
+        return pdf.Root.Metadata.read_bytes()
     except Exception:
-        raw = b""
+        return b""
 
-    pdf.close()
-    return raw
+
+def read_existing_xmp(pdf_path):
+    with pikepdf.open(pdf_path) as pdf:
+        return existing_xmp(pdf)
 
 
 # =====================================================================
 # READ new XMP file
 # =====================================================================
 def read_new_xmp(xmp_path):
-    return open(xmp_path, "rb").read()
+    with open(xmp_path, "rb") as f:
+        return f.read()
 
 
 # =====================================================================
 # SMART MERGE (append new rdf:Description blocks)
 # =====================================================================
+def _property_key(about, prop):
+    """(about, namespace, localname) of a property; None for comments/PIs."""
+    if not isinstance(prop.tag, str):
+        return None
+    qname = etree.QName(prop)
+    return (about, qname.namespace or "", qname.localname)
+
+
+def _index_properties(prop_map, about, desc):
+    for prop in desc:
+        key = _property_key(about, prop)
+        if key is not None:
+            prop_map[key] = prop
+
+
 def smart_merge_xmp(existing_bytes, new_bytes):
     if not existing_bytes.strip():
         return new_bytes
@@ -47,41 +97,41 @@ def smart_merge_xmp(existing_bytes, new_bytes):
     existing_root = etree.fromstring(existing_bytes)
     new_root = etree.fromstring(new_bytes)
 
-    existing_rdf = existing_root.xpath("//rdf:RDF", namespaces=NSMAP)[0]
-    new_rdf = new_root.xpath("//rdf:RDF", namespaces=NSMAP)[0]
+    existing_rdf = FIND_RDF(existing_root)[0]
+    new_rdf = FIND_RDF(new_root)[0]
 
+    # index the existing packet once: about -> Description and
+    # (about, ns, localname) -> property, so the merge is linear in the
+    # number of properties (font lists run to thousands of them)
+    desc_map = {}
     prop_map = {}
 
-    for desc in existing_rdf.xpath("rdf:Description", namespaces=NSMAP):
-        about = desc.get("{%s}about" % NSMAP['rdf'], "")
-        for prop in desc:
-            ns = prop.tag.split("}")[0][1:]
-            name = prop.tag.split("}")[-1]
-            prop_map[(about, ns, name)] = prop
-
-    for new_desc in new_rdf.xpath("rdf:Description", namespaces=NSMAP):
-        about = new_desc.get("{%s}about" % NSMAP['rdf'], "")
+    for desc in FIND_DESCRIPTIONS(existing_rdf):
+        about = desc.get(RDF_ABOUT, "")
+        desc_map.setdefault(about, desc)
+        _index_properties(prop_map, about, desc)
 
-        target = None
-        for d in existing_rdf.xpath("rdf:Description", namespaces=NSMAP):
-            if d.get("{%s}about" % NSMAP['rdf'], "") == about:
-                target = d
-                break
+    for new_desc in FIND_DESCRIPTIONS(new_rdf):
+        about = new_desc.get(RDF_ABOUT, "")
 
+        target = desc_map.get(about)
         if target is None:
             existing_rdf.append(new_desc)
+            desc_map[about] = new_desc
+            _index_properties(prop_map, about, new_desc)
             continue
 
-        for new_prop in new_desc:
-            ns = new_prop.tag.split("}")[0][1:]
-            name = new_prop.tag.split("}")[-1]
-            key = (about, ns, name)
+        # list(): appending moves the element out of new_desc
+        for new_prop in list(new_desc):
+            key = _property_key(about, new_prop)
+            if key is None:
+                continue
 
             if key in prop_map:
                 old = prop_map[key]
                 old.clear()
                 old.text = new_prop.text
-                for c in new_prop:
+                for c in list(new_prop):
                     old.append(c)
             else:
                 target.append(new_prop)
@@ -99,99 +149,247 @@ def smart_merge_xmp(existing_bytes, new_bytes):
 # =====================================================================
 # EXTRACT CUSTOM PROPERTIES FROM MERGED XMP
 # =====================================================================
-def extract_custom_properties(merged_xmp):
-    root = etree.fromstring(merged_xmp)
-    custom = {}
+def _config_dir():
+    # frozen exe: the config sits next to the .exe, not in the bundle
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(os.path.abspath(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def load_custom_property_map(path=None):
+    """
+    XMP local name -> docinfo key, from CUSTOM_PROPERTIES_FILE next to the
+    script (or the exe). Falls back to DEFAULT_CUSTOM_PROPERTIES.
+    """
+    if path is None:
+        path = os.path.join(_config_dir(), CUSTOM_PROPERTIES_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return dict(json.load(f))
+    except FileNotFoundError:
+        return dict(DEFAULT_CUSTOM_PROPERTIES)
 
-    # helper: find ANY namespace → match by local-name()
-    def find_any(tag_name):
-        nodes = root.xpath(f"//*[local-name()='{tag_name}']")
-        if nodes and nodes[0].text:
-            return nodes[0].text.strip()
-        return None
 
-    # fix your fields
-    custom["CrossmarkDomainExclusive"] = find_any("CrossmarkDomainExclusive")
-    custom["CrossmarkMajorVersionDate"] = find_any("CrossmarkMajorVersionDate")
+def extract_custom_properties(merged_xmp, property_map=None):
+    if property_map is None:
+        property_map = load_custom_property_map()
+    if not property_map:
+        return {}
+    root = etree.fromstring(merged_xmp)
+
+    # one pass over the tree for all fields: "{*}name" matches the local
+    # name in ANY namespace, and lxml filters the tags itself
+    found = {}
+    for node in root.iter(*("{*}" + name for name in property_map)):
+        name = etree.QName(node).localname
+        if name not in found:
+            found[name] = node
+            if len(found) == len(property_map):
+                break
 
-    custom["ElsevierWebPDFSpecifications"] = find_any("ElsevierWebPDFSpecifications")
-    custom["doi"] = find_any("doi")
-    custom["robots"] = find_any("robots")
+    custom = {}
+    for name, key in property_map.items():
+        node = found.get(name)
+        if node is not None and node.text and node.text.strip():
+            custom[key] = node.text.strip()
 
-    # only return non-empty
-    return {k: v for k, v in custom.items() if v}
+    # only non-empty values
+    return custom
 
 
 # =====================================================================
 # WRITE MERGED XMP BACK TO PDF
 # =====================================================================
-def write_merged_xmp(pdf_path, merged_bytes, output_path):
-    pdf = pikepdf.open(pdf_path)
-
+def set_merged_xmp(pdf, merged_bytes):
     pdf.Root.Metadata = pikepdf.Stream(pdf, merged_bytes)
 
-    pdf.save(output_path)
-    pdf.close()
+
+def write_merged_xmp(pdf_path, merged_bytes, output_path):
+    with pikepdf.open(pdf_path, allow_overwriting_input=_same_file(pdf_path, output_path)) as pdf:
+        set_merged_xmp(pdf, merged_bytes)
+        pdf.save(output_path)
     # print("✓ Wrote merged XMP to:", output_path)
 
 
 # =====================================================================
 # WRITE CUSTOM PROPERTIES TO Acrobat “Custom Tab”
 # =====================================================================
-def write_custom_properties(output_pdf, custom_dict):
-    pdf = pikepdf.open(output_pdf, allow_overwriting_input=True)
+def set_custom_properties(pdf, custom_dict):
     info = pdf.docinfo
 
     for k, v in custom_dict.items():
         pdf_key = "/" + k    # ✔ PikePDF requires /Prefix
         info[pdf_key] = str(v)
 
-    pdf.save()
-    pdf.close()
+
+def write_custom_properties(output_pdf, custom_dict):
+    with pikepdf.open(output_pdf, allow_overwriting_input=True) as pdf:
+        set_custom_properties(pdf, custom_dict)
+        pdf.save()
     # print("✓ Custom properties written:", custom_dict)
 
 
+def _same_file(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
 # =====================================================================
-# MAIN MERGE PROCESS
+# NO-OP DETECTION (skip the rewrite when nothing changes)
 # =====================================================================
-def smart_merge_into_pdf(pdf_path, xmp_path, output_path=None):
-    if output_path is None:
-        base, ext = os.path.splitext(pdf_path)
-        output_path = base + "_XMPmerged" + ext
+# blank text between elements is layout, not metadata: pretty_print
+# re-indents a packet differently after properties are replaced in place
+_CANONICAL_PARSER = etree.XMLParser(remove_blank_text=True)
 
-    # print("Reading existing XMP...")
-    existing = read_existing_xmp(pdf_path)
 
-    # print("Reading new XMP...")
-    new = read_new_xmp(xmp_path)
+def xmp_digest(xmp_bytes):
+    """sha256 of the canonical (C14N) packet; None when there is no packet."""
+    if not xmp_bytes.strip():
+        return None
+    try:
+        root = etree.fromstring(xmp_bytes, _CANONICAL_PARSER)
+    except etree.XMLSyntaxError:
+        return None
+    return hashlib.sha256(etree.tostring(root, method="c14n")).hexdigest()
+
+
+def custom_digest(custom_dict):
+    return hashlib.sha256(json.dumps(custom_dict, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def embedded_custom_properties(pdf, keys):
+    info = pdf.docinfo
+    return {k: str(info["/" + k]) for k in keys if "/" + k in info}
 
-    # print("Merging...")
-    merged = smart_merge_xmp(existing, new)
 
-    # print("Writing merged XMP...")
-    write_merged_xmp(pdf_path, merged, output_path)
+# =====================================================================
+# BATCH REPORT
+# =====================================================================
+REPORT_NAME = "xmp_report.csv"
+REPORT_FIELDS = ["PDF", "Output", "Decision", "XMP sha256", "Custom sha256", "Seconds"]
 
-    # print("Extracting custom properties...")
-    custom = extract_custom_properties(merged)
+SAVED = "saved"
+UNCHANGED = "unchanged"     # save skipped: the PDF already carries this metadata
 
-    # print("Writing custom properties...")
-    write_custom_properties(output_path, custom)
 
-    print("\n✔ COMPLETE")
+def append_report(report_path, row):
+    new_file = not os.path.exists(report_path)
+    with open(report_path, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        if new_file:
+            w.writeheader()
+        w.writerow(row)
+
+
+# =====================================================================
+# MAIN MERGE PROCESS
+# =====================================================================
+def smart_merge_into_pdf(pdf_path, xmp_path, output_path=None, report_path=None):
+    """
+    Returns SAVED, or UNCHANGED when the PDF already has the merged XMP and
+    custom properties: then nothing is written (the input is copied when
+    output_path is another file). report_path: CSV the decision is added to.
+    """
+    if output_path is None:
+        base, ext = os.path.splitext(pdf_path)
+        output_path = base + "_XMPmerged" + ext
+
+    started = time.time()
+    # print("Reading new XMP...")
+    new = read_new_xmp(xmp_path)
+    in_place = _same_file(pdf_path, output_path)
+
+    # one open, one save: the metadata is tiny, the PDF is not
+    with pikepdf.open(pdf_path, allow_overwriting_input=in_place) as pdf:
+        # print("Merging...")
+        existing = existing_xmp(pdf)
+        merged = smart_merge_xmp(existing, new)
+        custom = extract_custom_properties(merged)
+
+        merged_digest = xmp_digest(merged)
+        custom_hash = custom_digest(custom)
+        unchanged = (merged_digest is not None
+                     and merged_digest == xmp_digest(existing)
+                     and custom_hash == custom_digest(embedded_custom_properties(pdf, custom)))
+
+        if not unchanged:
+            set_merged_xmp(pdf, merged)
+
+            # print("Writing custom properties...")
+            set_custom_properties(pdf, custom)
+
+            pdf.save(output_path)
+
+    if unchanged and not in_place:
+        shutil.copy2(pdf_path, output_path)
+    decision = UNCHANGED if unchanged else SAVED
+
+    if report_path:
+        append_report(report_path, {
+            "PDF": pdf_path,
+            "Output": output_path,
+            "Decision": decision,
+            "XMP sha256": merged_digest,
+            "Custom sha256": custom_hash,
+            "Seconds": f"{time.time() - started:.2f}",
+        })
+
+    if unchanged:
+        print("\n✔ UNCHANGED - metadata already embedded, PDF not rewritten")
+    else:
+        print("\n✔ COMPLETE")
     # print("✔ All existing XMP preserved")
     # print("✔ All new XMP appended")
     # print("✔ Custom properties updated")
     # print("✔ Extensis / FontSense preserved")
     print("→ Output:", output_path)
+    return decision
+
+
+def smart_merge_folder(folder, output_folder=None, report_path=None):
+    """
+    Merge <name>.xmp into <name>.pdf for every PDF of `folder` that has a
+    sidecar. Without output_folder the PDFs are updated in place (the nightly
+    re-sync); unchanged ones are left untouched. Every decision goes to
+    report_path (default: REPORT_NAME in the output folder).
+    """
+    output_folder = output_folder or folder
+    os.makedirs(output_folder, exist_ok=True)
+    if report_path is None:
+        report_path = os.path.join(output_folder, REPORT_NAME)
+
+    counts = {SAVED: 0, UNCHANGED: 0, "failed": 0}
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        pdf_path = os.path.join(folder, name)
+        xmp_path = os.path.splitext(pdf_path)[0] + ".xmp"
+        if not os.path.exists(xmp_path):
+            continue
+        try:
+            decision = smart_merge_into_pdf(pdf_path, xmp_path, os.path.join(output_folder, name),
+                                            report_path=report_path)
+        except Exception as e:
+            print(f"❌ Failed: {name} → {e}")
+            append_report(report_path, {"PDF": pdf_path, "Decision": f"failed: {e}"})
+            decision = "failed"
+        counts[decision] += 1
+
+    print(f"\n{counts[SAVED]} saved, {counts[UNCHANGED]} unchanged, {counts['failed']} failed"
+          f" → Report: {report_path}")
+    return counts
 
 
 # =====================================================================
 # CLI ENTRY
 # =====================================================================
 if __name__ == "__main__":
-    import sys
+    if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]):
+        smart_merge_folder(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+        sys.exit(0)
+
     if len(sys.argv) < 3:
         print("Usage: python merge.py input.pdf input.xmp [output.pdf]")
+        print("       python merge.py pdf_folder [output_folder]")
         sys.exit(1)
 
     inp = sys.argv[1]
@@ -1,89 +1,157 @@
 from pdfixsdk import *
+import ctypes
+import hashlib
 import os
 
+from pdf_output import compact_pdf
 
+# Print a progress line every this many percent of an input's pages
+PROGRESS_STEP = 10
 
-def merge_pdfs_with_xobjects(input_pdf1, input_pdf2, output_pdf):
+
+def _as_stream(obj):
+    if obj and obj.GetObjectType() == kPdsStream:
+        return PdsStream(obj.obj)
+    return None
+
+
+def _stream_bytes(stream):
+    size = stream.GetSize()
+    if size <= 0:
+        return b""
+    data = (ctypes.c_ubyte * size)()
+    stream.Read(0, data, size)
+    return bytes(data)
+
+
+def page_content_key(page, doc_index):
+    """
+    Key equal for pages that draw the same thing: hash of the decoded content
+    stream(s) plus the page boxes and the resources dictionary they use
+    (resources are compared by object, so only within one input).
+    """
+    page_obj = page.GetPageObject()
+    contents = page_obj.Get("Contents")
+    if contents and contents.GetObjectType() == kPdsArray:
+        arr = PdsArray(contents.obj)
+        streams = [_as_stream(arr.Get(i)) for i in range(arr.GetNumObjects())]
+    else:
+        streams = [_as_stream(contents)]
+    digest = hashlib.sha256()
+    for stream in streams:
+        if stream is not None:
+            digest.update(_stream_bytes(stream))
+
+    resources = page_obj.GetDictionary("Resources")
+    if resources is None or resources.GetNumKeys() == 0:
+        resources_key = None                 # no resources: comparable across inputs
+    else:
+        resources_key = (doc_index, resources.GetId())
+    media, crop = page.GetMediaBox(), page.GetCropBox()
+    boxes = (media.left, media.bottom, media.right, media.top,
+             crop.left, crop.bottom, crop.right, crop.top)
+    return digest.hexdigest(), resources_key, boxes
+
+
+def merge_pdfs_with_xobjects(input_pdfs, output_pdf, compact_output=False, dedupe_pages=True):
     """
     Alternative: Use XObjects to copy pages
+
+    input_pdfs: the first document keeps its pages; every page of the others is
+    appended to it as a page drawing a form XObject made from the source page
+    dedupe_pages: pages with identical content (blank / template pages) share
+    one XObject instead of getting a copy each
+    compact_output: re-write the result with object streams + xref stream (needs pikepdf)
     """
+    if len(input_pdfs) < 2:
+        raise ValueError("merge_pdfs_with_xobjects needs at least two input PDFs")
+
     pdfix = GetPdfix()
     if not pdfix:
         raise Exception("PDFix initialization failed")
-    
-    doc1 = None
-    doc2 = None
-    
+
+    docs = []
     try:
-        doc1 = pdfix.OpenDoc(input_pdf1, "")
-        doc2 = pdfix.OpenDoc(input_pdf2, "")
-        
-        if not doc1 or not doc2:
-            raise Exception("Cannot open documents")
-        
-        num_pages_doc1 = doc1.GetNumPages()
-        num_pages_doc2 = doc2.GetNumPages()
-        
-        print(f"Document 1: {num_pages_doc1} pages")
-        print(f"Document 2: {num_pages_doc2} pages")
-        
-        # Process doc2 pages one by one
-        for i in range(num_pages_doc2):
-            print(f"Processing page {i+1}/{num_pages_doc2}...")
-            
-            # Acquire page from doc2
-            page2 = doc2.AcquirePage(i)
-            if not page2:
-                print(f"Failed to acquire page {i}")
-                continue
-            
-            # Get page dimensions
-            media_box = page2.GetMediaBox()
-            
-            # Create XObject from page
-            xobject = doc1.CreateXObjectFromPage(page2)
-            if not xobject:
-                print(f"Failed to create XObject for page {i}")
-                page2.Release()
-                continue
-            
-            # Create new page in doc1
-            new_page = doc1.CreatePage(num_pages_doc1 + i, media_box)
-            if not new_page:
-                print(f"Failed to create page {i}")
-                page2.Release()
-                continue
-            
-            # Get content and add the XObject
-            content = new_page.GetContent()
-            if content:
-                matrix = PdfMatrix()
-                form = content.AddNewForm(0, xobject, matrix)
-                new_page.SetContent()
-            
-            page2.Release()
-            new_page.Release()
-        
+        for path in input_pdfs:
+            doc = pdfix.OpenDoc(path, "")
+            if not doc:
+                raise Exception(f"Cannot open document {path}: {pdfix.GetError()}")
+            docs.append(doc)
+
+        out_doc = docs[0]
+        total = sum(doc.GetNumPages() for doc in docs[1:])
+        print(f"{os.path.basename(input_pdfs[0])}: {out_doc.GetNumPages()} pages (base document)")
+        print(f"Appending {total} pages from {len(docs) - 1} document(s)")
+
+        xobjects = {}        # page_content_key -> XObject in out_doc
+        reused = failed = 0
+        for doc_index, (path, doc) in enumerate(zip(input_pdfs[1:], docs[1:]), start=1):
+            num_pages = doc.GetNumPages()
+            name = os.path.basename(path)
+            next_report = PROGRESS_STEP
+            for i in range(num_pages):
+                page = doc.AcquirePage(i)
+                if not page:
+                    print(f"Failed to acquire page {i + 1} of {name}")
+                    failed += 1
+                    continue
+                new_page = None
+                try:
+                    key = page_content_key(page, doc_index) if dedupe_pages else None
+                    xobject = xobjects.get(key) if key is not None else None
+                    if xobject is None:
+                        xobject = out_doc.CreateXObjectFromPage(page)
+                        if not xobject:
+                            raise Exception(f"Failed to create XObject for page {i + 1} of {name}")
+                        if key is not None:
+                            xobjects[key] = xobject
+                    else:
+                        reused += 1
+
+                    new_page = out_doc.CreatePage(out_doc.GetNumPages(), page.GetMediaBox())
+                    if not new_page:
+                        raise Exception(f"Failed to create page for page {i + 1} of {name}")
+                    content = new_page.GetContent()
+                    if content:
+                        content.AddNewForm(0, xobject, PdfMatrix())
+                        new_page.SetContent()
+                except Exception as e:
+                    print(str(e))
+                    failed += 1
+                finally:
+                    if new_page:
+                        new_page.Release()
+                    page.Release()
+
+                percent = 100 * (i + 1) // num_pages
+                if percent >= next_report or i + 1 == num_pages:
+                    print(f"  {name}: {i + 1}/{num_pages} pages ({percent}%)")
+                    next_report = percent + PROGRESS_STEP
+
+        print(f"Pages appended: {total - failed}, XObjects created: {total - failed - reused}, "
+              f"reused for identical pages: {reused}" + (f", failed: {failed}" if failed else ""))
+
         # Save
-        if not doc1.Save(output_pdf, kSaveFull):
+        if not out_doc.Save(output_pdf, kSaveFull):
             raise Exception("Save failed")
-        
+
         print(f"Saved to {output_pdf}")
-        
-        doc2.Close()
-        doc1.Close()
-        return True
-        
     except Exception as e:
         print(f"Error: {str(e)}")
         return False
     finally:
+        for doc in reversed(docs):
+            doc.Close()
         pdfix.Destroy()
 
+    if compact_output:
+        compact_pdf(output_pdf)
+    return True
+
 if __name__ == "__main__":
     # Make sure PDFix is initialized first
     import sys
-    
+
     # Initialize PDFix library (adjust path to your PDFix DLL/SO)
     try:
         Pdfix_init(fr"D:\PDF Accessibility\venv\Lib\site-packages\pdfixsdk\bin\x86_64\pdf.dll")  # Windows
@@ -92,12 +160,13 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Failed to initialize PDFix: {e}")
         sys.exit(1)
-    
+
     merge_pdfs_with_xobjects(
-        fr"C:\Users\is6076\Downloads\merge\05_9780443184529_Ch01.pdf",
-        fr"C:\Users\is6076\Downloads\merge\09_9780443184529_ind.pdf",
-       
+        [
+            fr"C:\Users\is6076\Downloads\merge\05_9780443184529_Ch01.pdf",
+            fr"C:\Users\is6076\Downloads\merge\09_9780443184529_ind.pdf",
+        ],
        fr"C:\Users\is6076\Downloads\merge\s1.pdf",
     )
-    
+
     Pdfix_destroy()
@@ -0,0 +1,203 @@
+"""
+Link inventory: one SQLite database for every link the tools process.
+
+The link converters (merge_pdfs_preserve_links, task/1st_step.py,
+task/link_index.py) record each link they touch and each target they could
+not resolve. Rows are buffered and written with executemany inside a single
+transaction per batch, so recording costs next to nothing next to the PDF
+work. QA queries the database instead of grepping per-run CSV files:
+
+    python link_inventory.py unresolved 7          # unresolved GoToR, last 7 days
+    python link_inventory.py unresolved 30 BOOK     # ... for one book
+
+The database path defaults to link_inventory.sqlite next to this file and can
+be overridden with the LINK_INVENTORY_DB environment variable.
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+DEFAULT_DB = os.environ.get(
+    "LINK_INVENTORY_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "link_inventory.sqlite"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id           INTEGER PRIMARY KEY,
+    started_at   TEXT NOT NULL,
+    tool         TEXT NOT NULL,
+    book         TEXT NOT NULL,
+    input_path   TEXT,
+    output_path  TEXT
+);
+CREATE TABLE IF NOT EXISTS links (
+    id           INTEGER PRIMARY KEY,
+    run_id       INTEGER NOT NULL REFERENCES runs(id),
+    recorded_at  TEXT NOT NULL,
+    book         TEXT NOT NULL,
+    chapter      TEXT,
+    page         INTEGER,
+    rect         TEXT,
+    kind_before  TEXT,
+    kind_after   TEXT,
+    target_page  INTEGER,
+    target_name  TEXT,
+    target_file  TEXT,
+    alt_text     TEXT
+);
+CREATE TABLE IF NOT EXISTS broken_targets (
+    id           INTEGER PRIMARY KEY,
+    run_id       INTEGER NOT NULL REFERENCES runs(id),
+    recorded_at  TEXT NOT NULL,
+    book         TEXT NOT NULL,
+    chapter      TEXT,
+    page         INTEGER,
+    kind         TEXT,
+    target_page  INTEGER,
+    target_name  TEXT,
+    target_file  TEXT,
+    reason       TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_links_time   ON links (recorded_at);
+CREATE INDEX IF NOT EXISTS ix_links_book   ON links (book, page);
+CREATE INDEX IF NOT EXISTS ix_links_kind   ON links (kind_before, kind_after, recorded_at);
+CREATE INDEX IF NOT EXISTS ix_links_target ON links (target_file);
+CREATE INDEX IF NOT EXISTS ix_broken_kind  ON broken_targets (kind, recorded_at);
+CREATE INDEX IF NOT EXISTS ix_broken_book  ON broken_targets (book, page);
+"""
+
+LINK_FIELDS = ("chapter", "page", "rect", "kind_before", "kind_after",
+               "target_page", "target_name", "target_file", "alt_text")
+BROKEN_FIELDS = ("chapter", "page", "kind", "target_page", "target_name", "target_file", "reason")
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_rect(rect):
+    """[x0, y0, x1, y1] (numbers or PDF number objects) -> "x0 y0 x1 y1"."""
+    if rect is None:
+        return None
+    try:
+        return " ".join(f"{float(v):g}" for v in rect)
+    except Exception:
+        return str(rect)
+
+
+class LinkInventory:
+    """
+    Buffered writer/reader for the inventory database.
+
+        with LinkInventory() as inv:
+            inv.start_run("merge", book="9780443184529", output_path=out)
+            inv.add_link(chapter="05_..._Ch01.pdf", page=12, kind_before="GoToR", ...)
+            inv.add_broken(page=40, kind="GoToR", target_file="x.pdf", reason="...")
+
+    readonly=True opens an existing database for the queries only: nothing is
+    created, and a missing file raises FileNotFoundError.
+    """
+
+    def __init__(self, db_path=None, batch_size=2000, readonly=False):
+        self.db_path = db_path or DEFAULT_DB
+        self.batch_size = batch_size
+        if readonly:
+            if not os.path.exists(self.db_path):
+                raise FileNotFoundError(f"link inventory not found: {self.db_path}")
+            self.conn = sqlite3.connect(Path(self.db_path).resolve().as_uri() + "?mode=ro", uri=True)
+        else:
+            self.conn = sqlite3.connect(self.db_path)
+            self.conn.executescript(SCHEMA)
+        self.run_id = None
+        self.book = None
+        self._links = []
+        self._broken = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start_run(self, tool, book, input_path=None, output_path=None):
+        self.flush()
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (started_at, tool, book, input_path, output_path) VALUES (?, ?, ?, ?, ?)",
+                (_now(), tool, book, input_path, output_path))
+        self.run_id = cur.lastrowid
+        self.book = book
+        return self.run_id
+
+    def add_link(self, **fields):
+        self._links.append((self.run_id, _now(), self.book) + tuple(fields.get(f) for f in LINK_FIELDS))
+        if len(self._links) >= self.batch_size:
+            self.flush()
+
+    def add_broken(self, **fields):
+        self._broken.append((self.run_id, _now(), self.book) + tuple(fields.get(f) for f in BROKEN_FIELDS))
+        if len(self._broken) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._links and not self._broken:
+            return
+        if self.run_id is None:
+            raise RuntimeError("LinkInventory.start_run() must be called before recording links")
+        with self.conn:
+            if self._links:
+                self.conn.executemany(
+                    f"INSERT INTO links (run_id, recorded_at, book, {', '.join(LINK_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * (len(LINK_FIELDS) + 3))})", self._links)
+            if self._broken:
+                self.conn.executemany(
+                    f"INSERT INTO broken_targets (run_id, recorded_at, book, {', '.join(BROKEN_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * (len(BROKEN_FIELDS) + 3))})", self._broken)
+        self._links.clear()
+        self._broken.clear()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+    # --- queries -------------------------------------------------------------
+    def unresolved_gotor(self, days=7, book=None):
+        """Broken GoToR targets recorded in the last `days` days (newest first)."""
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        sql = ("SELECT recorded_at, book, chapter, page, target_file, target_page, target_name, reason "
+               "FROM broken_targets WHERE kind = 'GoToR' AND recorded_at >= ?")
+        args = [since]
+        if book:
+            sql += " AND book = ?"
+            args.append(book)
+        sql += " ORDER BY recorded_at DESC"
+        return self.conn.execute(sql, args).fetchall()
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != "unresolved":
+        print(__doc__)
+        return 1
+    days = float(argv[2]) if len(argv) > 2 else 7
+    book = argv[3] if len(argv) > 3 else None
+    try:
+        inv = LinkInventory(readonly=True)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return 1
+    with inv:
+        rows = inv.unresolved_gotor(days, book)
+    for row in rows:
+        print(" | ".join("" if v is None else str(v) for v in row))
+    print(f"{len(rows)} unresolved GoToR target(s) in the last {days:g} day(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,569 @@
+"""
+Backend-neutral link remapping for merged books.
+
+The rules that used to live inside merge_pdfs_preserve_links
+(working_internal_external.py) are kept here so that every merge engine
+applies exactly the same logic:
+
+  - internal /Dest and /GoTo destinations are remapped onto merged pages
+  - /GoToR links whose target file is one of the merged inputs become /GoTo
+  - /GoToR links to files outside the book get a clean, direct filespec
+  - /URI values are normalized to text strings
+
+The PDF library is hidden behind MergeBackend; see PypdfMergeBackend in
+working_internal_external.py and PikepdfMergeBackend in pikepdf_backend.py.
+"""
+
+import bisect
+import csv
+import os
+import traceback
+
+from link_inventory import format_rect
+
+# Same columns as the CSV written by task/1st_step.py
+REPORT_FIELDS = ["Source Page", "Destination Page"]
+
+# External link actions that identical links share a single object for
+SHARED_ACTION_TYPES = ("/URI", "/Launch")
+
+
+class MergeBackend:
+    """
+    Interface a PDF library has to provide for the merge.
+
+    "Native" objects are whatever the library uses for PDF objects; the
+    remapper never looks inside them except through these methods.
+    """
+
+    name = "base"
+
+    # True if balance_page_tree is implemented
+    balances_page_tree = False
+
+    # --- documents -------------------------------------------------------
+    def open_input(self, path):
+        """Open an input PDF (kept open until close()); return its page count."""
+        raise NotImplementedError
+
+    def append_pages(self, r_idx, sleep_between_pages=0.0):
+        """Copy every page of input `r_idx` to the end of the output."""
+        raise NotImplementedError
+
+    def page_count(self):
+        raise NotImplementedError
+
+    def save(self, output_path, compact=False, linearize=False):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def dedupe_resources(self):
+        """Collapse identical shared resources; return {"counts": {...}, "bytes_saved": n}."""
+        raise NotImplementedError
+
+    def merge_structure_trees(self, readers):
+        """
+        Combine the inputs' structure trees under one StructTreeRoot (called
+        after every input's pages are appended). Returns
+        {"tagged": n, "untagged": [filename], "parent_tree_keys": n,
+         "renamed": [(map_key, name, new_name, filename)]}.
+        """
+        raise NotImplementedError
+
+    # --- outlines ------------------------------------------------------------
+    def read_outline(self, r_idx):
+        """
+        Bookmarks of input `r_idx` as
+        [{"title": str, "dest": native dest or None, "action": native action or None,
+          "open": bool, "children": [...]}];
+        "dest" is the raw /Dest (or /GoTo /D) of the item; "action" is any other
+        /A (URI, Launch, Named, GoToR), already copied into the output.
+        """
+        raise NotImplementedError
+
+    def document_title(self, r_idx):
+        """Document info /Title of input `r_idx`, or None."""
+        raise NotImplementedError
+
+    def write_outline(self, nodes):
+        """Replace the output's outline with `nodes` (same shape as read_outline)."""
+        raise NotImplementedError
+
+    # --- page tree -------------------------------------------------------------
+    def balance_page_tree(self, fanout):
+        """
+        Rebuild the output page tree with at most `fanout` kids per /Pages node
+        (page_tree.balanced_groups), inherited attributes copied onto the pages,
+        and rebuild the backend's page index from the new tree. Returns
+        {"pages": n, "nodes": n, "depth": n}.
+        """
+        raise NotImplementedError
+
+    # --- annotations & dictionaries ---------------------------------------
+    def iter_link_annots(self, m_idx):
+        """Yield the /Link annotation dictionaries of merged page `m_idx`."""
+        raise NotImplementedError
+
+    def get_action(self, annot):
+        """Return the (resolved) /A action dictionary of an annotation, or None."""
+        raise NotImplementedError
+
+    def has(self, d, key):
+        raise NotImplementedError
+
+    def get(self, d, key):
+        raise NotImplementedError
+
+    def set(self, d, key, value):
+        raise NotImplementedError
+
+    def delete(self, d, key):
+        raise NotImplementedError
+
+    def name_of(self, obj):
+        """PDF name as a str ("/GoTo"), or None."""
+        raise NotImplementedError
+
+    def text_of(self, obj):
+        """Decode a PDF string-like object to str."""
+        raise NotImplementedError
+
+    def filespec_filename(self, fspec):
+        """Filename from a filespec (string, dict with /UF or /F, ...), or None."""
+        raise NotImplementedError
+
+    # --- shared actions ----------------------------------------------------
+    def action_key(self, action):
+        """Hashable key equal for actions with the same entries (resolved), or None."""
+        raise NotImplementedError
+
+    def share_action(self, annot):
+        """Make the annotation's /A an indirect object and return it."""
+        raise NotImplementedError
+
+    def use_shared_action(self, annot, shared):
+        """Point the annotation's /A at `shared` (an object returned by share_action)."""
+        raise NotImplementedError
+
+    def sweep_replaced_actions(self):
+        """Drop action objects no link refers to any more; return how many were dropped."""
+        raise NotImplementedError
+
+    # --- destinations ------------------------------------------------------
+    def parse_dest(self, dest_obj):
+        """
+        Normalize a destination to (kind, value, tail):
+          ("page",   native page object, tail)
+          ("number", page index in the source document, tail)
+          ("name",   named destination as str, tail)
+        `tail` is the list of native view parameters after the page entry
+        (empty for bare destinations). Returns None if not understood.
+        """
+        raise NotImplementedError
+
+    def locate_page(self, page_obj):
+        """(r_idx, page_index) of the source page behind `page_obj`, or None."""
+        raise NotImplementedError
+
+    def resolve_named_dest(self, r_idx, name):
+        """Page index of named destination `name` in input `r_idx`, or None."""
+        raise NotImplementedError
+
+    # --- object construction ------------------------------------------------
+    def make_dest(self, merged_idx, tail=None):
+        """[merged page ref] + tail, or [merged page ref /Fit] when tail is empty."""
+        raise NotImplementedError
+
+    def make_name(self, name):
+        raise NotImplementedError
+
+    def make_text(self, text):
+        raise NotImplementedError
+
+    def make_filespec(self, filename):
+        """Direct filespec dictionary with /F and /UF."""
+        raise NotImplementedError
+
+
+def match_target_reader(target_fname, readers):
+    """
+    Find which merged input a GoToR filespec points to.
+
+    Match heuristics (ordered): exact basename, basename without extension,
+    target contains the input filename (InDesign partial paths), and finally
+    a very permissive basename substring match. Returns reader index or None.
+    """
+    if not target_fname:
+        return None
+
+    target_basename = os.path.basename(target_fname)
+    target_basename_lower = target_basename.lower() if target_basename else None
+
+    if target_basename_lower:
+        for rr_idx, rr in enumerate(readers):
+            if rr["filename"].lower() == target_basename_lower:
+                return rr_idx
+
+        tb0 = os.path.splitext(target_basename_lower)[0]
+        for rr_idx, rr in enumerate(readers):
+            if os.path.splitext(rr["filename"])[0].lower() == tb0:
+                return rr_idx
+
+    tnorm_lower = target_fname.lower()
+    for rr_idx, rr in enumerate(readers):
+        if rr["filename"].lower() in tnorm_lower:
+            return rr_idx
+
+    if target_basename_lower:
+        squeezed = target_basename_lower.replace(" ", "")
+        for rr_idx, rr in enumerate(readers):
+            if rr["filename"].lower().replace(" ", "") in squeezed:
+                return rr_idx
+
+    return None
+
+
+class LinkRemapper:
+    """
+    Walks the link annotations of a merged document and applies the remap rules.
+
+    readers: list of dicts with "filename", "path", "start_page", "num_pages",
+             in merge order (index == backend input index).
+    """
+
+    def __init__(self, backend, readers, verbose=True, inventory=None):
+        self.backend = backend
+        self.readers = readers
+        self.verbose = verbose
+        self.inventory = inventory   # link_inventory.LinkInventory, optional
+        self.total_pages = sum(r["num_pages"] for r in readers)
+        self._starts = [r["start_page"] for r in readers]
+
+        self.links_updated = 0
+        self.links_converted = 0
+        self.links_normalized = 0
+        self.links_remapped_internal = 0
+        self.report_rows = []   # one row per GoToR converted to GoTo (1-based pages)
+        self._broken_reason = None
+        self.actions_shared = 0
+        self.actions_dropped = 0
+        self._shared_actions = {}   # backend.action_key -> shared /URI or /Launch action
+
+    def _log(self, msg):
+        if self.verbose:
+            print(msg)
+
+    def source_reader_of(self, m_idx):
+        """Input index that produced merged page `m_idx`."""
+        i = bisect.bisect_right(self._starts, m_idx) - 1
+        if i >= 0 and m_idx < self._starts[i] + self.readers[i]["num_pages"]:
+            return i
+        return None
+
+    def merged_index(self, r_idx, page_index):
+        if r_idx is None or page_index is None:
+            return None
+        if not 0 <= page_index < self.readers[r_idx]["num_pages"]:
+            return None
+        return self.readers[r_idx]["start_page"] + page_index
+
+    def resolve_named(self, name):
+        """Merged page index of a named destination, searching every input in order."""
+        for rr_idx in range(len(self.readers)):
+            try:
+                page_num = self.backend.resolve_named_dest(rr_idx, name)
+            except Exception:
+                continue
+            if page_num is not None:
+                return self.merged_index(rr_idx, page_num)
+        return None
+
+    def remap_dest(self, dest_obj, src_r_idx):
+        """Destination (any form) -> native dest array on the merged page, or None."""
+        be = self.backend
+        try:
+            parsed = be.parse_dest(dest_obj)
+        except Exception:
+            return None
+        if parsed is None:
+            return None
+        kind, value, tail = parsed
+
+        merged = None
+        if kind == "page":
+            loc = be.locate_page(value)
+            if loc is not None:
+                merged = self.merged_index(*loc)
+        elif kind == "number":
+            # numeric index relative to the annotation's own document
+            merged = self.merged_index(src_r_idx, value)
+        elif kind == "name":
+            merged = self.resolve_named(value)
+
+        if merged is None:
+            return None
+        return be.make_dest(merged, tail)
+
+    def _gotor_dest_page(self, action, matched_ridx):
+        """Page index inside the matched input that a GoToR /D points to (default 0)."""
+        be = self.backend
+        if not be.has(action, "/D"):
+            return 0
+        try:
+            parsed = be.parse_dest(be.get(action, "/D"))
+        except Exception:
+            return 0
+        if parsed is None:
+            return 0
+        kind, value, _tail = parsed
+        if kind == "page":
+            loc = be.locate_page(value)
+            if loc is not None and loc[0] == matched_ridx:
+                return loc[1]
+            return 0
+        if kind == "number":
+            return int(value)
+        if kind == "name":
+            try:
+                pn = be.resolve_named_dest(matched_ridx, value)
+            except Exception:
+                pn = None
+            return int(pn) if pn is not None else 0
+        return 0
+
+    def _process_gotor(self, m_idx, action):
+        be = self.backend
+        target_raw = be.get(action, "/F") if be.has(action, "/F") else None
+        target_fname = be.filespec_filename(target_raw) if target_raw is not None else None
+        if target_fname is None and target_raw is not None:
+            try:
+                target_fname = str(target_raw)
+            except Exception:
+                target_fname = None
+
+        matched_ridx = match_target_reader(target_fname, self.readers)
+
+        if matched_ridx is not None:
+            tgt_reader = self.readers[matched_ridx]
+            dest_page = self._gotor_dest_page(action, matched_ridx)
+            new_page = self.merged_index(matched_ridx, dest_page)
+            if new_page is not None:
+                be.set(action, "/S", be.make_name("/GoTo"))
+                be.set(action, "/D", be.make_dest(new_page))
+                if be.has(action, "/F"):
+                    try:
+                        be.delete(action, "/F")
+                    except Exception:
+                        pass
+                self.links_updated += 1
+                self.links_converted += 1
+                self.report_rows.append({
+                    "Source Page": m_idx + 1,
+                    "Destination Page": new_page + 1
+                })
+                self._log(f"Page {m_idx}: converted GoToR -> GoTo (target {tgt_reader['filename']} page {dest_page} => merged page {new_page})")
+                return
+
+        if matched_ridx is not None:
+            self._broken_reason = "page outside the target document"
+        else:
+            self._broken_reason = "target file is not one of the merged inputs"
+
+        # Not converted (no match): normalize /F to a direct filespec so it is not
+        # an IndirectObject or dangling reference
+        if target_fname:
+            try:
+                be.set(action, "/F", be.make_filespec(target_fname))
+                self.links_normalized += 1
+                self._log(f"Page {m_idx}: normalized external GoToR /F -> {target_fname}")
+            except Exception:
+                print(f"[WARN] could not normalize external filespec on merged page {m_idx}, target={target_fname}")
+                traceback.print_exc()
+        else:
+            print(f"[WARN] GoToR on page {m_idx} had no decodable /F filespec (raw: {repr(target_raw)})")
+
+    def process_annotation(self, m_idx, src_r_idx, annot):
+        if self.inventory is None:
+            self._apply_rules(m_idx, src_r_idx, annot)
+            return
+        self._broken_reason = None
+        before = self._describe_link(annot)
+        self._apply_rules(m_idx, src_r_idx, annot)
+        try:
+            self._record(m_idx, src_r_idx, annot, before)
+        except Exception:
+            traceback.print_exc()
+
+    def _describe_link(self, annot):
+        """{"kind", "name", "file", "page"} of a link's current target (page: index or None)."""
+        be = self.backend
+        action = be.get_action(annot)
+        info = {"kind": None, "name": None, "file": None, "page": None}
+        dest = None
+        if action is None:
+            if be.has(annot, "/Dest"):
+                info["kind"] = "Dest"
+                dest = be.get(annot, "/Dest")
+        else:
+            if be.has(action, "/S"):
+                info["kind"] = (be.name_of(be.get(action, "/S")) or "").lstrip("/") or None
+            if be.has(action, "/D"):
+                dest = be.get(action, "/D")
+            if be.has(action, "/F"):
+                info["file"] = be.filespec_filename(be.get(action, "/F"))
+            elif info["kind"] == "URI" and be.has(action, "/URI"):
+                info["file"] = be.text_of(be.get(action, "/URI"))
+        if dest is not None:
+            try:
+                parsed = be.parse_dest(dest)
+            except Exception:
+                parsed = None
+            if parsed is not None:
+                kind, value, _tail = parsed
+                if kind == "name":
+                    info["name"] = str(value)
+                elif kind == "number":
+                    info["page"] = int(value)
+                elif kind == "page":
+                    loc = be.locate_page(value)
+                    if loc is not None:
+                        info["page"] = self.merged_index(*loc)
+        return info
+
+    def _record(self, m_idx, src_r_idx, annot, before):
+        be = self.backend
+        after = self._describe_link(annot)
+        chapter = self.readers[src_r_idx]["filename"] if src_r_idx is not None else None
+        rect = be.get(annot, "/Rect") if be.has(annot, "/Rect") else None
+        alt = be.text_of(be.get(annot, "/Contents")) if be.has(annot, "/Contents") else None
+        # merged page for internal links, page in the remote file for GoToR left external
+        target_page = after["page"] if after["kind"] in ("GoTo", "Dest") else before["page"]
+        self.inventory.add_link(
+            chapter=chapter,
+            page=m_idx + 1,
+            rect=format_rect(rect),
+            kind_before=before["kind"],
+            kind_after=after["kind"],
+            target_page=target_page + 1 if target_page is not None else None,
+            target_name=before["name"],
+            target_file=before["file"],
+            alt_text=alt,
+        )
+        if self._broken_reason:
+            self.inventory.add_broken(
+                chapter=chapter,
+                page=m_idx + 1,
+                kind=before["kind"],
+                target_page=before["page"] + 1 if before["page"] is not None else None,
+                target_name=before["name"],
+                target_file=before["file"],
+                reason=self._broken_reason,
+            )
+
+    def _apply_rules(self, m_idx, src_r_idx, annot):
+        be = self.backend
+
+        # Annot-level /Dest (some links use /Dest instead of /A)
+        try:
+            if be.has(annot, "/Dest"):
+                new_dest = self.remap_dest(be.get(annot, "/Dest"), src_r_idx)
+                if new_dest is not None:
+                    be.set(annot, "/Dest", new_dest)
+                    self.links_remapped_internal += 1
+                    self._log(f"Page {m_idx}: remapped annotation-level /Dest")
+                else:
+                    self._broken_reason = "destination not found"
+        except Exception:
+            traceback.print_exc()
+
+        action = be.get_action(annot)
+        if action is None:
+            return
+
+        s_type = be.name_of(be.get(action, "/S")) if be.has(action, "/S") else None
+
+        # Internal GoTo remap
+        if s_type == "/GoTo":
+            try:
+                if be.has(action, "/D"):
+                    newd = self.remap_dest(be.get(action, "/D"), src_r_idx)
+                    if newd is not None:
+                        be.set(action, "/D", newd)
+                        self.links_remapped_internal += 1
+                        self.links_updated += 1
+                        self._log(f"Page {m_idx}: remapped internal /GoTo")
+                    else:
+                        self._broken_reason = "destination not found"
+            except Exception:
+                traceback.print_exc()
+
+        # Remote GoToR handling
+        if s_type == "/GoToR":
+            try:
+                self._process_gotor(m_idx, action)
+            except Exception:
+                traceback.print_exc()
+
+        # URI handling: ensure it's a text string
+        if s_type == "/URI" and be.has(action, "/URI"):
+            try:
+                uri = be.text_of(be.get(action, "/URI"))
+                if uri is not None:
+                    be.set(action, "/URI", be.make_text(uri))
+            except Exception:
+                traceback.print_exc()
+
+        # Reference lists repeat the same doi.org / publisher links: one action object per target
+        if s_type in SHARED_ACTION_TYPES:
+            try:
+                self._share_action(annot, action)
+            except Exception:
+                traceback.print_exc()
+
+    def _share_action(self, annot, action):
+        be = self.backend
+        key = be.action_key(action)
+        if key is None:
+            return
+        shared = self._shared_actions.get(key)
+        if shared is None:
+            self._shared_actions[key] = be.share_action(annot)
+        else:
+            be.use_shared_action(annot, shared)
+            self.actions_shared += 1
+
+    def run(self):
+        """Process every link annotation of the merged document."""
+        for m_idx in range(self.backend.page_count()):
+            src_r_idx = self.source_reader_of(m_idx)
+            try:
+                annots = list(self.backend.iter_link_annots(m_idx))
+            except Exception:
+                continue
+            for annot in annots:
+                self.process_annotation(m_idx, src_r_idx if src_r_idx is not None else 0, annot)
+        self.actions_dropped = self.backend.sweep_replaced_actions()
+
+    def print_summary(self):
+        print(f"\nLinks converted: {self.links_converted}, normalized externals: {self.links_normalized}, internal remapped: {self.links_remapped_internal}")
+        print(f"Total link actions updated: {self.links_updated}")
+        if self._shared_actions:
+            print(f"URI/Launch actions: {len(self._shared_actions)} distinct, "
+                  f"{self.actions_shared} link(s) now share one of them")
+
+
+def export_csv_report(report_rows, csv_path):
+    """Write converted-link rows to CSV (same format as task/1st_step.py)."""
+    if not report_rows:
+        print("📄 No links were converted, skipping CSV export.")
+        return
+
+    with open(csv_path, mode='w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for row in report_rows:
+            writer.writerow(row)
+
+    print(f"📊 CSV report generated: {csv_path}")
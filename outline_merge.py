@@ -0,0 +1,70 @@
+"""
+Book outline for merged chapters.
+
+Every input becomes one chapter-level bookmark pointing at its first merged
+page; the chapter's own bookmarks are nested below it. Their destinations go
+through LinkRemapper.remap_dest, i.e. the page-reference -> merged-index map
+the backends build while appending pages, so no bookmark ever scans the page
+list. The title filters of Bookmark_cleaning are applied on the way, compiled
+by the same bookmark_filter.compile_filters ("word:" and "re:" rules
+included): a matching bookmark is dropped and its children take its place.
+Bookmarks whose action is not a GoTo (URI, Launch, Named, GoToR) keep the
+original /A, copied into the book by the backend.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Bookmark_cleaning"))
+from bookmark_filter import compile_filters
+
+# Same filters as Bookmark_cleaning/code1.py
+DEFAULT_OUTLINE_FILTERS = (".pdf", "outline placeholder")
+
+
+def _remap_items(nodes, r_idx, remapper, matcher, stats):
+    out = []
+    for node in nodes:
+        children = _remap_items(node["children"], r_idx, remapper, matcher, stats)
+        if matcher(node["title"]):
+            # keep the children at the filtered bookmark's position
+            stats["filtered"] += 1
+            out.extend(children)
+            continue
+        dest = None
+        action = node.get("action")
+        if node["dest"] is not None:
+            dest = remapper.remap_dest(node["dest"], r_idx)
+            if dest is None:
+                stats["unresolved"] += 1
+        elif action is not None:
+            stats["actions"] += 1
+        stats["items"] += 1
+        out.append({"title": node["title"], "dest": dest, "action": action,
+                    "open": node["open"], "children": children})
+    return out
+
+
+def build_book_outline(backend, readers, remapper, filters=DEFAULT_OUTLINE_FILTERS):
+    """
+    Outline nodes for the merged book: [{"title", "dest" (native dest or
+    None), "action" (native non-GoTo action or None), "open", "children"}],
+    one per input. Returns (nodes, stats).
+    """
+    matcher = compile_filters(filters or ())
+    stats = {"chapters": 0, "items": 0, "filtered": 0, "unresolved": 0, "actions": 0}
+    book = []
+    for r_idx, rinfo in enumerate(readers):
+        if not rinfo["num_pages"]:
+            continue
+        children = _remap_items(backend.read_outline(r_idx), r_idx, remapper, matcher, stats)
+        title = backend.document_title(r_idx) or os.path.splitext(rinfo["filename"])[0]
+        book.append({
+            "title": title,
+            "dest": backend.make_dest(rinfo["start_page"]),
+            "action": None,
+            "open": False,
+            "children": children,
+        })
+        stats["chapters"] += 1
+    return book, stats
@@ -0,0 +1,55 @@
+"""
+Balanced page tree layout for merged output.
+
+Appending pages one by one leaves the output with a single /Pages node whose
+/Kids array holds every page. Viewers and tools that look a page up by number
+then scan that array; with a tree of bounded fan-out the lookup walks
+log(fanout, pages) small nodes instead.
+
+balanced_groups() only decides the shape; the pikepdf merge backend builds
+the /Pages nodes (MergeBackend.balance_page_tree). Attributes a page inherits
+from its old ancestors are copied onto the page first, so the new
+intermediate nodes carry nothing but /Type, /Kids, /Count and /Parent.
+
+The balanced tree is opt-in (merge_pdfs_preserve_links(page_tree_fanout=32)):
+pypdf and qpdf index the whole page tree when a file is opened, and on
+bench_page_tree.py their random page access shows no consistent gain from it
+(and was slower in several runs). It is meant for readers that descend
+/Count lazily.
+"""
+
+DEFAULT_PAGE_TREE_FANOUT = 32
+
+# Page attributes that may be inherited from /Pages nodes (ISO 32000-1, 7.7.3.4)
+INHERITABLE_PAGE_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+def balanced_groups(items, fanout=DEFAULT_PAGE_TREE_FANOUT):
+    """
+    Group `items` (pages, in order) into nested lists of at most `fanout`
+    entries each, as evenly as possible, so every leaf has the same depth.
+    The result is the kids list of the root node; a list entry is an
+    intermediate node, anything else is a page.
+    """
+    if fanout < 2:
+        raise ValueError("page tree fan-out must be at least 2")
+    level = list(items)
+    while len(level) > fanout:
+        n_groups = -(-len(level) // fanout)
+        size, extra = divmod(len(level), n_groups)
+        grouped, pos = [], 0
+        for g in range(n_groups):
+            end = pos + size + (1 if g < extra else 0)
+            grouped.append(level[pos:end])
+            pos = end
+        level = grouped
+    return level
+
+
+def tree_depth(kids):
+    """Number of /Pages levels of a balanced_groups() layout (1 = flat)."""
+    depth = 1
+    while kids and isinstance(kids[0], list):
+        kids = kids[0]
+        depth += 1
+    return depth
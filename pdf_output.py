@@ -0,0 +1,140 @@
+"""
+Output helpers shared by the merge scripts and the PDFix tools.
+
+compact_pdf() rewrites a PDF so that every non-stream object (annotations,
+actions, struct elements, ...) is packed into compressed object streams and
+the classic xref table is replaced by a cross-reference stream. pypdf cannot
+write object streams and PDFix's full save keeps a classic xref, so the
+rewrite is done with pikepdf (qpdf).
+
+linearize_pdf() does the same rewrite in linearized ("fast web view") form:
+the first page's objects come first, preceded by the linearization dictionary
+and the hint tables, so a web reader fetching byte ranges can show page 1
+before the rest of the file has arrived. check_linearization() runs qpdf's
+own consistency check on the result.
+"""
+
+import io
+import os
+import sys
+import time
+
+try:
+    import pikepdf
+    USE_PIKEPDF = True
+except Exception:
+    USE_PIKEPDF = False
+
+
+def _size_of(src):
+    if isinstance(src, (bytes, bytearray)):
+        return len(src)
+    if isinstance(src, io.BytesIO):
+        return len(src.getbuffer())
+    return os.path.getsize(src)
+
+
+def compact_pdf(src, output_path=None, verbose=True, linearize=False):
+    """
+    Rewrite `src` with object streams + an xref stream.
+
+    src:          path, bytes or BytesIO holding a finished PDF
+    output_path:  where to write; None rewrites the `src` path in place
+    linearize:    also write it linearized (see linearize_pdf)
+
+    Returns a dict {"before": bytes, "after": bytes, "seconds": float}.
+    """
+    if not USE_PIKEPDF:
+        raise RuntimeError("Compact output needs pikepdf. Run: pip install pikepdf")
+    return _rewrite(src, output_path, verbose, compact=True, linearize=linearize)
+
+
+def linearize_pdf(src, output_path=None, verbose=True, compact=False):
+    """
+    Rewrite `src` linearized (with hint tables) and check the result.
+
+    src, output_path as for compact_pdf(); compact=True also packs objects
+    into object streams.
+
+    Returns a dict {"before", "after", "seconds", "linearized"}, where
+    "linearized" is the outcome of check_linearization().
+    """
+    if not USE_PIKEPDF:
+        raise RuntimeError("Linearized output needs pikepdf. Run: pip install pikepdf")
+    stats = _rewrite(src, output_path, False, compact=compact, linearize=True)
+    check = check_linearization(output_path or src)
+    stats["linearized"] = check["ok"]
+    if verbose:
+        print(format_compaction(stats))
+        if not check["ok"]:
+            print(check["messages"])
+    return stats
+
+
+def check_linearization(path):
+    """
+    qpdf's linearization check on a PDF file.
+
+    Returns {"linearized": bool, "ok": bool, "messages": str}; "ok" is True
+    only for a linearized file whose hint tables match its layout.
+    """
+    if not USE_PIKEPDF:
+        raise RuntimeError("Linearization check needs pikepdf. Run: pip install pikepdf")
+    with pikepdf.open(path) as pdf:
+        if not pdf.is_linearized:
+            return {"linearized": False, "ok": False, "messages": "file is not linearized"}
+        # pikepdf points sys.stderr at the report and never restores it
+        report = io.StringIO()
+        stderr = sys.stderr
+        try:
+            ok = pdf.check_linearization(report)
+        finally:
+            sys.stderr = stderr
+    return {"linearized": True, "ok": bool(ok), "messages": report.getvalue().strip()}
+
+
+def _rewrite(src, output_path, verbose, compact, linearize):
+    if output_path is None:
+        if not isinstance(src, (str, os.PathLike)):
+            raise ValueError("output_path is required when src is not a file path")
+        output_path = src
+
+    before = _size_of(src)
+    t0 = time.perf_counter()
+
+    if isinstance(src, (bytes, bytearray)):
+        src = io.BytesIO(src)
+    if isinstance(src, io.BytesIO):
+        src.seek(0)
+
+    # qpdf refuses to overwrite the file it is reading from: write beside it, then swap
+    tmp_path = output_path + ".compact.tmp"
+    mode = pikepdf.ObjectStreamMode.generate if compact else pikepdf.ObjectStreamMode.preserve
+    with pikepdf.open(src) as pdf:
+        pdf.save(
+            tmp_path,
+            object_stream_mode=mode,
+            compress_streams=True,
+            linearize=linearize,
+        )
+    os.replace(tmp_path, output_path)
+
+    seconds = time.perf_counter() - t0
+    after = os.path.getsize(output_path)
+    stats = {"before": before, "after": after, "seconds": seconds, "compact": compact, "linearize": linearize}
+    if verbose:
+        print(format_compaction(stats))
+    return stats
+
+
+def format_compaction(stats):
+    before, after = stats["before"], stats["after"]
+    saved = before - after
+    pct = (100.0 * saved / before) if before else 0.0
+    label = "Compact output" if stats.get("compact", True) else "Output"
+    if "linearized" in stats:
+        label += " (linearized, check " + ("passed" if stats["linearized"] else "FAILED") + ")"
+    elif stats.get("linearize"):
+        label += " (linearized)"
+    return (f"{label}: {before:,} -> {after:,} bytes "
+            f"({saved:,} saved, {pct:.1f}%) in +{stats['seconds']:.2f}s")
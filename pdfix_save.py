@@ -0,0 +1,57 @@
+"""
+Save helper for PDFix tools whose edits are small.
+
+Bookmark filtering, page labels and link alt text change a handful of
+dictionaries, but doc.Save(path, kSaveFull) re-serializes every object of
+the book. An incremental save (kSaveIncremental) writes the original bytes
+unchanged and appends only the modified objects plus a new xref section,
+which for a 200 MB book is a file copy and a few KB instead of a rewrite.
+
+    mode = save_doc(pdfix, doc, output_path, changes=n_touched_objects)
+    if not mode:
+        raise Exception("Save failed: " + pdfix.GetError())
+
+With mode=SAVE_AUTO the incremental path is taken when the tool reports at
+most INCREMENTAL_MAX_CHANGES changed objects; bigger change sets, and any
+incremental save PDFix refuses, fall back to a full save. Incremental output
+keeps the old object versions in the file, so a document edited many times
+this way should get a full save (or compact_pdf) now and then.
+"""
+
+from pdfixsdk import kSaveFull, kSaveIncremental
+
+SAVE_AUTO = "auto"
+SAVE_INCREMENTAL = "incremental"
+SAVE_FULL = "full"
+
+# Above this many changed objects an incremental update is no longer "small"
+INCREMENTAL_MAX_CHANGES = 1000
+
+
+def choose_save_mode(changes, mode=SAVE_AUTO):
+    if mode != SAVE_AUTO:
+        return mode
+    if changes is None or changes > INCREMENTAL_MAX_CHANGES:
+        return SAVE_FULL
+    return SAVE_INCREMENTAL
+
+
+def save_doc(pdfix, doc, output_path, changes=None, mode=SAVE_AUTO, verbose=False):
+    """
+    Save `doc` to `output_path`, incrementally when the change set is small.
+    changes: number of objects the tool modified or created (None = unknown,
+    saved in full). Returns the mode used (SAVE_INCREMENTAL / SAVE_FULL), or
+    None if the full save failed too (pdfix.GetError() has the reason).
+    """
+    if choose_save_mode(changes, mode) == SAVE_INCREMENTAL:
+        if doc.Save(output_path, kSaveIncremental):
+            if verbose:
+                print(f"Saved incrementally ({changes} changed objects): {output_path}")
+            return SAVE_INCREMENTAL
+        if verbose:
+            print(f"Incremental save failed ({pdfix.GetError()}), saving in full")
+    if doc.Save(output_path, kSaveFull):
+        if verbose:
+            print(f"Saved in full: {output_path}")
+        return SAVE_FULL
+    return None
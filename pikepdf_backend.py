@@ -0,0 +1,731 @@
+"""
+pikepdf (qpdf) engine for merge_pdfs_preserve_links.
+
+Same link rules as the pypdf engine (link_remap.LinkRemapper); only the object
+model differs. qpdf parses and writes in C++, which is what we want on large
+books. Select it with merge_pdfs_preserve_links(..., backend="pikepdf").
+"""
+
+import bisect
+import hashlib
+import time
+import warnings
+
+import pikepdf
+
+from link_remap import MergeBackend
+from page_tree import INHERITABLE_PAGE_KEYS, balanced_groups, tree_depth
+from pdf_output import check_linearization
+
+# Keys whose value is an embedded font program / font side stream.
+_FONT_STREAM_KEYS = ("/FontFile", "/FontFile2", "/FontFile3", "/ToUnicode", "/CIDSet", "/CIDToGIDMap")
+
+# Struct element entry that refers to each merged map.
+_RENAMED_ENTRY = {"/RoleMap": "/S", "/ClassMap": "/C", "/IDTree": "/ID"}
+
+
+def _is_container(obj):
+    return isinstance(obj, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream))
+
+
+def _items(container):
+    if isinstance(container, pikepdf.Array):
+        return list(enumerate(container))
+    return [(k, container.get(k)) for k in container.keys()]
+
+
+def _same_object(a, b):
+    if _is_container(a) and _is_container(b):
+        if a.is_indirect and b.is_indirect and a.objgen == b.objgen:
+            return True
+        return a.unparse(resolved=True) == b.unparse(resolved=True)
+    return a == b
+
+
+def _classify_shared_resource(obj, ref_key=None, in_iccbased=False):
+    """Same kinds as working_internal_external._classify_shared_resource."""
+    is_stream = isinstance(obj, pikepdf.Stream)
+    if ref_key == "/Metadata":
+        return "metadata" if is_stream else None
+    if in_iccbased or ref_key == "/DestOutputProfile":
+        return "icc" if is_stream else None
+    if ref_key in _FONT_STREAM_KEYS:
+        return "font" if is_stream else None
+    if is_stream:
+        subtype = obj.get("/Subtype")
+        if subtype == pikepdf.Name.Image:
+            return "image"
+        if subtype == pikepdf.Name.Form:
+            return "form"
+        return None
+    if isinstance(obj, pikepdf.Dictionary) and obj.get("/Type") in (pikepdf.Name.Font, pikepdf.Name.FontDescriptor):
+        return "font"
+    return None
+
+
+def dedupe_shared_resources(pdf):
+    """
+    pikepdf version of working_internal_external.dedupe_shared_resources.
+    Duplicates are only unlinked here; qpdf does not write unreachable objects.
+    """
+    kinds = {}    # objgen -> kind
+    handles = {}  # objgen -> object
+
+    def _is_ref(value):
+        return _is_container(value) and value.is_indirect
+
+    for obj in pdf.objects:
+        if not _is_container(obj):
+            continue
+        stack = [obj]
+        while stack:
+            cur = stack.pop()
+            in_icc = (isinstance(cur, pikepdf.Array) and len(cur) == 2
+                      and cur[0] == pikepdf.Name.ICCBased)
+            for key, value in _items(cur):
+                if _is_ref(value):
+                    og = value.objgen
+                    if og in kinds:
+                        continue
+                    kind = _classify_shared_resource(value, key if isinstance(key, str) else None, in_icc)
+                    if kind:
+                        kinds[og] = kind
+                        handles[og] = value
+                elif _is_container(value):
+                    stack.append(value)
+
+    if not kinds:
+        return {"counts": {}, "bytes_saved": 0}
+
+    canonical = {}
+    first_by_key = {}
+    in_progress = set()
+
+    def _key_of(value, top=False):
+        if not top and _is_ref(value):
+            og = value.objgen
+            return ("R", _canonical_of(og) if og in kinds else og)
+        if isinstance(value, pikepdf.Array):
+            return ("A", tuple(_key_of(v) for v in value))
+        if isinstance(value, (pikepdf.Dictionary, pikepdf.Stream)):
+            return ("D", tuple(sorted(
+                (str(k), _key_of(value.get(k))) for k in value.keys() if k != "/Length"
+            )))
+        if isinstance(value, pikepdf.String):
+            return ("S", bytes(value))
+        return (type(value).__name__, repr(value))
+
+    def _canonical_of(og):
+        if og in canonical:
+            return canonical[og]
+        if og in in_progress:
+            return og
+        in_progress.add(og)
+        try:
+            obj = handles[og]
+            key = _key_of(obj, top=True)
+            if isinstance(obj, pikepdf.Stream):
+                key = (key, hashlib.sha256(obj.read_raw_bytes()).hexdigest())
+            key = (kinds[og], key)
+            canon = first_by_key.setdefault(key, og)
+            canonical[og] = canon
+            return canon
+        finally:
+            in_progress.discard(og)
+
+    for og in sorted(kinds):
+        _canonical_of(og)
+
+    duplicates = {og: c for og, c in canonical.items() if og != c}
+    if not duplicates:
+        return {"counts": {}, "bytes_saved": 0}
+
+    for obj in pdf.objects:
+        if not _is_container(obj) or obj.objgen in duplicates:
+            continue
+        stack = [obj]
+        while stack:
+            cur = stack.pop()
+            for key, value in _items(cur):
+                if _is_ref(value) and value.objgen in duplicates:
+                    cur[key] = handles[duplicates[value.objgen]]
+                elif _is_container(value) and not value.is_indirect:
+                    stack.append(value)
+
+    counts = {}
+    bytes_saved = 0
+    for og in duplicates:
+        obj = handles[og]
+        if isinstance(obj, pikepdf.Stream):
+            bytes_saved += len(obj.read_raw_bytes())
+        counts[kinds[og]] = counts.get(kinds[og], 0) + 1
+
+    return {"counts": counts, "bytes_saved": bytes_saved}
+
+
+class PikepdfMergeBackend(MergeBackend):
+    """MergeBackend on top of pikepdf / qpdf."""
+
+    name = "pikepdf"
+    balances_page_tree = True
+
+    def __init__(self):
+        self.out = pikepdf.Pdf.new()
+        self.inputs = []             # pikepdf.Pdf per input, merge order
+        self._start_pages = []
+        self._src_page_index = {}    # (r_idx, objgen) -> page_index
+        self._out_page_index = {}    # objgen in output -> (r_idx, page_index)
+        self._named = {}             # r_idx -> {name: page_index}
+
+    def open_input(self, path):
+        pdf = pikepdf.open(path)
+        self.inputs.append(pdf)
+        return len(pdf.pages)
+
+    def append_pages(self, r_idx, sleep_between_pages=0.0):
+        src = self.inputs[r_idx]
+        self._start_pages.append(len(self.out.pages))
+        with warnings.catch_warnings():
+            # named destinations are resolved by the link remapper, not copied
+            warnings.simplefilter("ignore")
+            for p_idx, page in enumerate(src.pages):
+                self._src_page_index[(r_idx, page.obj.objgen)] = p_idx
+                self.out.pages.append(page)
+                self._out_page_index[self.out.pages[-1].obj.objgen] = (r_idx, p_idx)
+                if sleep_between_pages:
+                    time.sleep(sleep_between_pages)
+
+    def page_count(self):
+        return len(self.out.pages)
+
+    def save(self, output_path, compact=False, linearize=False):
+        mode = pikepdf.ObjectStreamMode.generate if compact else pikepdf.ObjectStreamMode.disable
+        t0 = time.perf_counter()
+        self.out.save(output_path, object_stream_mode=mode, compress_streams=True, linearize=linearize)
+        if compact:
+            print(f"Compact output written in {time.perf_counter() - t0:.2f}s")
+        if linearize:
+            check = check_linearization(output_path)
+            print(f"Linearized output written in {time.perf_counter() - t0:.2f}s "
+                  f"(linearization check {'passed' if check['ok'] else 'FAILED'})")
+            if not check["ok"]:
+                print(check["messages"])
+
+    def close(self):
+        for pdf in self.inputs:
+            try:
+                pdf.close()
+            except Exception:
+                pass
+
+    def dedupe_resources(self):
+        return dedupe_shared_resources(self.out)
+
+    # --- structure tree ------------------------------------------------------
+    def _tree_entries(self, node, leaf_key, entries, seen):
+        """Flatten a number tree (/Nums) or name tree (/Names) into (key, value) pairs."""
+        if not isinstance(node, pikepdf.Dictionary):
+            return
+        if node.is_indirect:
+            if node.objgen in seen:
+                return
+            seen.add(node.objgen)
+        kids = node.get("/Kids")
+        if isinstance(kids, pikepdf.Array):
+            for kid in kids:
+                self._tree_entries(kid, leaf_key, entries, seen)
+        leaves = node.get(leaf_key)
+        if isinstance(leaves, pikepdf.Array):
+            for i in range(0, len(leaves) - 1, 2):
+                entries.append((leaves[i], leaves[i + 1]))
+
+    def _shift_struct_parents(self, r_idx, offset):
+        """Same as PypdfMergeBackend._shift_struct_parents."""
+        start = self._start_pages[r_idx]
+        seen = set()
+
+        def _shift(d, key):
+            if key not in d:
+                return
+            if offset is None:
+                del d[key]
+            else:
+                d[key] = int(d[key]) + offset
+
+        def _walk_xobjects(resources):
+            if not isinstance(resources, pikepdf.Dictionary):
+                return
+            xobjects = resources.get("/XObject")
+            if not isinstance(xobjects, pikepdf.Dictionary):
+                return
+            for key in xobjects.keys():
+                xobj = xobjects[key]
+                if not isinstance(xobj, pikepdf.Stream) or xobj.objgen in seen:
+                    continue
+                seen.add(xobj.objgen)
+                _shift(xobj, "/StructParent")
+                _shift(xobj, "/StructParents")
+                _walk_xobjects(xobj.get("/Resources"))
+
+        for m_idx in range(start, start + len(self.inputs[r_idx].pages)):
+            page = self.out.pages[m_idx].obj
+            _shift(page, "/StructParents")
+            annots = page.get("/Annots")
+            if isinstance(annots, pikepdf.Array):
+                for annot in annots:
+                    if not isinstance(annot, pikepdf.Dictionary):
+                        continue
+                    if annot.is_indirect:
+                        if annot.objgen in seen:
+                            continue
+                        seen.add(annot.objgen)
+                    _shift(annot, "/StructParent")
+            _walk_xobjects(page.get("/Resources"))
+
+    def _rename_struct_entries(self, top, renames):
+        """Same as working_internal_external._rename_struct_entries."""
+        stack = [top]
+        seen = set()
+        while stack:
+            elem = stack.pop()
+            if not isinstance(elem, pikepdf.Dictionary):
+                continue
+            if elem.is_indirect:
+                if elem.objgen in seen:
+                    continue
+                seen.add(elem.objgen)
+            for entry, table in renames.items():
+                if entry not in elem:
+                    continue
+                value = elem[entry]
+                if entry == "/ID":
+                    new = table.get(str(value))
+                    if new is not None:
+                        elem[entry] = pikepdf.String(new)
+                elif isinstance(value, pikepdf.Array):
+                    elem[entry] = pikepdf.Array(
+                        pikepdf.Name(table[str(v)]) if isinstance(v, pikepdf.Name) and str(v) in table else v
+                        for v in value)
+                elif str(value) in table:
+                    elem[entry] = pikepdf.Name(table[str(value)])
+            kids = elem.get("/K")
+            if isinstance(kids, pikepdf.Array):
+                stack.extend(kids)
+            elif kids is not None:
+                stack.append(kids)
+
+    def merge_structure_trees(self, readers):
+        out = self.out
+        root = out.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.StructTreeRoot))
+        document = out.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.StructElem, S=pikepdf.Name.Document, P=root))
+        doc_kids = []
+
+        nums = []
+        maps = {"/RoleMap": {}, "/ClassMap": {}, "/IDTree": {}}
+        renamed = []
+        untagged = []
+        book_lang = None
+        next_key = 0
+
+        for r_idx, rinfo in enumerate(readers):
+            src_catalog = self.inputs[r_idx].Root
+            if "/StructTreeRoot" not in src_catalog:
+                untagged.append(rinfo["filename"])
+                self._shift_struct_parents(r_idx, None)
+                continue
+
+            # qpdf keeps one copy per foreign object, so /Pg and OBJR references
+            # land on the pages and annotations copied by append_pages. The copied
+            # chapter root itself is left unreferenced and is not written.
+            st = out.copy_foreign(src_catalog.StructTreeRoot)
+
+            chapter_lang = src_catalog.get("/Lang")
+            if book_lang is None and chapter_lang is not None:
+                book_lang = chapter_lang
+
+            entries = []
+            self._tree_entries(st.get("/ParentTree"), "/Nums", entries, set())
+            span = int(st.get("/ParentTreeNextKey", 0))
+            for key, value in entries:
+                nums.append((int(key) + next_key, value))
+                span = max(span, int(key) + 1)
+            self._shift_struct_parents(r_idx, next_key)
+            next_key += span
+
+            # A role, class or ID that an earlier chapter already defines
+            # differently is renamed for this chapter
+            renames = {}
+            for map_key in ("/RoleMap", "/ClassMap", "/IDTree"):
+                if map_key not in st:
+                    continue
+                if map_key == "/IDTree":
+                    src_entries = []
+                    self._tree_entries(st[map_key], "/Names", src_entries, set())
+                else:
+                    src_entries = [(k, st[map_key][k]) for k in st[map_key].keys()]
+                for name, value in src_entries:
+                    key = str(name)
+                    kept = maps[map_key].setdefault(key, value)
+                    if kept is value or _same_object(kept, value):
+                        continue
+                    n = r_idx + 1
+                    while f"{key}_{n}" in maps[map_key]:
+                        n += 1
+                    new_key = f"{key}_{n}"
+                    maps[map_key][new_key] = value
+                    renames.setdefault(_RENAMED_ENTRY[map_key], {})[key] = new_key
+                    renamed.append((map_key, key, new_key, rinfo["filename"]))
+
+            # Each chapter becomes a /Part under the book's single /Document
+            top = st.get("/K")
+            if isinstance(top, pikepdf.Dictionary) and top.is_indirect:
+                part = top
+                if part.get("/S") == pikepdf.Name.Document:
+                    part.S = pikepdf.Name.Part
+            elif top is not None:
+                kids = list(top) if isinstance(top, pikepdf.Array) else [top]
+                part = out.make_indirect(pikepdf.Dictionary(
+                    Type=pikepdf.Name.StructElem, S=pikepdf.Name.Part, K=pikepdf.Array(kids)))
+                for kid in kids:
+                    if isinstance(kid, pikepdf.Dictionary) and kid.is_indirect:
+                        kid.P = part
+            else:
+                continue
+            if renames:
+                self._rename_struct_entries(part, renames)
+            part.P = document
+            if chapter_lang is not None and chapter_lang != book_lang and "/Lang" not in part:
+                part.Lang = chapter_lang
+            doc_kids.append(part)
+
+        if not doc_kids:
+            return {"tagged": 0, "untagged": untagged, "parent_tree_keys": 0, "renamed": renamed}
+
+        document.K = pikepdf.Array(doc_kids)
+        flat = []
+        for key, value in sorted(nums, key=lambda kv: kv[0]):
+            flat.extend((key, value))
+        root.K = pikepdf.Array([document])
+        root.ParentTree = out.make_indirect(pikepdf.Dictionary(Nums=pikepdf.Array(flat)))
+        root.ParentTreeNextKey = next_key
+        for map_key in ("/RoleMap", "/ClassMap"):
+            if maps[map_key]:
+                root[map_key] = pikepdf.Dictionary({k: v for k, v in maps[map_key].items()})
+        if maps["/IDTree"]:
+            names = []
+            for key, value in sorted(maps["/IDTree"].items()):
+                names.extend((pikepdf.String(key), value))
+            root.IDTree = out.make_indirect(pikepdf.Dictionary(Names=pikepdf.Array(names)))
+
+        out.Root.StructTreeRoot = root
+        out.Root.MarkInfo = pikepdf.Dictionary(Marked=True)
+        if book_lang is not None and "/Lang" not in out.Root:
+            out.Root.Lang = book_lang
+
+        return {"tagged": len(doc_kids), "untagged": untagged,
+                "parent_tree_keys": len(nums), "renamed": renamed}
+
+    # --- outlines ------------------------------------------------------------
+    def read_outline(self, r_idx):
+        outlines = self.inputs[r_idx].Root.get("/Outlines")
+        if not isinstance(outlines, pikepdf.Dictionary):
+            return []
+        seen = set()
+
+        def _items(item):
+            nodes = []
+            while isinstance(item, pikepdf.Dictionary) and item.objgen not in seen:
+                seen.add(item.objgen)
+                dest = item.get("/Dest")
+                action = item.get("/A")
+                other_action = None
+                if dest is None and isinstance(action, pikepdf.Dictionary):
+                    if action.get("/S") == pikepdf.Name.GoTo:
+                        dest = action.get("/D")
+                    else:
+                        # URI / Launch / Named / GoToR...: copied into the book unchanged
+                        other_action = self._copy_action(self.inputs[r_idx], action)
+                nodes.append({
+                    "title": str(item.get("/Title", "")),
+                    "dest": dest,
+                    "action": other_action,
+                    "open": int(item.get("/Count", 0)) > 0,
+                    "children": _items(item.get("/First")),
+                })
+                item = item.get("/Next")
+            return nodes
+
+        return _items(outlines.get("/First"))
+
+    def _copy_action(self, src, action):
+        # copy_foreign only takes indirect objects; a direct /A is made one in the
+        # (never saved) input first
+        if not action.is_indirect:
+            action = src.make_indirect(action)
+        return self.out.copy_foreign(action)
+
+    def document_title(self, r_idx):
+        title = self.inputs[r_idx].docinfo.get("/Title")
+        if title is None:
+            return None
+        return str(title).strip() or None
+
+    def _link_outline_items(self, parent, nodes):
+        """Add `nodes` below `parent`; return the number of visible items."""
+        items = []
+        for node in nodes:
+            item = self.out.make_indirect(pikepdf.Dictionary(Title=pikepdf.String(node["title"]), Parent=parent))
+            if node["dest"] is not None:
+                item.Dest = node["dest"]
+            elif node.get("action") is not None:
+                item.A = node["action"]
+            items.append(item)
+        if not items:
+            return 0
+        parent.First = items[0]
+        parent.Last = items[-1]
+
+        visible = len(items)
+        for i, (item, node) in enumerate(zip(items, nodes)):
+            if i > 0:
+                item.Prev = items[i - 1]
+            if i < len(items) - 1:
+                item.Next = items[i + 1]
+            if node["children"]:
+                n = self._link_outline_items(item, node["children"])
+                item.Count = n if node["open"] else -n
+                if node["open"]:
+                    visible += n
+        return visible
+
+    def write_outline(self, nodes):
+        root = self.out.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.Outlines))
+        count = self._link_outline_items(root, nodes)
+        if count:
+            root.Count = count
+        self.out.Root.Outlines = root
+
+    # --- page tree -------------------------------------------------------------
+    def _page_tree_index(self):
+        """{objgen: (r_idx, page_index)}, read from the output's page tree in order."""
+        index = {}
+        m_idx = 0
+        stack = [self.out.Root.Pages]
+        while stack:
+            node = stack.pop()
+            if node.get("/Type") == pikepdf.Name.Pages:
+                stack.extend(reversed(list(node.get("/Kids", []))))
+                continue
+            r_idx = bisect.bisect_right(self._start_pages, m_idx) - 1
+            index[node.objgen] = (r_idx, m_idx - self._start_pages[r_idx])
+            m_idx += 1
+        return index
+
+    def balance_page_tree(self, fanout):
+        root = self.out.Root.Pages
+        pages = [p.obj for p in self.out.pages]
+
+        # copy inherited attributes onto the pages; the old inner nodes become
+        # unreachable and qpdf drops them on save
+        for page in pages:
+            node = page.get("/Parent")
+            while isinstance(node, pikepdf.Dictionary):
+                for key in INHERITABLE_PAGE_KEYS:
+                    if key not in page and key in node:
+                        page[key] = node[key]
+                node = node.get("/Parent")
+        for key in INHERITABLE_PAGE_KEYS:
+            if key in root:
+                del root[key]
+
+        created = 0
+
+        def build(kids, node):
+            nonlocal created
+            refs, count = [], 0
+            for kid in kids:
+                if isinstance(kid, list):
+                    child = self.out.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.Pages, Parent=node))
+                    created += 1
+                    count += build(kid, child)
+                    refs.append(child)
+                else:
+                    kid.Parent = node
+                    refs.append(kid)
+                    count += 1
+            node.Kids = pikepdf.Array(refs)
+            node.Count = count
+            return count
+
+        layout = balanced_groups(pages, fanout)
+        build(layout, root)
+        self._out_page_index = self._page_tree_index()
+        return {"pages": len(self._out_page_index), "nodes": created + 1, "depth": tree_depth(layout)}
+
+    # --- annotations & dictionaries ---------------------------------------
+    def iter_link_annots(self, m_idx):
+        annots = self.out.pages[m_idx].obj.get("/Annots")
+        if not isinstance(annots, pikepdf.Array):
+            return
+        for annot in list(annots):
+            if isinstance(annot, pikepdf.Dictionary) and annot.get("/Subtype") == pikepdf.Name.Link:
+                yield annot
+
+    def get_action(self, annot):
+        action = annot.get("/A")
+        return action if isinstance(action, pikepdf.Dictionary) else None
+
+    def has(self, d, key):
+        return key in d
+
+    def get(self, d, key):
+        return d.get(key)
+
+    def set(self, d, key, value):
+        d[key] = value
+
+    def delete(self, d, key):
+        del d[key]
+
+    def name_of(self, obj):
+        return str(obj) if isinstance(obj, pikepdf.Name) else (None if obj is None else str(obj))
+
+    def text_of(self, obj):
+        if obj is None:
+            return None
+        return str(obj)
+
+    def filespec_filename(self, fspec):
+        if fspec is None:
+            return None
+        if isinstance(fspec, pikepdf.Dictionary):
+            for key in ("/UF", "/F", "/DOS", "/Mac", "/Unix"):
+                if key in fspec:
+                    return str(fspec[key])
+            return str(fspec)
+        return str(fspec)
+
+    # --- shared actions ----------------------------------------------------
+    def action_key(self, action):
+        try:
+            return bytes(action.unparse(resolved=True))
+        except Exception:
+            return None
+
+    def share_action(self, annot):
+        action = annot.A
+        if not action.is_indirect:
+            action = self.out.make_indirect(action)
+            annot.A = action
+        return action
+
+    def use_shared_action(self, annot, shared):
+        annot.A = shared
+
+    def sweep_replaced_actions(self):
+        # replaced actions are unreachable now and qpdf does not write those
+        return 0
+
+    # --- destinations ------------------------------------------------------
+    def parse_dest(self, dest_obj):
+        if isinstance(dest_obj, pikepdf.Array):
+            arr = list(dest_obj)
+            if not arr:
+                return None
+            first, tail = arr[0], arr[1:]
+            if isinstance(first, pikepdf.Dictionary):
+                return ("page", first, tail)
+            if isinstance(first, (int, float)) and not isinstance(first, bool):
+                return ("number", int(first), tail)
+            if isinstance(first, (pikepdf.Name, pikepdf.String, str)):
+                return ("name", str(first), tail)
+            try:
+                return ("number", int(first), tail)   # Decimal
+            except Exception:
+                return None
+        if isinstance(dest_obj, pikepdf.Dictionary):
+            return ("page", dest_obj, [])
+        if isinstance(dest_obj, (pikepdf.Name, pikepdf.String, str)):
+            return ("name", str(dest_obj), [])
+        if isinstance(dest_obj, bool):
+            return None
+        try:
+            return ("number", int(dest_obj), [])
+        except Exception:
+            return None
+
+    def locate_page(self, page_obj):
+        if not isinstance(page_obj, pikepdf.Dictionary) or not page_obj.is_indirect:
+            return None
+        og = page_obj.objgen
+        loc = self._out_page_index.get(og)
+        if loc is not None:
+            return loc
+        # a page object still owned by one of the inputs
+        for r_idx, src in enumerate(self.inputs):
+            if page_obj.is_owned_by(src):
+                p_idx = self._src_page_index.get((r_idx, og))
+                return (r_idx, p_idx) if p_idx is not None else None
+        return None
+
+    def _collect_name_tree(self, node, table, r_idx, seen):
+        if not isinstance(node, pikepdf.Dictionary) or node.objgen in seen:
+            return
+        if node.is_indirect:
+            seen.add(node.objgen)
+        kids = node.get("/Kids")
+        if isinstance(kids, pikepdf.Array):
+            for kid in kids:
+                self._collect_name_tree(kid, table, r_idx, seen)
+        names = node.get("/Names")
+        if isinstance(names, pikepdf.Array):
+            for i in range(0, len(names) - 1, 2):
+                self._add_named(table, r_idx, str(names[i]), names[i + 1])
+
+    def _add_named(self, table, r_idx, key, value):
+        if isinstance(value, pikepdf.Dictionary) and "/D" in value:
+            value = value["/D"]
+        if not isinstance(value, pikepdf.Array) or len(value) == 0:
+            return
+        first = value[0]
+        if isinstance(first, pikepdf.Dictionary):
+            p_idx = self._src_page_index.get((r_idx, first.objgen))
+            if p_idx is not None:
+                table.setdefault(key, p_idx)
+        elif isinstance(first, int) and not isinstance(first, bool):
+            table.setdefault(key, int(first))
+
+    def resolve_named_dest(self, r_idx, name):
+        if name is None:
+            return None
+        table = self._named.get(r_idx)
+        if table is None:
+            # resolve the whole name tree once instead of once per link
+            table = {}
+            root = self.inputs[r_idx].Root
+            dests = root.get("/Dests")
+            if isinstance(dests, pikepdf.Dictionary):
+                for key in dests.keys():
+                    self._add_named(table, r_idx, str(key), dests[key])
+            names = root.get("/Names")
+            if isinstance(names, pikepdf.Dictionary) and "/Dests" in names:
+                self._collect_name_tree(names["/Dests"], table, r_idx, set())
+            self._named[r_idx] = table
+        return table.get(str(name))
+
+    # --- object construction ------------------------------------------------
+    def make_dest(self, merged_idx, tail=None):
+        page = self.out.pages[merged_idx].obj
+        if tail:
+            return pikepdf.Array([page] + list(tail))
+        return pikepdf.Array([page, pikepdf.Name.Fit])
+
+    def make_name(self, name):
+        return pikepdf.Name(name)
+
+    def make_text(self, text):
+        return pikepdf.String(str(text))
+
+    def make_filespec(self, filename):
+        return pikepdf.Dictionary(F=pikepdf.String(filename), UF=pikepdf.String(filename))
@@ -0,0 +1,332 @@
+"""
+Local staging for inputs and outputs on network shares.
+
+PDF parsers read a file in many small, scattered pieces (xref, object
+streams, one page after the other), which is slow when every read is an SMB
+round trip to \\\\integrafs3\\... . The batch entry points therefore stage:
+
+    with Staging() as staging:
+        local_in = staging.fetch(INPUT_PDF)        # copied to local disk
+        local_out = staging.output(OUTPUT_PDF)     # local path to write to
+        ...run the PDFix / pypdf tool on local_in -> local_out...
+    # leaving the block copies local_out back to OUTPUT_PDF, then cleans up
+
+fetch() copies a file in large chunks read by several threads at once,
+hashes every chunk as it arrives and checks the local copy against those
+hashes; fetch_all() does several files in parallel. Outputs are written back
+to a temporary name next to the target, verified and then renamed into
+place, so readers of the share never see a half-written PDF. Outputs are
+only published when the block finishes without an exception.
+
+By default only network paths (UNC paths, mapped network drives on Windows)
+are staged; local paths pass through unchanged. Staging(stage=True) stages
+everything, which together with Throttle lets a slow local directory stand
+in for the share in tests and in bench_staging.py.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+COPY_RETRIES = 2                 # re-copy if the source changes while it is being read
+
+
+class StagingError(Exception):
+    pass
+
+
+class Throttle:
+    """
+    Simulated network link: every request waits `latency` seconds, and the
+    bytes of all requests share `bandwidth` bytes per second. Thread safe,
+    so concurrent requests overlap their latency like they do over SMB.
+    """
+
+    def __init__(self, bandwidth=None, latency=0.0):
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.requests = 0
+        self.bytes = 0
+        self._free_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, nbytes):
+        with self._lock:
+            self.requests += 1
+            self.bytes += nbytes
+            if self.bandwidth:
+                start = max(time.perf_counter(), self._free_at)
+                self._free_at = start + nbytes / self.bandwidth
+            done_at = self._free_at
+        delay = max(self.latency, done_at - time.perf_counter())
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ThrottledFile(io.RawIOBase):
+    """Read-only raw file whose reads go through a Throttle."""
+
+    def __init__(self, path, throttle):
+        self._f = open(path, "rb", buffering=0)
+        self._throttle = throttle
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._f.readinto(buffer)
+        self._throttle.wait(n or 0)
+        return n
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def open_throttled(path, throttle, buffering=io.DEFAULT_BUFFER_SIZE):
+    """Open `path` for reading like open(path, "rb") over a throttled link."""
+    return io.BufferedReader(ThrottledFile(path, throttle), buffer_size=buffering)
+
+
+def is_network_path(path):
+    """True for UNC paths and (on Windows) paths on a mapped network drive."""
+    path = os.path.abspath(path)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        if drive:
+            DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == DRIVE_REMOTE
+    return False
+
+
+def _chunks(size, chunk_size):
+    return [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)] or [(0, 0)]
+
+
+class Staging:
+    """
+    Stage files of one run. stage: None = only network paths, True = all,
+    False = none (fetch/output return the paths unchanged). throttle applies
+    to every read and write on the remote side (testing only).
+    """
+
+    def __init__(self, stage=None, workdir=None, workers=DEFAULT_WORKERS,
+                 chunk_size=DEFAULT_CHUNK_SIZE, verify=True, throttle=None, verbose=True):
+        self.stage = stage
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.verify = verify
+        self.throttle = throttle
+        self.verbose = verbose
+        self.sha256 = {}             # remote path -> sha256 of the staged copy
+        self._workdir = workdir
+        self._root = None
+        self._names = set()
+        self._outputs = {}           # remote path -> local path, in registration order
+        self._lock = threading.Lock()
+
+    # --- setup ---
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.publish()
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        if self._root is not None:
+            shutil.rmtree(self._root, ignore_errors=True)
+            self._root = None
+
+    def _staged(self, path):
+        return self.stage if self.stage is not None else is_network_path(path)
+
+    def _local_path(self, remote_path):
+        with self._lock:
+            if self._root is None:
+                self._root = tempfile.mkdtemp(prefix="staging_", dir=self._workdir)
+            name = os.path.basename(remote_path)
+            n = 1
+            while name in self._names:
+                stem, ext = os.path.splitext(os.path.basename(remote_path))
+                name = f"{stem}_{n}{ext}"
+                n += 1
+            self._names.add(name)
+            return os.path.join(self._root, name)
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def _wait(self, nbytes):
+        if self.throttle is not None:
+            self.throttle.wait(nbytes)
+
+    # --- copy in ---
+    def fetch(self, remote_path):
+        """Local copy of `remote_path` (or the path itself if it is not staged)."""
+        if not self._staged(remote_path):
+            return remote_path
+        local_path = self._local_path(remote_path)
+        start = time.perf_counter()
+        for attempt in range(COPY_RETRIES + 1):
+            before = os.stat(remote_path)
+            self.sha256[remote_path] = self._copy_in(remote_path, local_path, before.st_size)
+            after = os.stat(remote_path)
+            if (before.st_size, before.st_mtime) == (after.st_size, after.st_mtime):
+                break
+            self._log(f"{remote_path} changed while it was copied, retrying")
+        else:
+            raise StagingError(f"{remote_path} keeps changing, could not stage a consistent copy")
+        self._log(f"Staged {os.path.basename(remote_path)} ({before.st_size / 1e6:.1f} MB) "
+                  f"in {time.perf_counter() - start:.2f}s")
+        return local_path
+
+    def fetch_all(self, remote_paths):
+        """fetch() several files in parallel; returns {remote path: local path}."""
+        remote_paths = list(remote_paths)
+        if not remote_paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(remote_paths))) as pool:
+            return dict(zip(remote_paths, pool.map(self.fetch, remote_paths)))
+
+    def fetch_iter(self, remote_paths):
+        """
+        fetch() several files in parallel, yielding (remote path, local path,
+        error) as each copy finishes, so processing can start on the first
+        file while the others are still copying. local path is None on error.
+        """
+        remote_paths = list(remote_paths)
+        if not remote_paths:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(remote_paths))) as pool:
+            futures = {pool.submit(self.fetch, path): path for path in remote_paths}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+
+    def _copy_in(self, remote_path, local_path, size):
+        chunks = _chunks(size, self.chunk_size)
+        digests = [None] * len(chunks)
+        with open(local_path, "wb") as out:
+            out.truncate(size)
+
+        def copy_chunk(index):
+            offset, length = chunks[index]
+            with open(remote_path, "rb") as src, open(local_path, "r+b") as out:
+                src.seek(offset)
+                data = src.read(length)
+                self._wait(len(data))
+                if len(data) != length:
+                    raise StagingError(f"short read from {remote_path} at offset {offset}")
+                out.seek(offset)
+                out.write(data)
+            digests[index] = hashlib.sha256(data).digest()
+
+        workers = min(self.workers, len(chunks))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(copy_chunk, range(len(chunks))))
+        else:
+            for i in range(len(chunks)):
+                copy_chunk(i)
+
+        # one sequential pass over the local copy: check every chunk, hash the file
+        whole = hashlib.sha256()
+        with open(local_path, "rb") as f:
+            for index, (offset, length) in enumerate(chunks):
+                data = f.read(length)
+                if self.verify and hashlib.sha256(data).digest() != digests[index]:
+                    raise StagingError(f"staged copy of {remote_path} does not match at offset {offset}")
+                whole.update(data)
+        return whole.hexdigest()
+
+    # --- copy out ---
+    def output(self, remote_path):
+        """Local path to write an output to; published to `remote_path` later."""
+        if not self._staged(remote_path):
+            return remote_path
+        with self._lock:
+            if remote_path in self._outputs:
+                return self._outputs[remote_path]
+        local_path = self._local_path(remote_path)
+        with self._lock:
+            self._outputs[remote_path] = local_path
+        return local_path
+
+    def discard(self, remote_path):
+        """Forget a staged output (its tool failed) so it is never published."""
+        with self._lock:
+            local = self._outputs.pop(remote_path, None)
+        if local and os.path.exists(local):
+            os.remove(local)
+
+    def publish(self, remote_path=None):
+        """
+        Copy staged outputs to the share: all of them, or only `remote_path`.
+        Outputs that were never written (tool failed) are skipped.
+        """
+        with self._lock:
+            if remote_path is None:
+                items = list(self._outputs.items())
+                self._outputs.clear()
+            else:
+                local = self._outputs.pop(remote_path, None)
+                items = [(remote_path, local)] if local else []
+        for remote, local in items:
+            if os.path.exists(local):
+                self._copy_out(local, remote)
+
+    def _copy_out(self, local_path, remote_path):
+        start = time.perf_counter()
+        folder = os.path.dirname(os.path.abspath(remote_path))
+        os.makedirs(folder, exist_ok=True)
+        tmp = os.path.join(folder, f".{os.path.basename(remote_path)}.{os.getpid()}.staging")
+        digest = hashlib.sha256()
+        try:
+            with open(local_path, "rb") as src, open(tmp, "wb") as out:
+                for data in iter(lambda: src.read(self.chunk_size), b""):
+                    digest.update(data)
+                    self._wait(len(data))
+                    out.write(data)
+            if self.verify:
+                check = hashlib.sha256()
+                with open(tmp, "rb") as f:
+                    for data in iter(lambda: f.read(self.chunk_size), b""):
+                        self._wait(len(data))
+                        check.update(data)
+                if check.digest() != digest.digest():
+                    raise StagingError(f"copy of {local_path} to {remote_path} does not match")
+            os.replace(tmp, remote_path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._log(f"Published {remote_path} in {time.perf_counter() - start:.2f}s")
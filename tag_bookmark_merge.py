@@ -9,9 +9,17 @@ try:
 except ImportError:
     from pdfix import *
 
+from pdf_output import compact_pdf
+from staging import Staging
+
 # Input and Output files
 INPUT_PDF = r"c:\Users\is6076\Downloads\full_merge_2025.pdf"
 OUTPUT_PDF = os.path.splitext(INPUT_PDF)[0] + "_links_fixed.pdf"
+# Re-write the output with object streams + xref stream (needs pikepdf)
+COMPACT_OUTPUT = False
+# Work on local copies of input/output on a network share (staging.py);
+# None: only network paths, True/False: always/never
+STAGE_FILES = None
 
 # Helper for Pdfix error handling
 def _check(ok, pdfix: "Pdfix"):
@@ -31,8 +39,28 @@ def open_doc(pdfix: "Pdfix", path: str) -> "PdfDoc":
         _check(False, pdfix)
     return doc
 
+# One view destination + GoTo action per (target page, fit mode), shared by
+# every link that points there (index pages have hundreds of such links)
+def get_goto_action(pdfix: "Pdfix", doc: "PdfDoc", dest_page_num: int, action_cache: dict, fit=kDestFit):
+    key = (dest_page_num, fit)
+    action = action_cache.get(key)
+    if action is not None:
+        return action
+
+    new_dest = doc.CreateViewDestination(dest_page_num, fit, PdfRect(), 0.0)
+    if not new_dest:
+        return None
+
+    action = doc.CreateAction(kActionGoTo)
+    if not action:
+        return None
+
+    _check(action.SetViewDestination(new_dest), pdfix)
+    action_cache[key] = action
+    return action
+
 # Convert a single link annotation if it has a GoToR action
-def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_index: int, link_annot: "PdfLinkAnnot"):
+def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_index: int, link_annot: "PdfLinkAnnot", action_cache: dict):
     action = link_annot.GetAction()
     if not action:
         return False
@@ -49,15 +77,10 @@ def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_i
     if dest_page_num < 0 or dest_page_num >= doc.GetNumPages():
         return False
 
-    new_dest = doc.CreateViewDestination(dest_page_num, kDestFit, PdfRect(), 0.0)
-    if not new_dest:
-        return False
-
-    new_action = doc.CreateAction(kActionGoTo)
+    new_action = get_goto_action(pdfix, doc, dest_page_num, action_cache)
     if not new_action:
         return False
 
-    _check(new_action.SetViewDestination(new_dest), pdfix)
     _check(link_annot.SetAction(new_action), pdfix)
 
     print(f"✅ Converted link on page {page_index+1} ➜ destination page {dest_page_num+1}")
@@ -66,6 +89,7 @@ def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_i
 # Walk all link annotations in the PDF
 def process_links(pdfix: "Pdfix", doc: "PdfDoc") -> int:
     updated = 0
+    action_cache = {}
     for page_idx in range(doc.GetNumPages()):
         page = doc.AcquirePage(page_idx)
         if not page:
@@ -83,10 +107,11 @@ def process_links(pdfix: "Pdfix", doc: "PdfDoc") -> int:
                 if not link:
                     continue
 
-                if ensure_internal_goto(pdfix, doc, page_idx, i, link):
+                if ensure_internal_goto(pdfix, doc, page_idx, i, link, action_cache):
                     updated += 1
         finally:
             page.Release()
+    print(f"🎯 GoTo actions created: {len(action_cache)} (shared by {updated} links)")
     return updated
 
 # Main function
@@ -96,18 +121,22 @@ def main():
         raise RuntimeError("❌ Failed to initialize Pdfix SDK.")
 
     try:
-        doc = open_doc(pdfix, INPUT_PDF)
-        print(f"📄 Opened PDF: {INPUT_PDF}")
-        print(f"📌 Total pages: {doc.GetNumPages()}")
-
-        changes = process_links(pdfix, doc)
-        print(f"🔗 Links converted (GoToR ➜ GoTo): {changes}")
-
-        # Full save keeps bookmarks, tags, structure intact
-        _check(doc.Save(OUTPUT_PDF, kSaveFull), pdfix)
-        print(f"💾 Saved: {OUTPUT_PDF}")
-
-        doc.Close()
+        with Staging(stage=STAGE_FILES) as staging:
+            doc = open_doc(pdfix, staging.fetch(INPUT_PDF))
+            local_output = staging.output(OUTPUT_PDF)
+            print(f"📄 Opened PDF: {INPUT_PDF}")
+            print(f"📌 Total pages: {doc.GetNumPages()}")
+
+            changes = process_links(pdfix, doc)
+            print(f"🔗 Links converted (GoToR ➜ GoTo): {changes}")
+
+            # Full save keeps bookmarks, tags, structure intact
+            _check(doc.Save(local_output, kSaveFull), pdfix)
+            print(f"💾 Saved: {OUTPUT_PDF}")
+
+            doc.Close()
+            if COMPACT_OUTPUT:
+                compact_pdf(local_output)
     finally:
         pdfix.Destroy()
 
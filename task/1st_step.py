@@ -4,6 +4,7 @@
 # Generates a CSV report with all converted links
 
 import os
+import sys
 import csv
 
 try:
@@ -11,10 +12,22 @@ try:
 except ImportError:
     from pdfixsdk import *
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pdf_output import compact_pdf
+from staging import Staging
+from link_inventory import LinkInventory, format_rect
+
 # Input and Output files
 INPUT_PDF = r"c:\Users\is6076\Downloads\full_merge_2025.pdf"
 OUTPUT_PDF = os.path.splitext(INPUT_PDF)[0] + "_links_fixed.pdf"
 CSV_REPORT = os.path.splitext(INPUT_PDF)[0] + "_link_report.csv"
+# Re-write the output with object streams + xref stream (needs pikepdf)
+COMPACT_OUTPUT = False
+# Record every GoToR link and unresolved target in the link inventory (link_inventory.py)
+RECORD_INVENTORY = False
+# Work on local copies of input/output on a network share (staging.py);
+# None: only network paths, True/False: always/never
+STAGE_FILES = None
 
 # Helper for Pdfix error handling
 def _check(ok, pdfix: "Pdfix"):
@@ -34,8 +47,42 @@ def open_doc(pdfix: "Pdfix", path: str) -> "PdfDoc":
         _check(False, pdfix)
     return doc
 
+# One view destination + GoTo action per (target page, fit mode), shared by
+# every link that points there (index pages have hundreds of such links)
+def get_goto_action(pdfix: "Pdfix", doc: "PdfDoc", dest_page_num: int, action_cache: dict, fit=kDestFit):
+    key = (dest_page_num, fit)
+    action = action_cache.get(key)
+    if action is not None:
+        return action
+
+    new_dest = doc.CreateViewDestination(dest_page_num, fit, PdfRect(), 0.0)
+    if not new_dest:
+        return None
+
+    action = doc.CreateAction(kActionGoTo)
+    if not action:
+        return None
+
+    _check(action.SetViewDestination(new_dest), pdfix)
+    action_cache[key] = action
+    return action
+
+# Inventory fields of a GoToR link as it is before conversion
+def _gotor_link_fields(link_annot: "PdfLinkAnnot", action: "PdfAction", page_index: int) -> dict:
+    fields = {"chapter": os.path.basename(INPUT_PDF), "page": page_index + 1, "kind_before": "GoToR"}
+    try:
+        r = link_annot.GetRect()
+        fields["rect"] = format_rect([r.left, r.bottom, r.right, r.top])
+    except Exception:
+        pass
+    try:
+        fields["target_file"] = action.GetDestFile()
+    except Exception:
+        pass
+    return fields
+
 # Convert a single link annotation if it has a GoToR action
-def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_index: int, link_annot: "PdfLinkAnnot", report_rows: list):
+def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_index: int, link_annot: "PdfLinkAnnot", report_rows: list, action_cache: dict, inventory: LinkInventory = None):
     action = link_annot.GetAction()
     if not action:
         return False
@@ -44,24 +91,30 @@ def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_i
     if subtype != kActionGoToR:
         return False
 
+    fields = _gotor_link_fields(link_annot, action, page_index) if inventory else None
+
     view_dest = action.GetViewDestination()
     if not view_dest:
+        if inventory:
+            inventory.add_link(kind_after="GoToR", **fields)
+            inventory.add_broken(kind="GoToR", reason="no view destination", **_broken_fields(fields))
         return False
 
     dest_page_num = view_dest.GetPageNum(doc)
     if dest_page_num < 0 or dest_page_num >= doc.GetNumPages():
+        if inventory:
+            inventory.add_link(kind_after="GoToR", target_page=dest_page_num + 1, **fields)
+            inventory.add_broken(kind="GoToR", target_page=dest_page_num + 1,
+                                 reason="page outside the document", **_broken_fields(fields))
         return False
 
-    new_dest = doc.CreateViewDestination(dest_page_num, kDestFit, PdfRect(), 0.0)
-    if not new_dest:
-        return False
-
-    new_action = doc.CreateAction(kActionGoTo)
+    new_action = get_goto_action(pdfix, doc, dest_page_num, action_cache)
     if not new_action:
         return False
 
-    _check(new_action.SetViewDestination(new_dest), pdfix)
     _check(link_annot.SetAction(new_action), pdfix)
+    if inventory:
+        inventory.add_link(kind_after="GoTo", target_page=dest_page_num + 1, **fields)
 
     # Add entry to report
     report_rows.append({
@@ -72,9 +125,13 @@ def ensure_internal_goto(pdfix: "Pdfix", doc: "PdfDoc", page_index: int, annot_i
     print(f"✅ Converted link on page {page_index+1} ➜ destination page {dest_page_num+1}")
     return True
 
+def _broken_fields(fields: dict) -> dict:
+    return {k: fields.get(k) for k in ("chapter", "page", "target_file")}
+
 # Walk all link annotations in the PDF
-def process_links(pdfix: "Pdfix", doc: "PdfDoc", report_rows: list) -> int:
+def process_links(pdfix: "Pdfix", doc: "PdfDoc", report_rows: list, inventory: LinkInventory = None) -> int:
     updated = 0
+    action_cache = {}
     for page_idx in range(doc.GetNumPages()):
         page = doc.AcquirePage(page_idx)
         if not page:
@@ -92,10 +149,11 @@ def process_links(pdfix: "Pdfix", doc: "PdfDoc", report_rows: list) -> int:
                 if not link:
                     continue
 
-                if ensure_internal_goto(pdfix, doc, page_idx, i, link, report_rows):
+                if ensure_internal_goto(pdfix, doc, page_idx, i, link, report_rows, action_cache, inventory):
                     updated += 1
         finally:
             page.Release()
+    print(f"🎯 GoTo actions created: {len(action_cache)} (shared by {updated} links)")
     return updated
 
 # Export a CSV report of converted links
@@ -119,20 +177,33 @@ def main():
         raise RuntimeError("❌ Failed to initialize Pdfix SDK.")
 
     try:
-        doc = open_doc(pdfix, INPUT_PDF)
-        print(f"📄 Opened PDF: {INPUT_PDF}")
-        print(f"📌 Total pages: {doc.GetNumPages()}")
-
-        report_rows = []
-        changes = process_links(pdfix, doc, report_rows)
-        print(f"🔗 Links converted (GoToR ➜ GoTo): {changes}")
-
-        _check(doc.Save(OUTPUT_PDF, kSaveFull), pdfix)
-        print(f"💾 Saved fixed PDF: {OUTPUT_PDF}")
-
-        export_csv_report(report_rows, CSV_REPORT)
-
-        doc.Close()
+        with Staging(stage=STAGE_FILES) as staging:
+            doc = open_doc(pdfix, staging.fetch(INPUT_PDF))
+            local_output = staging.output(OUTPUT_PDF)
+            print(f"📄 Opened PDF: {INPUT_PDF}")
+            print(f"📌 Total pages: {doc.GetNumPages()}")
+
+            report_rows = []
+            inventory = None
+            if RECORD_INVENTORY:
+                inventory = LinkInventory()
+                inventory.start_run("1st_step", book=os.path.splitext(os.path.basename(INPUT_PDF))[0],
+                                    input_path=INPUT_PDF, output_path=OUTPUT_PDF)
+            try:
+                changes = process_links(pdfix, doc, report_rows, inventory)
+            finally:
+                if inventory:
+                    inventory.close()
+            print(f"🔗 Links converted (GoToR ➜ GoTo): {changes}")
+
+            _check(doc.Save(local_output, kSaveFull), pdfix)
+            print(f"💾 Saved fixed PDF: {OUTPUT_PDF}")
+
+            export_csv_report(report_rows, staging.output(CSV_REPORT))
+
+            doc.Close()
+            if COMPACT_OUTPUT:
+                compact_pdf(local_output)
     finally:
         pdfix.Destroy()
 
@@ -2,51 +2,55 @@ from pdfixsdk import *
 
 pdfix = GetPdfix()
 
-def wrap_link_in_reference(elem: PdsStructElement, parent: PdsStructElement = None):
-    st = elem.GetStructTree()
-    fresh = st.GetStructElementFromObject(elem.GetObject())
-    if not fresh:
-        return
-
-    tag = fresh.GetType(False)
-
-    # If we find <Link> with a <Span> child
-    if tag == "Link" and parent:
-        has_span_child = False
-        for i in range(fresh.GetNumChildren()):
-            if fresh.GetChildType(i) == kPdsStructChildElement:
-                child = st.GetStructElementFromObject(fresh.GetChildObject(i))
-                if child and child.GetType(False) == "Span":
-                    has_span_child = True
+def wrap_link(st: PdsStructTree, fresh: PdsStructElement, parent: PdsStructElement):
+    """Wrap a <Link> that has a <Span> child in a new <Reference> at the same position."""
+    has_span_child = False
+    for i in range(fresh.GetNumChildren()):
+        if fresh.GetChildType(i) == kPdsStructChildElement:
+            child = st.GetStructElementFromObject(fresh.GetChildObject(i))
+            if child and child.GetType(False) == "Span":
+                has_span_child = True
+                break
+
+    if has_span_child:
+        print("🔄 Found <Link> having <Span> → wrapping in <Reference>")
+
+        # Create new <Reference> tag in parent at same position
+        # Find index of this <Link> in parent
+        link_index = None
+        for j in range(parent.GetNumChildren()):
+            if parent.GetChildType(j) == kPdsStructChildElement:
+                if parent.GetChildObject(j).obj == fresh.GetObject().obj:
+                    link_index = j
                     break
 
-        if has_span_child:
-            print("🔄 Found <Link> having <Span> → wrapping in <Reference>")
+        if link_index is not None:
+            # Create <Reference> at same position
+            ref_obj = parent.AddNewChild("Reference", link_index)
+            ref_elem = st.GetStructElementFromObject(ref_obj.GetObject())
 
-            # Create new <Reference> tag in parent at same position
-            # Find index of this <Link> in parent
-            link_index = None
-            for j in range(parent.GetNumChildren()):
-                if parent.GetChildType(j) == kPdsStructChildElement:
-                    if parent.GetChildObject(j).obj == fresh.GetObject().obj:
-                        link_index = j
-                        break
+            # Now move the <Link> under <Reference>
+            parent.MoveChild(link_index + 1, ref_elem, -1)
+            print("✅ Wrapped successfully")
 
-            if link_index is not None:
-                # Create <Reference> at same position
-                ref_obj = parent.AddNewChild("Reference", link_index)
-                ref_elem = st.GetStructElementFromObject(ref_obj.GetObject())
 
-                # Now move the <Link> under <Reference>
-                parent.MoveChild(link_index + 1, ref_elem, -1)
-                print("✅ Wrapped successfully")
+def find_links(elem: PdsStructElement, parent: PdsStructElement, links: dict):
+    """Collect every <Link> below `elem` as {object id: (link, parent)}, in tree order."""
+    st = elem.GetStructTree()
+    fresh = st.GetStructElementFromObject(elem.GetObject())
+    if not fresh:
+        return
+
+    # <Link> elements are wrapped once the walk is done, not while it runs
+    if fresh.GetType(False) == "Link" and parent:
+        links.setdefault(fresh.GetObject().GetId(), (fresh, parent))
 
     # Recurse
     for i in range(fresh.GetNumChildren()):
         if fresh.GetChildType(i) == kPdsStructChildElement:
             child = st.GetStructElementFromObject(fresh.GetChildObject(i))
             if child:
-                wrap_link_in_reference(child, fresh)
+                find_links(child, fresh, links)
 
 
 def modify_pdf(input_path, output_path):
@@ -56,10 +60,17 @@ def modify_pdf(input_path, output_path):
 
     st = doc.GetStructTree()
 
+    # Only the tree walk finds every <Link>: the annotation index
+    # (link_struct_index) misses those without a link annotation, and the
+    # walk already knows each parent. Each element is wrapped once.
+    links = {}
     for i in range(st.GetNumChildren()):
         elem = st.GetStructElementFromObject(st.GetChildObject(i))
         if elem:
-            wrap_link_in_reference(elem, None)
+            find_links(elem, None, links)
+
+    for link, parent in links.values():
+        wrap_link(st, link, parent)
 
     if not doc.Save(output_path, kSaveFull):
         raise Exception(pdfix.GetError())
@@ -1,6 +1,11 @@
 from pdfixsdk import *
 import json
 import ctypes
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pdfix_save import save_doc
 
 
 def int_to_roman(num):
@@ -88,8 +93,10 @@ class PageNumberSetter:
                 arabic_dict.PutName("S", "D")  # Decimal Arabic numerals
                 arabic_dict.PutNumber("St", arabic_start_number)  # Start from roman_count + 1
 
-            # Save the modified PDF
-            if not doc.Save(output_pdf, kSaveFull):
+            # Save the modified PDF: only the catalog and the label dictionaries
+            # changed, so this is appended as an incremental update
+            changes = 2 + nums_array.GetNumObjects() // 2
+            if not save_doc(self.pdfix, doc, output_pdf, changes=changes):
                 raise Exception(f"Unable to save PDF: {self.pdfix.GetErrorType()}")
 
             print(f"✅ Successfully set page numbers:")
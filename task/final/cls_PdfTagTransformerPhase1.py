@@ -1,8 +1,18 @@
 from pdfixsdk import *
 import json
+import os
 import re
+import sys
 import ctypes
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from pdf_output import compact_pdf, linearize_pdf
+
+# Re-write every phase output with object streams + xref stream (needs pikepdf)
+COMPACT_OUTPUT = False
+# Write the final deliverable (last phase) linearized for fast web view (needs pikepdf)
+LINEARIZE_OUTPUT = False
+
 
 # ============================================================
 # CLASS 1 → Phase 1 (Steps 1–13)
@@ -488,6 +498,8 @@ class PdfTagTransformerPhase1:
             raise Exception(f"❌ Failed to save PDF: {self.pdfix.GetError()}")
 
         doc.Close()
+        if COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Phase 1 complete. Saved to: {output_path}")
 
 
@@ -721,6 +733,8 @@ class Reference:
             raise Exception(f"❌ Failed to save: {self.pdfix.GetError()}")
 
         doc.Close()
+        if COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Phase 2 complete. Saved to: {output_path}")
 
 
@@ -1128,6 +1142,8 @@ class Table:
             raise Exception(f"❌ Failed to save: {self.pdfix.GetError()}")
 
         doc.Close()
+        if COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Phase 2 complete. Saved to: {output_path}")
 
 
@@ -1768,6 +1784,8 @@ class footprint:
             raise Exception(f"❌ Failed to save: {self.pdfix.GetError()}")
 
         doc.Close()
+        if COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Phase 2 complete. Saved to: {output_path}")
 
 class Table_delete:
@@ -1885,6 +1903,8 @@ class Table_delete:
             raise Exception(f"❌ Failed to save PDF: {self.pdfix.GetError()}")
 
         doc.Close()
+        if COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Phase 1 complete. Saved to: {output_path}")
 
 class PdfAltTextSetter:
@@ -1944,6 +1964,8 @@ class PdfAltTextSetter:
             raise Exception(f"❌ Failed to save PDF: {self.pdfix.GetError()}")
 
         doc.Close()
+        if COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Alt text added successfully. Saved to: {output_path}")
 
 
@@ -2059,6 +2081,8 @@ class Figure_inlineequation:
             raise Exception(f"❌ Failed to save PDF: {self.pdfix.GetError()}")
 
         doc.Close()
+        if COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Phase 1 complete. Saved to: {output_path}")
 
 
@@ -2203,6 +2227,10 @@ class formula_inside_figure_delete:
             raise Exception(f"❌ Failed to save PDF: {self.pdfix.GetError()}")
 
         doc.Close()
+        if LINEARIZE_OUTPUT:
+            linearize_pdf(output_path, compact=COMPACT_OUTPUT)
+        elif COMPACT_OUTPUT:
+            compact_pdf(output_path)
         print(f"✅ Phase 1 complete. Saved to: {output_path}")
 
 
@@ -1,10 +1,26 @@
 # final_converter_with_visible_alt.py
 from pdfixsdk import *
-import os, csv, traceback
+import os, sys, csv, traceback
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pdf_output import compact_pdf
+from pdfix_save import save_doc
+from staging import Staging
+from link_struct_index import AnnotStructIndex
+from link_inventory import LinkInventory, format_rect
 
 INPUT_PDF = r"C:\Users\IS12765\Desktop\see11.pdf"
 OUTPUT_PDF = os.path.splitext(INPUT_PDF)[0] + "_links_fixed.pdf"
 CSV_REPORT = os.path.splitext(INPUT_PDF)[0] + "_link_report.csv"
+# Re-write the output with object streams + xref stream (needs pikepdf)
+COMPACT_OUTPUT = False
+# Record every link and unresolved target in the link inventory (link_inventory.py)
+RECORD_INVENTORY = False
+# Work on local copies of input/output on a network share (staging.py);
+# None: only network paths, True/False: always/never
+STAGE_FILES = None
+
+ACTION_KINDS = {kActionGoTo: "GoTo", kActionGoToR: "GoToR"}
 
 def set_link_alt_readable(annot, text):
     """Correct way to set link description Acrobat will show."""
@@ -29,9 +45,12 @@ def get_dest_page_num(doc, dest):
         return None
 
 
-def create_goto_action(doc, page_num):
+def create_goto_action(doc, page_num, action_cache=None, fit=kDestFit):
+    # links to the same page share one destination + action
+    key = (page_num, fit)
+    if action_cache is not None and key in action_cache:
+        return action_cache[key]
     try:
-        fit = kDestFit
         rect = PdfRect()
         rect.left = rect.top = rect.right = rect.bottom = 0
 
@@ -46,6 +65,8 @@ def create_goto_action(doc, page_num):
         if not action.SetViewDestination(dest):
             return None
 
+        if action_cache is not None:
+            action_cache[key] = action
         return action
     except:
         traceback.print_exc()
@@ -53,86 +74,126 @@ def create_goto_action(doc, page_num):
 
 
 def main():
-    pdfix = GetPdfix()
-    doc = pdfix.OpenDoc(INPUT_PDF, "")
-
-    pages = doc.GetNumPages()
-    print("Opened:", INPUT_PDF)
-    print("Pages:", pages)
-
-    converted = 0
-    report_rows = []
-
-    for p in range(pages):
-        page = doc.AcquirePage(p)
-        annots = page.GetNumAnnots()
-
-        for i in range(annots):
-            annot = page.GetAnnot(i)
-            if annot.GetSubtype() != kAnnotLink:
-                continue
-
-            link = PdfLinkAnnot(annot.obj)
-            action = link.GetAction()
-            if not action:
-                continue
-
-            dest = action.GetViewDestination()
-            if not dest:
-                continue
-
-            dest_page = get_dest_page_num(doc, dest)
-            if dest_page is None or dest_page < 0 or dest_page >= pages:
-                continue
-
-            print(f"Page {p+1}, Link {i}: GoTo page {dest_page+1}")
-
-            # create internal action
-            new_action = create_goto_action(doc, dest_page)
-            if not new_action:
-                continue
-
-            if not link.SetAction(new_action):
-                continue
-
-            # real alt text visible in Acrobat
-            alt_text = f"{dest_page+1}"
-            set_link_alt_readable(annot, alt_text)
-
-            # optional: set ActualText in structure
-            try:
-                struct_obj = annot.GetStructObject(0)
-                if struct_obj:
-                    elem = doc.GetStructTree().GetStructElementFromObject(struct_obj)
-                    elem.SetActualText(alt_text)
-            except:
-                pass
-
-            report_rows.append({
-                "Source Page": p+1,
-                "Destination Page": dest_page+1,
-                "Alt Text": alt_text
-            })
-
-            converted += 1
-
-        page.Release()
-
-    print("Converted:", converted)
-
-    doc.Save(OUTPUT_PDF, kSaveFull)
-    print("Saved:", OUTPUT_PDF)
-
-    # csv
-    if report_rows:
-        with open(CSV_REPORT, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=["Source Page", "Destination Page", "Alt Text"])
-            w.writeheader()
-            w.writerows(report_rows)
-        print("CSV:", CSV_REPORT)
-
-    doc.Close()
-    pdfix.Destroy()
+    with Staging(stage=STAGE_FILES) as staging:
+        pdfix = GetPdfix()
+        doc = pdfix.OpenDoc(staging.fetch(INPUT_PDF), "")
+        local_output = staging.output(OUTPUT_PDF)
+
+        pages = doc.GetNumPages()
+        print("Opened:", INPUT_PDF)
+        print("Pages:", pages)
+
+        converted = 0
+        report_rows = []
+        action_cache = {}
+        struct_index = AnnotStructIndex(doc)
+        inventory = None
+        if RECORD_INVENTORY:
+            inventory = LinkInventory()
+            inventory.start_run("link_index", book=os.path.splitext(os.path.basename(INPUT_PDF))[0],
+                                input_path=INPUT_PDF, output_path=OUTPUT_PDF)
+
+        for p in range(pages):
+            page = doc.AcquirePage(p)
+            annots = page.GetNumAnnots()
+
+            for i in range(annots):
+                annot = page.GetAnnot(i)
+                if annot.GetSubtype() != kAnnotLink:
+                    continue
+
+                link = PdfLinkAnnot(annot.obj)
+                action = link.GetAction()
+                if not action:
+                    continue
+
+                dest = action.GetViewDestination()
+                if not dest:
+                    continue
+
+                if inventory:
+                    r = link.GetRect()
+                    fields = {
+                        "chapter": os.path.basename(INPUT_PDF),
+                        "page": p + 1,
+                        "rect": format_rect([r.left, r.bottom, r.right, r.top]),
+                        "kind_before": ACTION_KINDS.get(action.GetSubtype(), str(action.GetSubtype())),
+                    }
+
+                dest_page = get_dest_page_num(doc, dest)
+                if dest_page is None or dest_page < 0 or dest_page >= pages:
+                    if inventory:
+                        target_page = dest_page + 1 if dest_page is not None else None
+                        inventory.add_link(kind_after=fields["kind_before"], target_page=target_page, **fields)
+                        inventory.add_broken(chapter=fields["chapter"], page=p + 1, kind=fields["kind_before"],
+                                             target_page=target_page, reason="page outside the document")
+                    continue
+
+                print(f"Page {p+1}, Link {i}: GoTo page {dest_page+1}")
+
+                # create internal action
+                new_action = create_goto_action(doc, dest_page, action_cache)
+                failure = None
+                if not new_action:
+                    failure = "could not create GoTo action"
+                elif not link.SetAction(new_action):
+                    failure = "SetAction failed: " + pdfix.GetError()
+                if failure:
+                    # the link keeps its old action; QA finds it in the inventory
+                    if inventory:
+                        inventory.add_link(kind_after=fields["kind_before"], target_page=dest_page + 1, **fields)
+                        inventory.add_broken(chapter=fields["chapter"], page=p + 1, kind=fields["kind_before"],
+                                             target_page=dest_page + 1, reason=failure)
+                    continue
+
+                # real alt text visible in Acrobat
+                alt_text = f"{dest_page+1}"
+                set_link_alt_readable(annot, alt_text)
+
+                # optional: set ActualText in structure
+                try:
+                    elem = struct_index.element(p, i)
+                    if elem:
+                        elem.SetActualText(alt_text)
+                except:
+                    pass
+
+                report_rows.append({
+                    "Source Page": p+1,
+                    "Destination Page": dest_page+1,
+                    "Alt Text": alt_text
+                })
+                if inventory:
+                    inventory.add_link(kind_after="GoTo", target_page=dest_page + 1, alt_text=alt_text, **fields)
+
+                converted += 1
+
+            page.Release()
+
+        if inventory:
+            inventory.close()
+        print("Converted:", converted)
+        print("GoTo actions created:", len(action_cache))
+
+        # each converted link: annotation + struct element alt text; plus the shared actions
+        save_mode = save_doc(pdfix, doc, local_output, changes=2 * converted + 2 * len(action_cache))
+        if not save_mode:
+            raise RuntimeError("Save failed: " + pdfix.GetError())
+        print(f"Saved ({save_mode}):", OUTPUT_PDF)
+
+        # csv
+        if report_rows:
+            with open(staging.output(CSV_REPORT), "w", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=["Source Page", "Destination Page", "Alt Text"])
+                w.writeheader()
+                w.writerows(report_rows)
+            print("CSV:", CSV_REPORT)
+
+        doc.Close()
+        pdfix.Destroy()
+
+        if COMPACT_OUTPUT:
+            compact_pdf(local_output)
 
 
 if __name__ == "__main__":
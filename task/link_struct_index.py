@@ -0,0 +1,132 @@
+# link_struct_index.py
+# Annotation <-> structure element index, built in one pass over the
+# StructTreeRoot ParentTree and the OBJR kids of the elements it points at.
+# Link tools look elements up here instead of calling GetStructObject /
+# GetStructElementFromObject per link or walking the whole structure tree.
+
+from pdfixsdk import *
+
+
+def _as_dict(obj):
+    if obj and obj.GetObjectType() == kPdsDictionary:
+        return PdsDictionary(obj.obj)
+    return None
+
+
+def _as_array(obj):
+    if obj and obj.GetObjectType() == kPdsArray:
+        return PdsArray(obj.obj)
+    return None
+
+
+class AnnotStructIndex:
+    """
+    Bidirectional index between annotations, addressed as (page index,
+    annotation index) like in page.GetAnnot(i), and their struct elements.
+
+    Build it once per opened document, before annotations are added or
+    removed (changing a link's action does not invalidate it).
+    """
+
+    def __init__(self, doc: "PdfDoc"):
+        self.doc = doc
+        self.struct_tree = doc.GetStructTree()
+        self._elem_by_annot = {}    # (page, annot index) -> struct element dictionary
+        self._annots_by_elem = {}   # struct element object id -> [(page, annot index)]
+        self._elem_dicts = {}       # struct element object id -> struct element dictionary
+        self._build()
+
+    # ParentTree number tree -> {key: PdsObject}
+    def _parent_tree_entries(self):
+        entries = {}
+        root = self.doc.GetRootObject()
+        st_root = root.GetDictionary("StructTreeRoot") if root else None
+        node = st_root.GetDictionary("ParentTree") if st_root else None
+        stack = [node] if node else []
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node.GetId() and node.GetId() in seen:
+                continue
+            seen.add(node.GetId())
+            kids = node.GetArray("Kids")
+            if kids:
+                for i in range(kids.GetNumObjects()):
+                    kid = _as_dict(kids.Get(i))
+                    if kid:
+                        stack.append(kid)
+            nums = node.GetArray("Nums")
+            if nums:
+                for i in range(0, nums.GetNumObjects() - 1, 2):
+                    entries[nums.GetInteger(i)] = nums.Get(i + 1)
+        return entries
+
+    # OBJR dictionaries among the kids of a struct element
+    @staticmethod
+    def _objr_kids(elem):
+        kids = elem.Get("K")
+        arr = _as_array(kids)
+        candidates = [arr.Get(i) for i in range(arr.GetNumObjects())] if arr else [kids]
+        for kid in candidates:
+            kid = _as_dict(kid)
+            if kid and kid.Known("Obj"):
+                yield kid
+
+    def _build(self):
+        entries = self._parent_tree_entries()
+
+        # Annotation keys of the ParentTree hold the element itself (page keys
+        # hold an array of elements); its OBJR kids name the annotation objects.
+        elem_by_obj_id = {}
+        for value in entries.values():
+            elem = _as_dict(value)
+            if elem is None:
+                continue
+            for objr in self._objr_kids(elem):
+                target = objr.Get("Obj")
+                if target:
+                    elem_by_obj_id[target.GetId()] = elem
+
+        for p in range(self.doc.GetNumPages()):
+            page = self.doc.AcquirePage(p)
+            if not page:
+                continue
+            try:
+                for i in range(page.GetNumAnnots()):
+                    annot = page.GetAnnot(i)
+                    if not annot:
+                        continue
+                    annot_dict = annot.GetObject()
+                    elem = elem_by_obj_id.get(annot_dict.GetId())
+                    if elem is None:
+                        key = annot_dict.GetInteger("StructParent", -1)
+                        elem = _as_dict(entries.get(key)) if key >= 0 else None
+                    if elem is None:
+                        continue
+                    self._elem_by_annot[(p, i)] = elem
+                    self._annots_by_elem.setdefault(elem.GetId(), []).append((p, i))
+                    self._elem_dicts[elem.GetId()] = elem
+            finally:
+                page.Release()
+
+    def __len__(self):
+        return len(self._elem_by_annot)
+
+    def element(self, page_index: int, annot_index: int):
+        """Struct element (PdsStructElement) of an annotation, or None."""
+        elem = self._elem_by_annot.get((page_index, annot_index))
+        if elem is None:
+            return None
+        return self.struct_tree.GetStructElementFromObject(elem)
+
+    def annotations(self, elem):
+        """[(page index, annot index)] of the annotations a struct element owns."""
+        obj = elem.GetObject() if hasattr(elem, "GetObject") else elem
+        return list(self._annots_by_elem.get(obj.GetId(), []))
+
+    def elements_of_type(self, tag: str):
+        """Indexed struct elements whose own type (no role mapping) is `tag`."""
+        for elem_dict in self._elem_dicts.values():
+            elem = self.struct_tree.GetStructElementFromObject(elem_dict)
+            if elem and elem.GetType(False) == tag:
+                yield elem
@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for _path in (os.path.join(ROOT, "Bookmark_cleaning"), ROOT):
+    sys.path.insert(0, _path)
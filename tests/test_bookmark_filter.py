@@ -0,0 +1,85 @@
+import pikepdf
+
+from bookmark_filter import compile_filters, filter_outline
+
+
+class Dict:
+    """The PDFix PdsDictionary calls filter_outline uses, over a pikepdf dictionary."""
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def GetDictionary(self, key):
+        value = self.obj.get("/" + key)
+        return Dict(value) if isinstance(value, pikepdf.Dictionary) else None
+
+    def Get(self, key):
+        return self.obj.get("/" + key)
+
+    def GetId(self):
+        return self.obj.objgen
+
+    def Put(self, key, value):
+        self.obj["/" + key] = value.obj
+
+    def RemoveKey(self, key):
+        del self.obj["/" + key]
+
+    def GetText(self, key):
+        return str(self.obj.get("/" + key, ""))
+
+    def GetNumber(self, key):
+        return int(self.obj.get("/" + key, 0))
+
+    def PutNumber(self, key, value):
+        self.obj["/" + key] = value
+
+
+class Doc:
+    def __init__(self, pdf):
+        self.pdf = pdf
+
+    def GetRootObject(self):
+        return Dict(self.pdf.Root)
+
+
+def item(title, children=(), closed=False):
+    node = pikepdf.OutlineItem(title, 0)
+    node.children.extend(children)
+    node.is_closed = closed
+    return node
+
+
+def outline(pdf):
+    """[(title, /Count, children)] below the outline root."""
+    def items(node):
+        out = []
+        while node is not None:
+            out.append((str(node.Title), int(node.get("/Count", 0)), items(node.get("/First"))))
+            node = node.get("/Next")
+        return out
+    return items(pdf.Root.Outlines.get("/First"))
+
+
+def test_promoted_children_keep_the_removed_bookmarks_open_state():
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    with pdf.open_outline() as root:
+        root.root.extend([
+            item("Part 1", [item("ch01.pdf", [item("1.1"), item("1.2")])]),
+            item("Part 2", [item("ch02.pdf", [item("2.1")], closed=True)]),
+            item("Part 3", [item("3.1")]),
+        ])
+    # producers often leave /Count off an item; it then reads as 0, like a leaf
+    for part in (pdf.Root.Outlines.First, pdf.Root.Outlines.First.Next):
+        del part["/Count"]
+
+    removed, _ = filter_outline(Doc(pdf), compile_filters([".pdf"]))
+
+    assert removed == 2
+    assert outline(pdf) == [
+        ("Part 1", 2, [("1.1", 0, []), ("1.2", 0, [])]),
+        ("Part 2", -1, [("2.1", 0, [])]),
+        ("Part 3", 1, [("3.1", 0, [])]),
+    ]
+    assert pdf.Root.Outlines.Count == 6
@@ -0,0 +1,51 @@
+import os
+import shutil
+import time
+from concurrent.futures import wait
+
+import pytest
+
+from bookmark_jobs import JobQueue
+
+
+def no_pdfix():
+    """Pool initializer for the tests: the job function does not use PDFix."""
+
+
+def copy_or_crash(input_pdf, output_pdf, pdfix=None):
+    # a worker dying under a job, like a PDFix crash on a bad file
+    if b"CRASH" in open(input_pdf, "rb").read():
+        os._exit(1)
+    shutil.copy(input_pdf, output_pdf)
+
+
+@pytest.fixture
+def jobs():
+    jobs = JobQueue(copy_or_crash, max_workers=1, initializer=no_pdfix)
+    yield jobs
+    jobs.shutdown()
+
+
+def run(jobs, tmp_path, name, body):
+    src = tmp_path / name
+    src.write_bytes(b"%PDF-1.7\n" + body + b"\n%%EOF\n")
+    job_id = jobs.submit(str(src), str(tmp_path / ("out_" + name)), name)
+    job = jobs.get(job_id)
+    wait([job["future"]], timeout=30)
+    while job["finished"] is None:       # the done callback runs just after the waiters wake
+        time.sleep(0.01)
+    return job_id
+
+
+def test_dead_worker_fails_its_job_and_the_next_job_runs(jobs, tmp_path):
+    crashed = run(jobs, tmp_path, "bad.pdf", b"CRASH")
+    done = run(jobs, tmp_path, "good.pdf", b"ok")
+
+    info = jobs.status(crashed)
+    assert info["status"] == "error" and "worker process died" in info["error"]
+    assert jobs.status(done)["status"] == "done"
+    assert (tmp_path / "out_good.pdf").read_bytes().startswith(b"%PDF-1.7\nok")
+
+    # and again, now that the pool has been replaced once
+    run(jobs, tmp_path, "bad2.pdf", b"CRASH")
+    assert jobs.status(run(jobs, tmp_path, "good2.pdf", b"ok"))["status"] == "done"
@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+
+import link_inventory
+from link_inventory import LinkInventory
+
+
+def test_unresolved_on_missing_database_reports_error_and_creates_nothing(tmp_path, monkeypatch, capsys):
+    db = tmp_path / "links.sqlite"
+    monkeypatch.setattr(link_inventory, "DEFAULT_DB", str(db))
+
+    assert link_inventory.main(["link_inventory.py", "unresolved"]) == 1
+    assert "not found" in capsys.readouterr().out
+    assert not db.exists()
+
+
+def test_readonly_inventory_queries_without_writing(tmp_path):
+    db = tmp_path / "links.sqlite"
+    with LinkInventory(str(db)) as inv:
+        inv.start_run("link_index", "book")
+        inv.add_broken(chapter="ch01.pdf", page=4, kind="GoToR", target_file="ch02.pdf", reason="missing file")
+    before = db.read_bytes()
+
+    with LinkInventory(str(db), readonly=True) as inv:
+        rows = inv.unresolved_gotor()
+        assert len(rows) == 1
+        with pytest.raises(sqlite3.OperationalError):
+            inv.conn.execute("DELETE FROM broken_targets")
+    assert db.read_bytes() == before
@@ -0,0 +1,97 @@
+import pikepdf
+import pytest
+
+from outline_merge import build_book_outline
+from working_internal_external import merge_pdfs_preserve_links
+
+URI = "https://doi.org/10.1016/B978-0-443-18452-9.00001-1"
+
+
+def make_chapter(path, title, pages=2):
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    pdf.docinfo["/Title"] = title
+    with pdf.open_outline() as outline:
+        outline.root.append(pikepdf.OutlineItem("Section 1", 1))
+        outline.root.append(pikepdf.OutlineItem("Chapter on the web", action=pikepdf.Dictionary(
+            S=pikepdf.Name.URI, URI=pikepdf.String(URI))))
+        outline.root.append(pikepdf.OutlineItem("Next page", action=pikepdf.Dictionary(
+            S=pikepdf.Name.Named, N=pikepdf.Name.NextPage)))
+        outline.root.append(pikepdf.OutlineItem("Ch 1 notes", 0))
+        outline.root.append(pikepdf.OutlineItem("Chapter notes", 0))
+    pdf.save(path)
+
+
+def book_outline(path):
+    """[(title, page index or None, action dict or None, children)] of a saved PDF."""
+    with pikepdf.open(path) as pdf:
+        pages = {page.objgen: i for i, page in enumerate(pdf.pages)}
+
+        def items(item):
+            out = []
+            while item is not None:
+                dest = item.get("/Dest")
+                action = item.get("/A")
+                out.append((
+                    str(item.Title),
+                    pages.get(dest[0].objgen) if dest is not None else None,
+                    {str(k): str(v) for k, v in action.items()} if action is not None else None,
+                    items(item.get("/First")),
+                ))
+                item = item.get("/Next")
+            return out
+
+        return items(pdf.Root.Outlines.get("/First"))
+
+
+@pytest.fixture
+def chapters(tmp_path):
+    paths = []
+    for n in (1, 2):
+        path = str(tmp_path / f"ch{n}.pdf")
+        make_chapter(path, f"Chapter {n}")
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("backend", ["pypdf", "pikepdf"])
+def test_uri_and_named_bookmarks_keep_their_action(tmp_path, chapters, backend):
+    out = str(tmp_path / "book.pdf")
+    merge_pdfs_preserve_links(chapters, out, backend=backend, verbose=False, merge_outlines=True,
+                              outline_filters=())
+
+    book = book_outline(out)
+    assert [title for title, _, _, _ in book] == ["Chapter 1", "Chapter 2"]
+    for chapter, (_, start, _, children) in enumerate(book):
+        assert start == 2 * chapter
+        by_title = {title: (page, action) for title, page, action, _ in children}
+        assert by_title["Section 1"] == (2 * chapter + 1, None)
+        assert by_title["Chapter on the web"] == (None, {"/S": "/URI", "/URI": URI})
+        assert by_title["Next page"] == (None, {"/S": "/Named", "/N": "/NextPage"})
+
+
+class _NoOutlineBackend:
+    """Just enough backend for build_book_outline."""
+
+    def __init__(self, titles):
+        self.titles = titles
+
+    def read_outline(self, r_idx):
+        return [{"title": t, "dest": None, "action": None, "open": False, "children": []} for t in self.titles]
+
+    def document_title(self, r_idx):
+        return "Chapter"
+
+    def make_dest(self, merged_idx):
+        return merged_idx
+
+
+def test_outline_filters_follow_bookmark_filter_rules():
+    backend = _NoOutlineBackend(["Ch 1 notes", "Chapter notes", "ch01.PDF", "Outline placeholder 3"])
+    readers = [{"num_pages": 1, "start_page": 0, "filename": "ch01.pdf"}]
+
+    nodes, stats = build_book_outline(backend, readers, None, ["word:ch", "re:\\.pdf$", "outline placeholder"])
+
+    assert [node["title"] for node in nodes[0]["children"]] == ["Chapter notes"]
+    assert stats["filtered"] == 3
@@ -0,0 +1,39 @@
+import sys
+
+import pikepdf
+
+from pdf_output import check_linearization, linearize_pdf
+from working_internal_external import merge_pdfs_preserve_links
+
+
+def make_pdf(path, pages=3):
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    pdf.save(path)
+
+
+def test_linearized_merge_leaves_stderr_alone(tmp_path, monkeypatch):
+    # pytest captures stderr; start from the real stream so a leaked StringIO shows
+    monkeypatch.setattr(sys, "stderr", sys.__stderr__)
+    chapters = [str(tmp_path / f"ch{n}.pdf") for n in (1, 2)]
+    for path in chapters:
+        make_pdf(path)
+    out = str(tmp_path / "book.pdf")
+
+    merge_pdfs_preserve_links(chapters, out, backend="pikepdf", verbose=False, linearize=True)
+
+    assert sys.stderr is sys.__stderr__
+    assert check_linearization(out)["ok"]
+    assert sys.stderr is sys.__stderr__
+
+
+def test_linearize_pdf_reports_check(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "stderr", sys.__stderr__)
+    path = str(tmp_path / "book.pdf")
+    make_pdf(path)
+
+    stats = linearize_pdf(path, verbose=False)
+
+    assert stats["linearized"]
+    assert sys.stderr is sys.__stderr__
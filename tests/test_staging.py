@@ -0,0 +1,158 @@
+import hashlib
+import os
+
+import pytest
+
+import staging
+from staging import Staging, StagingError, Throttle
+
+CHUNK = 64 * 1024
+
+
+@pytest.fixture
+def share(tmp_path):
+    """Local directory standing in for the network share."""
+    path = tmp_path / "share"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    path = tmp_path / "local"
+    path.mkdir()
+    return str(path)
+
+
+def write_pdf(path, size=5 * CHUNK + 123):
+    data = b"%PDF-1.7\n" + os.urandom(size) + b"\n%%EOF\n"
+    path.write_bytes(data)
+    return data
+
+
+def test_fetch_returns_identical_copy_and_records_sha256(share, workdir):
+    remote = share / "book.pdf"
+    data = write_pdf(remote)
+    throttle = Throttle(bandwidth=50e6, latency=0.001)
+
+    with Staging(stage=True, workdir=workdir, chunk_size=CHUNK, throttle=throttle, verbose=False) as st:
+        local = st.fetch(str(remote))
+
+        assert local != str(remote)
+        assert os.path.dirname(os.path.dirname(local)) == workdir
+        with open(local, "rb") as f:
+            assert f.read() == data
+        assert st.sha256[str(remote)] == hashlib.sha256(data).hexdigest()
+    # one throttled request per chunk, all bytes went over the "link"
+    assert throttle.requests == -(-len(data) // CHUNK)
+    assert throttle.bytes == len(data)
+    assert os.listdir(workdir) == []
+
+
+def test_fetch_passes_local_paths_through_by_default(share):
+    remote = share / "book.pdf"
+    write_pdf(remote)
+    with Staging(verbose=False) as st:
+        assert st.fetch(str(remote)) == str(remote)
+        assert st.output(str(share / "out.pdf")) == str(share / "out.pdf")
+
+
+def test_publish_replaces_through_temp_file(share, workdir, monkeypatch):
+    remote_out = share / "out" / "book_output.pdf"
+    replaced = []
+    real_replace = os.replace
+
+    def spy_replace(src, dst):
+        replaced.append((src, dst))
+        assert os.path.exists(src)
+        assert not os.path.exists(dst)       # readers never see a partial file
+        real_replace(src, dst)
+
+    monkeypatch.setattr(staging.os, "replace", spy_replace)
+
+    with Staging(stage=True, workdir=workdir, chunk_size=CHUNK,
+                 throttle=Throttle(latency=0.001), verbose=False) as st:
+        local = st.output(str(remote_out))
+        with open(local, "wb") as f:
+            f.write(b"%PDF-1.7 result\n%%EOF\n")
+        assert not remote_out.exists()
+
+    assert remote_out.read_bytes() == b"%PDF-1.7 result\n%%EOF\n"
+    assert len(replaced) == 1
+    src, dst = replaced[0]
+    assert dst == str(remote_out)
+    assert os.path.dirname(src) == str(remote_out.parent) and src.endswith(".staging")
+    assert [name for name in os.listdir(remote_out.parent) if name.endswith(".staging")] == []
+
+
+def test_exit_does_not_publish_when_the_block_raises(share, workdir):
+    remote_out = share / "book_output.pdf"
+
+    with pytest.raises(RuntimeError):
+        with Staging(stage=True, workdir=workdir, verbose=False) as st:
+            with open(st.output(str(remote_out)), "wb") as f:
+                f.write(b"half a PDF")
+            raise RuntimeError("tool failed")
+
+    assert not remote_out.exists()
+    assert os.listdir(share) == []
+    assert os.listdir(workdir) == []         # local copies cleaned up anyway
+
+
+def test_discarded_output_is_not_published(share, workdir):
+    with Staging(stage=True, workdir=workdir, verbose=False) as st:
+        for name in ("a.pdf", "b.pdf"):
+            with open(st.output(str(share / name)), "wb") as f:
+                f.write(b"%PDF")
+        st.discard(str(share / "a.pdf"))
+
+    assert sorted(os.listdir(share)) == ["b.pdf"]
+
+
+class ChangingThrottle(Throttle):
+    """Appends to the source on every read, like a file still being written."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def wait(self, nbytes):
+        super().wait(nbytes)
+        with open(self.path, "ab") as f:
+            f.write(b"more")
+
+
+def test_fetch_raises_when_source_keeps_changing(share, workdir):
+    remote = share / "growing.pdf"
+    write_pdf(remote, size=CHUNK)
+    throttle = ChangingThrottle(str(remote))
+
+    with Staging(stage=True, workdir=workdir, chunk_size=CHUNK, throttle=throttle, verbose=False) as st:
+        with pytest.raises(StagingError, match="keeps changing"):
+            st.fetch(str(remote))
+    # the first copy and every retry were attempted
+    assert throttle.requests >= staging.COPY_RETRIES + 1
+
+
+def test_fetch_iter_reports_errors_per_file(share, workdir):
+    good = share / "good.pdf"
+    data = write_pdf(good)
+    missing = share / "missing.pdf"
+
+    with Staging(stage=True, workdir=workdir, chunk_size=CHUNK, verbose=False) as st:
+        results = {remote: (local, error) for remote, local, error in st.fetch_iter([str(good), str(missing)])}
+
+    local, error = results[str(good)]
+    assert error is None and st.sha256[str(good)] == hashlib.sha256(data).hexdigest()
+    local, error = results[str(missing)]
+    assert local is None and isinstance(error, OSError)
+
+
+@pytest.mark.parametrize("verify", [True, False])
+def test_single_worker_copies_every_chunk(share, workdir, verify):
+    remote = share / "book.pdf"
+    data = write_pdf(remote)
+
+    with Staging(stage=True, workdir=workdir, workers=1, chunk_size=CHUNK, verify=verify, verbose=False) as st:
+        with open(st.fetch(str(remote)), "rb") as f:
+            assert f.read() == data
@@ -0,0 +1,178 @@
+import os
+import shutil
+from concurrent.futures import Future
+
+import pytest
+
+import watch_daemon
+from watch_daemon import ReadyQueue, WatchDaemon, pdf_complete
+
+DEBOUNCE = 5.0
+T0 = 1_000_000.0
+
+
+class InlinePool:
+    """Stands in for the worker pool: runs run_chain in the test process, without PDFix."""
+
+    def submit(self, call_with_pdfix, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Tool chain of one "copy" step; returns the names it ran on, in order."""
+    names = []
+
+    def step_copy(pdfix, src, dst, watch, work_dir):
+        names.append(os.path.basename(src))
+        if b"FAIL" in open(src, "rb").read():
+            raise RuntimeError("tool failed")
+        shutil.copy(src, dst)
+
+    monkeypatch.setitem(watch_daemon.STEPS, "copy", step_copy)
+    return names
+
+
+@pytest.fixture
+def folders(tmp_path):
+    # the share is a local directory; run_chain stages it anyway (stage=True)
+    paths = {name: tmp_path / name for name in ("inbox", "out")}
+    for path in paths.values():
+        path.mkdir()
+    return paths
+
+
+@pytest.fixture
+def daemon(folders, processed):
+    daemon = WatchDaemon({
+        "workers": 1,
+        "debounce_seconds": DEBOUNCE,
+        "poll": True,
+        "watches": [{"input": str(folders["inbox"]), "output": str(folders["out"]),
+                     "chain": ["copy"], "stage": True}],
+    })
+    daemon._pool = InlinePool()
+    return daemon
+
+
+def drop(folder, name, size=100, complete=True, body=b""):
+    data = b"%PDF-1.7\n" + body + b"x" * size + (b"\n%%EOF\n" if complete else b"")
+    (folder / name).write_bytes(data)
+    return data
+
+
+def test_pdf_complete(tmp_path):
+    drop(tmp_path, "done.pdf")
+    drop(tmp_path, "partial.pdf", complete=False)
+    (tmp_path / "early_eof.pdf").write_bytes(b"%PDF\n%%EOF\n" + b"x" * (2 * watch_daemon.EOF_TAIL))
+
+    assert pdf_complete(str(tmp_path / "done.pdf"))
+    assert not pdf_complete(str(tmp_path / "partial.pdf"))
+    assert not pdf_complete(str(tmp_path / "early_eof.pdf"))
+    assert not pdf_complete(str(tmp_path / "missing.pdf"))
+
+
+def test_file_is_processed_once_stable_for_debounce(daemon, folders, processed):
+    data = drop(folders["inbox"], "ch01.pdf")
+
+    daemon.step(T0)
+    daemon.step(T0 + DEBOUNCE - 1)
+    assert processed == [] and len(daemon.ready) == 0
+
+    daemon.step(T0 + DEBOUNCE + 1)       # queued and dispatched
+    daemon.step(T0 + DEBOUNCE + 2)       # collected
+    assert processed == ["ch01.pdf"]
+    assert (folders["out"] / "ch01.pdf").read_bytes() == data
+    assert os.listdir(folders["inbox"] / "processed") == ["ch01.pdf"]
+    assert daemon.idle() and daemon.stats == {"done": 1, "failed": 0}
+
+
+def test_file_still_growing_restarts_debounce(daemon, folders, processed):
+    drop(folders["inbox"], "ch01.pdf", size=100)
+    daemon.step(T0)
+    drop(folders["inbox"], "ch01.pdf", size=200)     # the copy is still running
+    daemon.step(T0 + DEBOUNCE - 1)
+
+    daemon.step(T0 + DEBOUNCE + 1)                   # only DEBOUNCE - 2 s since the last change
+    assert processed == []
+
+    daemon.step(T0 + 2 * DEBOUNCE)
+    daemon.step(T0 + 2 * DEBOUNCE + 1)
+    assert processed == ["ch01.pdf"]
+
+
+def test_partial_write_waits_for_eof(daemon, folders, processed):
+    drop(folders["inbox"], "book.pdf", complete=False)     # copy stalled mid-file
+    daemon.step(T0)
+    daemon.step(T0 + DEBOUNCE + 1)
+    daemon.step(T0 + 10 * DEBOUNCE)
+    assert processed == [] and not (folders["out"] / "book.pdf").exists()
+    assert not daemon.idle()
+
+    with open(folders["inbox"] / "book.pdf", "ab") as f:
+        f.write(b"\n%%EOF\n")
+    os.utime(folders["inbox"] / "book.pdf", (T0, T0 + 1))    # the finished copy changes mtime
+    daemon.step(T0 + 11 * DEBOUNCE)
+    daemon.step(T0 + 12 * DEBOUNCE + 1)
+    daemon.step(T0 + 12 * DEBOUNCE + 2)
+    assert processed == ["book.pdf"]
+    assert pdf_complete(str(folders["out"] / "book.pdf"))
+
+
+def test_smallest_file_runs_first(daemon, folders, processed):
+    for name, size in (("book.pdf", 30_000), ("ch02.pdf", 200), ("ch01.pdf", 3_000)):
+        drop(folders["inbox"], name, size=size)
+
+    now = T0
+    daemon.step(now)
+    for _ in range(5):
+        now += DEBOUNCE + 1
+        daemon.step(now)
+    assert processed == ["ch02.pdf", "ch01.pdf", "book.pdf"]
+    assert sorted(os.listdir(folders["out"])) == ["book.pdf", "ch01.pdf", "ch02.pdf"]
+
+
+def test_failed_file_goes_to_error_folder_with_log(daemon, folders, processed):
+    drop(folders["inbox"], "bad.pdf", body=b"FAIL")
+    (folders["inbox"] / "bad.xmp").write_bytes(b"<x:xmpmeta/>")
+
+    for now in (T0, T0 + DEBOUNCE + 1, T0 + DEBOUNCE + 2):
+        daemon.step(now)
+
+    error = folders["inbox"] / "error"
+    assert sorted(os.listdir(error)) == ["bad.pdf", "bad.pdf.log", "bad.xmp"]
+    assert "tool failed" in (error / "bad.pdf.log").read_text(encoding="utf-8")
+    assert os.listdir(folders["out"]) == []
+    assert daemon.stats == {"done": 0, "failed": 1}
+
+
+def test_ready_queue_orders_by_size():
+    ready = ReadyQueue(max_wait=60)
+    for size, name in ((300, "book"), (10, "cop"), (50, "ch01"), (10, "ack")):
+        ready.push(size, name, now=T0)
+
+    assert [ready.pop(now=T0 + 1) for _ in range(4)] == ["cop", "ack", "ch01", "book"]
+    assert len(ready) == 0
+
+
+def test_ready_queue_max_wait_bounds_starvation():
+    ready = ReadyQueue(max_wait=60)
+    ready.push(300_000_000, "book", now=T0)
+    ready.push(1_000, "ch01", now=T0 + 30)
+
+    # small files keep arriving; the book is overtaken only until it has waited max_wait
+    assert ready.pop(now=T0 + 50) == "ch01"
+    ready.push(2_000, "ch02", now=T0 + 55)
+    assert ready.pop(now=T0 + 59) == "ch02"
+    ready.push(3_000, "ch03", now=T0 + 60)
+    ready.push(4_000, "ch04", now=T0 + 61)
+    assert ready.pop(now=T0 + 61) == "book"
+    assert [ready.pop(now=T0 + 62), ready.pop(now=T0 + 62)] == ["ch03", "ch04"]
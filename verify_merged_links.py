@@ -0,0 +1,203 @@
+"""
+Post-merge link verification.
+
+Builds the page-reference index (object number -> page index) and the named
+destination index (/Root /Dests plus the /Names /Dests name tree) once, then
+streams every /Annots array of the merged document and classifies each link:
+
+    ok        GoTo action or /Dest that lands on a page of this document
+    dangling  GoTo/Dest whose page or named destination does not exist
+    remote    GoToR still pointing at an external file
+    other     URI, Launch, JavaScript, ... (not checked)
+
+Each link is looked up in the indexes in O(1), so a book is checked in a single
+linear pass. The JSON report lists the dangling and remote links (all links
+with --all); the exit status is 1 when a dangling link is found, or a remote
+link unless --allow-remote is given, so the script can gate a release.
+
+Usage: python verify_merged_links.py merged.pdf [report.json] [--all] [--allow-remote]
+"""
+
+import contextlib
+import json
+import os
+import sys
+import time
+
+# keep stdout clean for the JSON report (the merge module announces its PDF library)
+with contextlib.redirect_stdout(sys.stderr):
+    from working_internal_external import (
+        PdfReader, _decode_pdf_string, _extract_filespec_filename, generic,
+    )
+
+STATUSES = ("ok", "dangling", "remote", "other")
+
+
+def _resolve(obj):
+    return obj.get_object() if isinstance(obj, generic.IndirectObject) else obj
+
+
+def _page_index(reader):
+    """{page object number: page index} for the document's page tree."""
+    index = {}
+    for i, page in enumerate(reader.pages):
+        ref = page.indirect_reference
+        if ref is not None:
+            index[ref.idnum] = i
+    return index
+
+
+def _named_dest_index(reader):
+    """{name: raw destination} from the catalog /Dests dict and the /Names /Dests tree."""
+    names = {}
+    root = reader.trailer["/Root"].get_object()
+
+    old_style = _resolve(root.get("/Dests"))
+    if isinstance(old_style, dict):
+        for key, value in old_style.items():
+            names[str(key)[1:]] = value
+
+    name_dict = _resolve(root.get("/Names"))
+    tree = _resolve(name_dict.get("/Dests")) if isinstance(name_dict, dict) else None
+    stack = [tree] if isinstance(tree, dict) else []
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        for kid in _resolve(node.get("/Kids")) or []:
+            kid = _resolve(kid)
+            if isinstance(kid, dict):
+                stack.append(kid)
+        pairs = _resolve(node.get("/Names")) or []
+        for i in range(0, len(pairs) - 1, 2):
+            names[_decode_pdf_string(_resolve(pairs[i]))] = pairs[i + 1]
+    return names
+
+
+class LinkVerifier:
+    """Classifies the links of one opened document against its indexes."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.num_pages = len(reader.pages)
+        self.page_index = _page_index(reader)
+        self.named_dests = _named_dest_index(reader)
+
+    def _explicit_target(self, dest):
+        """Page index an explicit destination array lands on, or None."""
+        dest = _resolve(dest)
+        if isinstance(dest, dict):          # named dest value may be {/D [...]}
+            dest = _resolve(dest.get("/D"))
+        if not isinstance(dest, list) or not dest:
+            return None
+        first = dest[0]
+        if isinstance(first, generic.IndirectObject):
+            return self.page_index.get(first.idnum)
+        if isinstance(first, int) and 0 <= first < self.num_pages:
+            return int(first)
+        return None
+
+    def check_dest(self, dest):
+        """(status, target page index or None, name or None) for a local destination."""
+        dest = _resolve(dest)
+        if isinstance(dest, (generic.NameObject, generic.TextStringObject,
+                             generic.ByteStringObject, str, bytes)):
+            name = _decode_pdf_string(dest)
+            if isinstance(dest, generic.NameObject):
+                name = name[1:]
+            if name not in self.named_dests:
+                return "dangling", None, name
+            page = self._explicit_target(self.named_dests[name])
+            return ("ok" if page is not None else "dangling"), page, name
+        page = self._explicit_target(dest)
+        return ("ok" if page is not None else "dangling"), page, None
+
+    def check_annotation(self, annot):
+        """Report row for a /Link annotation."""
+        row = {"kind": None, "status": "other", "target_page": None, "target_name": None, "target_file": None}
+        action = _resolve(annot.get("/A"))
+        if "/Dest" in annot:
+            row["kind"] = "Dest"
+            dest = annot["/Dest"]
+        elif isinstance(action, dict):
+            row["kind"] = str(action.get("/S", ""))[1:] or None
+            if row["kind"] == "GoToR":
+                row["status"] = "remote"
+                row["target_file"] = _extract_filespec_filename(action.get("/F"))
+                d = _resolve(action.get("/D"))
+                if isinstance(d, list) and d and isinstance(d[0], int):
+                    row["target_page"] = int(d[0]) + 1
+                elif d is not None and not isinstance(d, list):
+                    row["target_name"] = _decode_pdf_string(d)
+                return row
+            if row["kind"] != "GoTo":
+                return row
+            dest = action.get("/D")
+        else:
+            return row
+        status, page, name = self.check_dest(dest)
+        row["status"] = status
+        row["target_page"] = page + 1 if page is not None else None
+        row["target_name"] = name
+        return row
+
+    def links(self):
+        """Yield (page number, annotation number, row) for every link, 1-based pages."""
+        for p_idx, page in enumerate(self.reader.pages):
+            annots = _resolve(page.get("/Annots"))
+            if not annots:
+                continue
+            for a_idx, annot in enumerate(annots):
+                annot = _resolve(annot)
+                if not isinstance(annot, dict) or annot.get("/Subtype") != "/Link":
+                    continue
+                yield p_idx + 1, a_idx, self.check_annotation(annot)
+
+
+def verify_merged_links(pdf_path, include_all=False):
+    """Verify every link of a PDF; returns the report dict."""
+    t0 = time.perf_counter()
+    verifier = LinkVerifier(PdfReader(pdf_path))
+    summary = dict.fromkeys(STATUSES, 0)
+    listed = []
+    for page, annot_no, row in verifier.links():
+        summary[row["status"]] += 1
+        if include_all or row["status"] in ("dangling", "remote"):
+            listed.append({"page": page, "annot": annot_no, **row})
+    return {
+        "file": os.path.abspath(pdf_path),
+        "pages": verifier.num_pages,
+        "named_destinations": len(verifier.named_dests),
+        "links": sum(summary.values()),
+        "summary": summary,
+        "seconds": round(time.perf_counter() - t0, 3),
+        "links_listed": listed,
+    }
+
+
+def main(argv):
+    flags = {a for a in argv[1:] if a.startswith("--")}
+    args = [a for a in argv[1:] if not a.startswith("--")]
+    if not args:
+        print(__doc__)
+        return 2
+    report = verify_merged_links(args[0], include_all="--all" in flags)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if len(args) > 1:
+        with open(args[1], "w", encoding="utf-8") as f:
+            f.write(text)
+        s = report["summary"]
+        print(f"{report['links']} links on {report['pages']} pages in {report['seconds']}s: "
+              f"{s['ok']} ok, {s['dangling']} dangling, {s['remote']} remote, {s['other']} other")
+    else:
+        print(text)
+    summary = report["summary"]
+    if summary["dangling"] or (summary["remote"] and "--allow-remote" not in flags):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,453 @@
+"""
+Watch-folder daemon: process chapter PDFs as they are dropped into folders.
+
+Production staff copy PDFs into an inbox folder; the daemon notices them,
+waits until the copy has finished, and runs the folder's tool chain on a
+pool of warm worker processes (each creates its PDFix instance and imports
+the tools once). Results go to the output folder; inputs that fail are moved
+to the error folder with a .log file next to them. Successful inputs are
+moved to the archive folder.
+
+    python watch_daemon.py watch_config.json
+
+    {
+      "workers": 2,
+      "debounce_seconds": 5,
+      "watches": [
+        {"input": "\\\\\\\\integrafs3\\\\...\\\\inbox",
+         "output": "\\\\\\\\integrafs3\\\\...\\\\done",
+         "chain": ["transform", "bookmarks", "links", "labels", "xmp"],
+         "bookmark_filters": [".pdf", "outline placeholder"],
+         "roman_pages": 10}
+      ]
+    }
+
+Per watch, "error" and "archive" default to <input>/error and
+<input>/processed. "stage" (null/true/false) is passed to staging.Staging;
+true lets a local directory stand in for the share. The xmp step merges a
+sidecar <name>.xmp from the inbox and is skipped when there is none.
+
+Detection uses watchdog (inotify / ReadDirectoryChangesW) when it is
+installed, plus a periodic rescan, which is also the only mechanism without
+watchdog or with "poll": true: SMB shares do not always deliver change
+events for files written by other machines. A file is ready once its size
+and mtime have not changed for debounce_seconds and it ends with %%EOF.
+Ready files wait in a queue ordered by size, smallest first, so a short
+chapter is not stuck behind a 300 MB book; a file that has waited
+max_wait_seconds goes next regardless of size.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+for _sub in ("", "Bookmark_cleaning", "task", os.path.join("task", "final"), os.path.join("exe", "xmp")):
+    _path = os.path.join(HERE, _sub)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from staging import Staging
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    USE_WATCHDOG = True
+except Exception:
+    USE_WATCHDOG = False
+
+DEFAULT_WORKERS = 2
+DEBOUNCE_SECONDS = 5.0
+RESCAN_SECONDS = 30.0            # with watchdog; without it every tick rescans
+TICK_SECONDS = 1.0
+MAX_WAIT_SECONDS = 15 * 60       # past this, a big file is no longer overtaken by small ones
+EOF_TAIL = 1024                  # %%EOF must be within the last KB of a complete PDF
+MAX_ATTEMPTS = 2                 # runs per file when a worker process dies under it
+DEFAULT_CHAIN = ["transform", "bookmarks", "links", "labels", "xmp"]
+
+
+def log(message):
+    print(time.strftime("%Y-%m-%d %H:%M:%S"), message, flush=True)
+
+
+# --- tool chain (runs in the worker processes) -------------------------------
+def step_transform(pdfix, src, dst, watch, work_dir):
+    from cls_PdfTagTransformerPhase1 import (
+        PdfTagTransformerPhase1, Reference, Table, footprint, Table_delete,
+        PdfAltTextSetter, Figure_inlineequation, formula_inside_figure_delete,
+    )
+    phases = [PdfTagTransformerPhase1, Reference, Table, footprint, Table_delete,
+              PdfAltTextSetter, Figure_inlineequation, formula_inside_figure_delete]
+    current = src
+    for n, phase_cls in enumerate(phases, start=1):
+        out = dst if n == len(phases) else os.path.join(work_dir, f"transform_{n}.pdf")
+        phase = phase_cls(pdfix)
+        if phase_cls is PdfAltTextSetter:
+            phase.modify_pdf(current, out)
+        else:
+            phase.modify_pdf_tags(current, out)
+        current = out
+
+
+def step_bookmarks(pdfix, src, dst, watch, work_dir):
+    from code2 import remove_filtered_bookmarks
+    remove_filtered_bookmarks(src, dst, watch.get("bookmark_filters", [".pdf", "outline placeholder"]), pdfix=pdfix)
+
+
+def step_links(pdfix, src, dst, watch, work_dir):
+    from pdfix_save import save_doc
+    from tag_bookmark_merge import open_doc, process_links
+    doc = open_doc(pdfix, src)
+    try:
+        process_links(pdfix, doc)
+        if not save_doc(pdfix, doc, dst):
+            raise RuntimeError("Save failed: " + pdfix.GetError())
+    finally:
+        doc.Close()
+
+
+def step_labels(pdfix, src, dst, watch, work_dir):
+    from Roman_integer_pagenumberpart import PageNumberSetter
+    PageNumberSetter(pdfix).set_page_labels(src, dst, roman_pages_count=watch.get("roman_pages"))
+
+
+def step_xmp(pdfix, src, dst, watch, work_dir):
+    sidecar = watch.get("_sidecar")
+    if not sidecar:
+        shutil.copy(src, dst)
+        return
+    from xmp_Final import smart_merge_into_pdf
+    smart_merge_into_pdf(src, sidecar, dst)
+
+
+STEPS = {
+    "transform": step_transform,
+    "bookmarks": step_bookmarks,
+    "links": step_links,
+    "labels": step_labels,
+    "xmp": step_xmp,
+}
+
+# modules a chain step imports, loaded once per worker so the first job is not slower
+STEP_MODULES = {
+    "transform": "cls_PdfTagTransformerPhase1",
+    "bookmarks": "code2",
+    "links": "tag_bookmark_merge",
+    "labels": "Roman_integer_pagenumberpart",
+    "xmp": "xmp_Final",
+}
+
+
+def _init_worker(steps):
+    import importlib
+    from bookmark_jobs import init_worker
+    init_worker()
+    for step in steps:
+        importlib.import_module(STEP_MODULES[step])
+
+
+def run_chain(input_pdf, output_pdf, watch, pdfix=None):
+    """
+    Worker task: stage the input (and its .xmp sidecar), run every step of
+    watch["chain"] on local files, publish the result to output_pdf.
+    Returns the seconds spent.
+    """
+    start = time.time()
+    with Staging(stage=watch.get("stage"), verbose=False) as staging:
+        src = staging.fetch(input_pdf)
+        sidecar = os.path.splitext(input_pdf)[0] + ".xmp"
+        step_watch = dict(watch, _sidecar=staging.fetch(sidecar) if os.path.exists(sidecar) else None)
+        local_output = staging.output(output_pdf)
+        with tempfile.TemporaryDirectory(prefix="watch_") as work_dir:
+            current = src
+            chain = watch.get("chain", DEFAULT_CHAIN)
+            for n, step in enumerate(chain, start=1):
+                out = os.path.join(work_dir, f"{n:02d}_{step}.pdf")
+                STEPS[step](pdfix, current, out, step_watch, work_dir)
+                current = out
+            shutil.copy(current, local_output)
+    return time.time() - start
+
+
+# --- daemon (main process) ---------------------------------------------------
+def pdf_complete(path):
+    """True if the file ends with %%EOF (a PDF still being copied does not)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - EOF_TAIL))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+
+class ReadyQueue:
+    """Ready files, smallest first; anything older than max_wait goes first."""
+
+    def __init__(self, max_wait=MAX_WAIT_SECONDS):
+        self.max_wait = max_wait
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, size, item, now=None):
+        now = time.time() if now is None else now
+        heapq.heappush(self._heap, (size, next(self._seq), now, item))
+
+    def pop(self, now=None):
+        now = time.time() if now is None else now
+        oldest = min(range(len(self._heap)), key=lambda i: self._heap[i][1])
+        if now - self._heap[oldest][2] > self.max_wait:
+            entry = self._heap[oldest]
+            self._heap[oldest] = self._heap[-1]
+            self._heap.pop()
+            heapq.heapify(self._heap)
+        else:
+            entry = heapq.heappop(self._heap)
+        return entry[3]
+
+
+if USE_WATCHDOG:
+    class _Handler(FileSystemEventHandler):
+        def __init__(self, daemon):
+            self.daemon = daemon
+
+        def on_any_event(self, event):
+            if not event.is_directory:
+                for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+                    if path:
+                        self.daemon.notice(path)
+
+
+class WatchDaemon:
+    def __init__(self, config):
+        self.workers = config.get("workers", DEFAULT_WORKERS)
+        self.debounce = config.get("debounce_seconds", DEBOUNCE_SECONDS)
+        self.poll = config.get("poll", False) or not USE_WATCHDOG
+        self.watches = []
+        for watch in config["watches"]:
+            watch = dict(watch)
+            watch.setdefault("chain", DEFAULT_CHAIN)
+            watch.setdefault("error", os.path.join(watch["input"], "error"))
+            watch.setdefault("archive", os.path.join(watch["input"], "processed"))
+            unknown = [s for s in watch["chain"] if s not in STEPS]
+            if unknown:
+                raise ValueError(f"unknown tool chain step(s) {unknown} for {watch['input']}")
+            for key in ("output", "error", "archive"):
+                os.makedirs(watch[key], exist_ok=True)
+            self.watches.append(watch)
+        self.ready = ReadyQueue(config.get("max_wait_seconds", MAX_WAIT_SECONDS))
+        self.stats = {"done": 0, "failed": 0}
+        self._candidates = {}        # path -> [size, mtime, stable since]
+        self._busy = set()           # queued or running
+        self._running = {}           # future -> ((path, watch, size), pool it runs on)
+        self._attempts = {}          # path -> runs started
+        self._finished = queue.Queue()
+        self._noticed = queue.Queue()
+        self._stop = threading.Event()
+        self._pool = None
+        self._observer = None
+        self._last_scan = 0.0
+
+    def _watch_for(self, path):
+        folder = os.path.normcase(os.path.dirname(os.path.abspath(path)))
+        for watch in self.watches:
+            if os.path.normcase(os.path.abspath(watch["input"])) == folder:
+                return watch
+        return None
+
+    def notice(self, path):
+        """Called from the watchdog thread: `path` may have changed."""
+        self._noticed.put(path)
+
+    def _consider(self, path, now):
+        if not path.lower().endswith(".pdf") or path in self._busy or self._watch_for(path) is None:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._candidates.pop(path, None)
+            return
+        entry = self._candidates.get(path)
+        if entry is None or entry[:2] != [st.st_size, st.st_mtime]:
+            self._candidates[path] = [st.st_size, st.st_mtime, now]
+
+    def _scan(self, now):
+        for watch in self.watches:
+            try:
+                names = os.listdir(watch["input"])
+            except OSError as e:
+                log(f"Cannot list {watch['input']}: {e}")
+                continue
+            for name in names:
+                self._consider(os.path.join(watch["input"], name), now)
+
+    def _promote(self, now):
+        """Move candidates whose size/mtime held still for `debounce` seconds to the queue."""
+        for path, (size, mtime, since) in list(self._candidates.items()):
+            self._consider(path, now)
+            entry = self._candidates.get(path)
+            if entry is None or entry[2] != since or now - since < self.debounce:
+                continue
+            if not pdf_complete(path):
+                continue
+            del self._candidates[path]
+            self._busy.add(path)
+            self.ready.push(size, (path, self._watch_for(path), size), now)
+            log(f"Queued {os.path.basename(path)} ({size / 1e6:.1f} MB), {len(self.ready)} waiting")
+
+    def _new_pool(self):
+        steps = sorted({step for watch in self.watches for step in watch["chain"]})
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(steps,))
+
+    def _restart_pool(self):
+        # a worker died (PDFix crash, failed init): every job on the pool fails with it
+        log("Worker pool broken, starting a new one")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+
+    def _dispatch(self, now=None):
+        while self.ready and len(self._running) < self.workers:
+            item = self.ready.pop(now)
+            path, watch, size = item
+            output_pdf = os.path.join(watch["output"], os.path.basename(path))
+            try:
+                future = self._pool.submit(_call_with_pdfix, run_chain, path, output_pdf, watch)
+            except BrokenProcessPool:
+                self._restart_pool()
+                future = self._pool.submit(_call_with_pdfix, run_chain, path, output_pdf, watch)
+            self._attempts[path] = self._attempts.get(path, 0) + 1
+            self._running[future] = (item, self._pool)
+            future.add_done_callback(self._finished.put)
+            log(f"Started {os.path.basename(path)} ({len(self._running)}/{self.workers} workers busy)")
+
+    def _collect(self, now=None):
+        while True:
+            try:
+                future = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            (path, watch, size), pool = self._running.pop(future)
+            name = os.path.basename(path)
+            try:
+                seconds = future.result()
+            except BrokenProcessPool as e:
+                if pool is self._pool and not self._stop.is_set():
+                    self._restart_pool()
+                if self._attempts[path] < MAX_ATTEMPTS and not self._stop.is_set():
+                    log(f"Worker died while running {name}, queueing it again")
+                    self.ready.push(size, (path, watch, size), now)
+                    continue
+                self._fail(path, watch, e)
+            except Exception as e:
+                self._fail(path, watch, e)
+            else:
+                self.stats["done"] += 1
+                log(f"Done {name} in {seconds:.1f}s -> {watch['output']}")
+                self._move(path, watch["archive"])
+            self._attempts.pop(path, None)
+            self._busy.discard(path)
+
+    def _fail(self, path, watch, e):
+        name = os.path.basename(path)
+        self.stats["failed"] += 1
+        log(f"Failed {name}: {e}")
+        self._move(path, watch["error"])
+        with open(os.path.join(watch["error"], name + ".log"), "w", encoding="utf-8") as f:
+            f.write("".join(traceback.format_exception(type(e), e, e.__traceback__)))
+
+    def _move(self, path, folder):
+        for src in (path, os.path.splitext(path)[0] + ".xmp"):
+            if os.path.exists(src):
+                try:
+                    os.replace(src, os.path.join(folder, os.path.basename(src)))
+                except OSError as e:
+                    log(f"Could not move {src} to {folder}: {e}")
+
+    def start(self):
+        self._pool = self._new_pool()
+        if not self.poll:
+            self._observer = Observer()
+            handler = _Handler(self)
+            for watch in self.watches:
+                self._observer.schedule(handler, watch["input"], recursive=False)
+            self._observer.start()
+        log(f"Watching {len(self.watches)} folder(s) with {self.workers} worker(s), "
+            f"{'polling' if self.poll else 'watchdog + rescan'}, debounce {self.debounce:g}s")
+
+    def step(self, now=None):
+        """One tick of the main loop (also handy to drive the daemon from a test)."""
+        now = time.time() if now is None else now
+        while True:
+            try:
+                self._consider(self._noticed.get_nowait(), now)
+            except queue.Empty:
+                break
+        if self.poll or now - self._last_scan >= RESCAN_SECONDS:
+            self._scan(now)
+            self._last_scan = now
+        self._promote(now)
+        self._collect(now)
+        self._dispatch(now)
+
+    def idle(self):
+        return not (self._candidates or self.ready or self._running)
+
+    def run(self, until_idle=False):
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self.step()
+                if until_idle and self.idle():
+                    break
+                self._stop.wait(TICK_SECONDS)
+        except KeyboardInterrupt:
+            log("Stopping: waiting for running jobs")
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self._stop.set()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._collect()
+        log(f"Processed {self.stats['done']}, failed {self.stats['failed']}")
+
+
+def _call_with_pdfix(fn, *args):
+    from bookmark_jobs import call_with_pdfix
+    return call_with_pdfix(fn, *args)
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: python watch_daemon.py watch_config.json [--once]")
+        return 1
+    with open(argv[1], encoding="utf-8") as f:
+        config = json.load(f)
+    # --once: process what is in the inboxes now, then exit (cron / testing)
+    WatchDaemon(config).run(until_idle="--once" in argv[2:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -5,10 +5,16 @@ Merged version of your merge routine that combines robust internal remapping
 with the simpler, reliable external /F extraction + matching logic.
 """
 
+import bisect
+import io
 import os
 import time
 import traceback
 
+from link_inventory import LinkInventory
+from link_remap import LinkRemapper, MergeBackend, export_csv_report
+from outline_merge import DEFAULT_OUTLINE_FILTERS, build_book_outline
+
 # Prefer pypdf, fall back to PyPDF2.
 try:
     from pypdf import PdfReader, PdfWriter
@@ -143,455 +149,990 @@ def _resolve_named_dest_to_page(reader, name):
     return None
 
 
-def merge_pdfs_preserve_links(pdf_files, output_path, sleep_between_files=0.0, sleep_between_pages=0.0):
+# Keys whose value is an embedded font program / font side stream.
+_FONT_STREAM_KEYS = ("/FontFile", "/FontFile2", "/FontFile3", "/ToUnicode", "/CIDSet", "/CIDToGIDMap")
+
+
+def _classify_shared_resource(obj, ref_key=None, in_iccbased=False):
     """
-    Merge PDFs and preserve/repair internal and external hyperlinks.
-    Uses robust extraction & matching for external GoToR links (based on filename).
+    Return the dedup kind ("font", "image", "icc", "form", "metadata") of a writer
+    object, or None if it is not a shared resource we deduplicate.
+    XMP /Metadata streams are included because InDesign attaches one to every
+    placed image; without them identical images never hash the same.
     """
-    writer = PdfWriter()
-    readers = []
-    total_pages = 0
+    try:
+        if ref_key == "/Metadata":
+            return "metadata" if isinstance(obj, generic.StreamObject) else None
+        if in_iccbased or ref_key == "/DestOutputProfile":
+            return "icc" if isinstance(obj, generic.StreamObject) else None
+        if ref_key in _FONT_STREAM_KEYS:
+            return "font" if isinstance(obj, generic.StreamObject) else None
+        if isinstance(obj, generic.StreamObject):
+            subtype = obj.get("/Subtype")
+            if subtype == "/Image":
+                return "image"
+            if subtype == "/Form":
+                return "form"
+            return None
+        if isinstance(obj, generic.DictionaryObject) and obj.get("/Type") in ("/Font", "/FontDescriptor"):
+            return "font"
+    except Exception:
+        pass
+    return None
+
+
+def dedupe_shared_resources(writer):
+    """
+    Content-hash deduplication of fonts, images, ICC profiles and form XObjects.
+
+    Chapters exported from one book embed identical copies of the same resources;
+    after the merge each copy is a separate object in the writer. Identical objects
+    (same stream bytes and same dictionary, with nested references already
+    deduplicated) are collapsed onto the first copy, every reference is rewritten,
+    and the duplicates are dropped from the output.
+
+    Returns a dict: {"counts": {kind: n_removed}, "bytes_saved": int}.
+    """
+    import hashlib
+
+    objects = writer._objects
+    kinds = {}  # idnum -> kind
+
+    def _is_local_ref(value):
+        return isinstance(value, generic.IndirectObject) and getattr(value, "pdf", writer) is writer
+
+    # --- Pass 1: find candidate objects and remember what they are ---
+    def _scan(container):
+        stack = [container]
+        while stack:
+            cur = stack.pop()
+            if isinstance(cur, generic.DictionaryObject):
+                items = [(k, cur.raw_get(k)) for k in list(cur.keys())]
+                in_icc = False
+            elif isinstance(cur, generic.ArrayObject):
+                items = [(None, v) for v in cur]
+                in_icc = len(cur) == 2 and cur[0] == "/ICCBased"
+            else:
+                continue
+            for key, value in items:
+                if _is_local_ref(value):
+                    if value.idnum in kinds:
+                        continue
+                    try:
+                        target = value.get_object()
+                    except Exception:
+                        continue
+                    kind = _classify_shared_resource(target, key, in_icc)
+                    if kind:
+                        kinds[value.idnum] = kind
+                elif isinstance(value, (generic.DictionaryObject, generic.ArrayObject)):
+                    stack.append(value)
+
+    for obj in objects:
+        if obj is not None:
+            _scan(obj)
+
+    if not kinds:
+        return {"counts": {}, "bytes_saved": 0}
+
+    # --- Pass 2: hash candidates bottom-up, first copy wins ---
+    canonical = {}   # idnum -> canonical idnum
+    keys = {}        # idnum -> content key
+    first_by_key = {}
+    in_progress = set()
+
+    def _key_of(value):
+        if _is_local_ref(value):
+            if value.idnum in kinds:
+                return ("R", _canonical_of(value.idnum))
+            return ("R", value.idnum)
+        if isinstance(value, generic.DictionaryObject):
+            return ("D", tuple(sorted(
+                (str(k), _key_of(value.raw_get(k))) for k in value.keys() if k != "/Length"
+            )))
+        if isinstance(value, generic.ArrayObject):
+            return ("A", tuple(_key_of(v) for v in value))
+        return (type(value).__name__, repr(value))
+
+    def _canonical_of(idnum):
+        if idnum in canonical:
+            return canonical[idnum]
+        if idnum in in_progress:
+            # reference cycle: never merge, compare by identity
+            return idnum
+        in_progress.add(idnum)
+        try:
+            obj = objects[idnum - 1]
+            if obj is None:
+                return idnum
+            key = _key_of(obj)
+            if isinstance(obj, generic.StreamObject):
+                key = (key, hashlib.sha256(obj._data or b"").hexdigest())
+            key = (kinds[idnum], key)
+            keys[idnum] = key
+            canon = first_by_key.setdefault(key, idnum)
+            canonical[idnum] = canon
+            return canon
+        finally:
+            in_progress.discard(idnum)
+
+    for idnum in sorted(kinds):
+        _canonical_of(idnum)
+
+    duplicates = {i: c for i, c in canonical.items() if i != c}
+    if not duplicates:
+        return {"counts": {}, "bytes_saved": 0}
+
+    # --- Pass 3: rewrite every reference to a duplicate ---
+    def _rewrite(container):
+        stack = [container]
+        while stack:
+            cur = stack.pop()
+            if isinstance(cur, generic.DictionaryObject):
+                for k in list(cur.keys()):
+                    v = cur.raw_get(k)
+                    if _is_local_ref(v) and v.idnum in duplicates:
+                        cur[k] = generic.IndirectObject(duplicates[v.idnum], 0, writer)
+                    elif isinstance(v, (generic.DictionaryObject, generic.ArrayObject)):
+                        stack.append(v)
+            elif isinstance(cur, generic.ArrayObject):
+                for i, v in enumerate(cur):
+                    if _is_local_ref(v) and v.idnum in duplicates:
+                        cur[i] = generic.IndirectObject(duplicates[v.idnum], 0, writer)
+                    elif isinstance(v, (generic.DictionaryObject, generic.ArrayObject)):
+                        stack.append(v)
+
+    for idnum, obj in enumerate(objects, start=1):
+        if obj is not None and idnum not in duplicates:
+            _rewrite(obj)
 
-    # Open input PDFs and build readers list (keep file handles open)
-    print("=== Opening input PDFs ===")
-    for path in pdf_files:
-        abs_path = os.path.abspath(path)
-        if not os.path.isfile(abs_path):
-            raise FileNotFoundError(f"Input file not found: {abs_path}")
-        f = open(abs_path, "rb")
+    # --- Pass 4: drop the duplicates and tally the savings ---
+    counts = {}
+    bytes_saved = 0
+    for idnum in duplicates:
+        obj = objects[idnum - 1]
+        if isinstance(obj, generic.StreamObject):
+            bytes_saved += len(obj._data or b"")
+        counts[kinds[idnum]] = counts.get(kinds[idnum], 0) + 1
+        objects[idnum - 1] = None
+
+    return {"counts": counts, "bytes_saved": bytes_saved}
+
+
+def _resolved(obj):
+    return obj.get_object() if isinstance(obj, generic.IndirectObject) else obj
+
+
+def _canonical_key(obj, depth=0):
+    """Hashable form of a small PDF object, references resolved, dictionary order ignored."""
+    obj = _resolved(obj)
+    if depth > 16 or isinstance(obj, generic.StreamObject):
+        raise ValueError("not a small direct object")
+    if isinstance(obj, dict):
+        return ("dict",) + tuple(sorted((str(k), _canonical_key(v, depth + 1)) for k, v in obj.items()))
+    if isinstance(obj, list):
+        return ("array",) + tuple(_canonical_key(v, depth + 1) for v in obj)
+    return (type(obj).__name__, str(obj))
+
+
+# Struct element entry that refers to each merged map.
+_RENAMED_ENTRY = {"/RoleMap": "/S", "/ClassMap": "/C", "/IDTree": "/ID"}
+
+
+def _rename_struct_entries(top, renames):
+    """
+    Apply {"/S" | "/C" | "/ID": {old: new}} to every struct element below `top`
+    (one chapter of a merged structure tree).
+    """
+    stack = [top]
+    seen = set()
+    while stack:
+        ref = stack.pop()
+        elem = _resolved(ref)
+        if not isinstance(elem, dict) or id(elem) in seen:
+            continue
+        seen.add(id(elem))
+        for entry, table in renames.items():
+            if entry not in elem:
+                continue
+            value = elem[entry]
+            if entry == "/ID":
+                new = table.get(str(value))
+                if new is not None:
+                    elem[generic.NameObject(entry)] = generic.TextStringObject(new)
+            elif isinstance(value, list):
+                # /C may be an array of class names with revision numbers
+                elem[generic.NameObject(entry)] = generic.ArrayObject(
+                    generic.NameObject(table[v]) if isinstance(v, str) and v in table else v
+                    for v in value)
+            elif str(value) in table:
+                elem[generic.NameObject(entry)] = generic.NameObject(table[str(value)])
+        kids = elem.get("/K")
+        if isinstance(kids, list):
+            stack.extend(kids)
+        elif kids is not None:
+            stack.append(elem.raw_get("/K"))
+
+
+def _write_compact(writer, output_path, compact=True, linearize=False):
+    """
+    Write `writer` with object streams + xref stream and report the size/time
+    difference against the classic xref output pypdf produces on its own.
+    linearize: also write it linearized; pypdf cannot linearize, so this is
+    the same pikepdf pass (compact=False keeps the classic object layout).
+    """
+    from pdf_output import compact_pdf, linearize_pdf
+
+    t0 = time.perf_counter()
+    buf = io.BytesIO()
+    writer.write(buf)
+    classic_seconds = time.perf_counter() - t0
+    print(f"Classic xref output: {buf.tell():,} bytes in {classic_seconds:.2f}s")
+
+    if linearize:
+        stats = linearize_pdf(buf, output_path, compact=compact)
+    else:
+        stats = compact_pdf(buf, output_path)
+    stats["classic_seconds"] = classic_seconds
+    return stats
+
+
+class PypdfMergeBackend(MergeBackend):
+    """MergeBackend on top of pypdf (or PyPDF2)."""
+
+    name = LIB
+
+    def __init__(self):
+        self.writer = PdfWriter()
+        self.inputs = []               # [{"fileobj", "reader"}] in merge order
+        self._start_pages = []
+        self._reader_index = {}        # id(reader) -> r_idx
+        self._src_page_index = {}      # (r_idx, idnum) -> page_index
+        self._writer_page_index = {}   # writer idnum -> merged_index
+        self._writer_to_source = None  # writer idnum -> (r_idx, source idnum), built lazily
+        self._named = {}               # r_idx -> {name: page_index}
+        self._replaced_actions = {}    # idnum -> ref of /A objects replaced by a shared one
+
+    def open_input(self, path):
+        f = open(path, "rb")
         reader = PdfReader(f)
-        filename = os.path.basename(abs_path)
-        num_pages = len(reader.pages)
-        rinfo = {
-            "fileobj": f,
-            "reader": reader,
-            "filename": filename,
-            "path": abs_path,
-            "start_page": total_pages,
-            "num_pages": num_pages
-        }
-        readers.append(rinfo)
-        total_pages += num_pages
-        print(f"  {filename}: {num_pages} pages (path: {abs_path})")
-
-    print(f"Total pages expected: {total_pages}")
-
-    # Copy pages into writer and build maps
-    print("\n=== Copying pages into writer ===")
-    src_page_id_map = {}       # id(source_page_obj) -> (reader_index, page_index)
-    merged_page_to_source = {} # merged_index -> (reader_index, page_index)
-
-    for r_idx, rinfo in enumerate(readers):
-        reader = rinfo["reader"]
+        self._reader_index[id(reader)] = len(self.inputs)
+        self.inputs.append({"fileobj": f, "reader": reader})
+        return len(reader.pages)
+
+    def append_pages(self, r_idx, sleep_between_pages=0.0):
+        reader = self.inputs[r_idx]["reader"]
+        self._start_pages.append(len(self.writer.pages))
         for p_idx, page in enumerate(reader.pages):
+            indir = getattr(page, "indirect_reference", None)
+            if isinstance(indir, generic.IndirectObject):
+                self._src_page_index[(r_idx, indir.idnum)] = p_idx
+            self.writer.add_page(page)
+            m_idx = len(self.writer.pages) - 1
+            self._writer_page_index[self.writer.pages[m_idx].indirect_reference.idnum] = m_idx
+            if sleep_between_pages:
+                time.sleep(sleep_between_pages)
+        self._writer_to_source = None
+
+    def page_count(self):
+        return len(self.writer.pages)
+
+    def save(self, output_path, compact=False, linearize=False):
+        if compact or linearize:
+            _write_compact(self.writer, output_path, compact=compact, linearize=linearize)
+        else:
+            with open(output_path, "wb") as out_f:
+                self.writer.write(out_f)
+
+    def close(self):
+        for r in self.inputs:
             try:
-                src_page_id_map[id(page)] = (r_idx, p_idx)
+                r["fileobj"].close()
             except Exception:
                 pass
 
-            writer.add_page(page)
-            m_idx = len(writer.pages) - 1
-            merged_page_to_source[m_idx] = (r_idx, p_idx)
+    def dedupe_resources(self):
+        return dedupe_shared_resources(self.writer)
 
-            if sleep_between_pages:
-                time.sleep(sleep_between_pages)
+    # --- structure tree ------------------------------------------------------
+    def _drop(self, ref):
+        """Remove a cloned object that is no longer referenced from the output."""
+        if isinstance(ref, generic.IndirectObject) and ref.pdf is self.writer:
+            self.writer._objects[ref.idnum - 1] = None
 
-        if sleep_between_files:
-            time.sleep(sleep_between_files)
+    def _tree_entries(self, node, leaf_key, entries, seen):
+        """Flatten a number tree (/Nums) or name tree (/Names) into (key, raw value) pairs."""
+        if isinstance(node, generic.IndirectObject):
+            if node.idnum in seen:
+                return
+            seen.add(node.idnum)
+            ref, node = node, node.get_object()
+            self._drop(ref)
+        if not isinstance(node, dict):
+            return
+        for kid in node.get("/Kids", None) or []:
+            self._tree_entries(kid, leaf_key, entries, seen)
+        leaves = node.get(leaf_key, None) or []
+        for i in range(0, len(leaves) - 1, 2):
+            entries.append((leaves[i], leaves[i + 1]))
 
-        print(f"  Added {rinfo['num_pages']} pages from {rinfo['filename']} (merged pages {rinfo['start_page']}..{rinfo['start_page'] + rinfo['num_pages'] - 1})")
+    def _shift_struct_parents(self, r_idx, offset):
+        """
+        Move the ParentTree keys used by input `r_idx`'s merged pages, annotations
+        and form XObjects by `offset`; offset None removes them (untagged input).
+        """
+        reader = self.inputs[r_idx]["reader"]
+        start = self._start_pages[r_idx]
+        seen = set()
 
-    # Helper: find merged index for a source page object
-    def _find_merged_page_for_source_pageobj(page_obj):
-        try:
-            s = src_page_id_map.get(id(page_obj))
-            if s:
-                r_idx, p_idx = s
-                return readers[r_idx]["start_page"] + p_idx
-        except Exception:
-            pass
-        # fallback brute-force
-        try:
-            for r_idx, rinfo in enumerate(readers):
-                for p_idx, p in enumerate(rinfo["reader"].pages):
-                    if p == page_obj:
-                        return rinfo["start_page"] + p_idx
-        except Exception:
-            pass
-        return None
+        def _shift(d, key):
+            if key not in d:
+                return
+            if offset is None:
+                del d[key]
+            else:
+                d[generic.NameObject(key)] = generic.NumberObject(int(d[key]) + offset)
 
-    # Helper: convert dest object forms into ArrayObject referencing merged pages
-    def _remap_dest(dest_obj, annot_src_reader_index):
-        # IndirectObject page reference
-        try:
-            if isinstance(dest_obj, generic.IndirectObject):
-                try:
-                    page_obj = dest_obj.get_object()
-                except Exception:
-                    return None
-                merged = _find_merged_page_for_source_pageobj(page_obj)
-                if merged is None:
-                    return None
-                return generic.ArrayObject([writer.pages[merged].indirect_reference, generic.NameObject("/Fit")])
-        except Exception:
-            pass
+        def _walk_xobjects(resources):
+            resources = resources.get_object() if isinstance(resources, generic.IndirectObject) else resources
+            if not isinstance(resources, dict) or "/XObject" not in resources:
+                return
+            for ref in resources["/XObject"].values():
+                if not isinstance(ref, generic.IndirectObject) or ref.idnum in seen:
+                    continue
+                seen.add(ref.idnum)
+                xobj = ref.get_object()
+                _shift(xobj, "/StructParent")
+                _shift(xobj, "/StructParents")
+                if "/Resources" in xobj:
+                    _walk_xobjects(xobj.raw_get("/Resources"))
 
-        # Array-like dests: [pageObj /XYZ ...] or [num /Fit ...] or [name /Fit ...]
-        try:
-            if isinstance(dest_obj, (generic.ArrayObject, list, tuple)):
-                arr = list(dest_obj)
-                if not arr:
-                    return None
-                first = arr[0]
-                # page object
-                if isinstance(first, generic.IndirectObject):
-                    try:
-                        page_obj = first.get_object()
-                    except Exception:
-                        return None
-                    merged = _find_merged_page_for_source_pageobj(page_obj)
-                    if merged is None:
-                        return None
-                    return generic.ArrayObject([writer.pages[merged].indirect_reference] + arr[1:])
-                # numeric index relative to that document
-                if isinstance(first, (int, float, generic.NumberObject)):
-                    try:
-                        dest_index = int(first)
-                        rinfo = readers[annot_src_reader_index]
-                        merged = rinfo["start_page"] + dest_index
-                        return generic.ArrayObject([writer.pages[merged].indirect_reference] + arr[1:]) if len(arr) > 1 else generic.ArrayObject([writer.pages[merged].indirect_reference, generic.NameObject("/Fit")])
-                    except Exception:
-                        return None
-                # named dest inside array
-                if isinstance(first, (generic.NameObject, generic.TextStringObject, str, bytes)):
-                    nm = first
-                    if isinstance(nm, bytes):
-                        nm = _decode_pdf_string(nm)
-                    # try resolve named dest in all readers
-                    for rr_idx, rr in enumerate(readers):
-                        try:
-                            page_num = _resolve_named_dest_to_page(rr["reader"], nm)
-                            if page_num is not None:
-                                merged = rr["start_page"] + page_num
-                                return generic.ArrayObject([writer.pages[merged].indirect_reference] + arr[1:])
-                        except Exception:
-                            continue
-                    return None
-        except Exception:
-            pass
+        for p_idx, src_page in enumerate(reader.pages):
+            page = self.writer.pages[start + p_idx]
+            # pypdf's add_page leaves /StructParents behind; take it from the source page
+            if offset is not None and "/StructParents" in src_page:
+                page[generic.NameObject("/StructParents")] = generic.NumberObject(
+                    int(src_page["/StructParents"]) + offset)
+            for a_ref in page.get("/Annots", None) or []:
+                if isinstance(a_ref, generic.IndirectObject):
+                    if a_ref.idnum in seen:
+                        continue
+                    seen.add(a_ref.idnum)
+                _shift(a_ref.get_object(), "/StructParent")
+            if "/Resources" in page:
+                _walk_xobjects(page.raw_get("/Resources"))
 
-        # Plain numeric dest
-        try:
-            if isinstance(dest_obj, (int, float, generic.NumberObject)):
-                dest_index = int(dest_obj)
-                rinfo = readers[annot_src_reader_index]
-                merged = rinfo["start_page"] + dest_index
-                return generic.ArrayObject([writer.pages[merged].indirect_reference, generic.NameObject("/Fit")])
-        except Exception:
-            pass
+    def merge_structure_trees(self, readers):
+        writer = self.writer
+        NameObject = generic.NameObject
 
-        # Plain named dest
-        try:
-            if isinstance(dest_obj, (generic.NameObject, generic.TextStringObject, str, bytes)):
-                nm = dest_obj
-                if isinstance(nm, bytes):
-                    nm = _decode_pdf_string(nm)
-                for rr_idx, rr in enumerate(readers):
-                    try:
-                        page_num = _resolve_named_dest_to_page(rr["reader"], nm)
-                        if page_num is not None:
-                            merged = rr["start_page"] + page_num
-                            return generic.ArrayObject([writer.pages[merged].indirect_reference, generic.NameObject("/Fit")])
-                    except Exception:
+        root_dict = generic.DictionaryObject()
+        root_ref = writer._add_object(root_dict)
+        document = generic.DictionaryObject({
+            NameObject("/Type"): NameObject("/StructElem"),
+            NameObject("/S"): NameObject("/Document"),
+            NameObject("/P"): root_ref,
+        })
+        doc_ref = writer._add_object(document)
+        doc_kids = generic.ArrayObject()
+
+        nums = []
+        maps = {"/RoleMap": {}, "/ClassMap": {}, "/IDTree": {}}
+        renamed = []
+        untagged = []
+        book_lang = None
+        next_key = 0
+
+        for r_idx, rinfo in enumerate(readers):
+            reader = self.inputs[r_idx]["reader"]
+            src_catalog = reader.trailer["/Root"]
+            if "/StructTreeRoot" not in src_catalog:
+                untagged.append(rinfo["filename"])
+                self._shift_struct_parents(r_idx, None)
+                continue
+
+            # Cloning reuses the page and annotation copies made by add_page,
+            # so /Pg and OBJR references already point into the merged book
+            st_ref = src_catalog.raw_get("/StructTreeRoot").clone(writer)
+            st = st_ref.get_object()
+            self._drop(st_ref)
+
+            chapter_lang = src_catalog.get("/Lang")
+            if book_lang is None and chapter_lang is not None:
+                book_lang = chapter_lang
+
+            entries = []
+            if "/ParentTree" in st:
+                self._tree_entries(st.raw_get("/ParentTree"), "/Nums", entries, set())
+            span = int(st.get("/ParentTreeNextKey", 0) or 0)
+            for key, value in entries:
+                nums.append((int(key) + next_key, value))
+                span = max(span, int(key) + 1)
+            self._shift_struct_parents(r_idx, next_key)
+            next_key += span
+
+            # A role, class or ID that an earlier chapter already defines
+            # differently is renamed for this chapter
+            renames = {}
+            for map_key in ("/RoleMap", "/ClassMap", "/IDTree"):
+                if map_key not in st:
+                    continue
+                if map_key == "/IDTree":
+                    src_entries = []
+                    self._tree_entries(st.raw_get(map_key), "/Names", src_entries, set())
+                else:
+                    src_entries = list(st[map_key].items())
+                    self._drop(st.raw_get(map_key))
+                for name, value in src_entries:
+                    key = str(name)
+                    kept = maps[map_key].setdefault(key, value)
+                    if kept is value or _resolved(kept) == _resolved(value):
                         continue
+                    n = r_idx + 1
+                    while f"{key}_{n}" in maps[map_key]:
+                        n += 1
+                    new_key = f"{key}_{n}"
+                    maps[map_key][new_key] = value
+                    renames.setdefault(_RENAMED_ENTRY[map_key], {})[key] = new_key
+                    renamed.append((map_key, key, new_key, rinfo["filename"]))
+
+            # Each chapter becomes a /Part under the book's single /Document
+            top = st.raw_get("/K") if "/K" in st else None
+            top_elem = top.get_object() if isinstance(top, generic.IndirectObject) else top
+            if isinstance(top_elem, dict) and isinstance(top, generic.IndirectObject):
+                part_ref = top
+                if top_elem.get("/S") == "/Document":
+                    top_elem[NameObject("/S")] = NameObject("/Part")
+            elif top is not None:
+                kids = top_elem if isinstance(top_elem, list) else [top]
+                part = generic.DictionaryObject({
+                    NameObject("/Type"): NameObject("/StructElem"),
+                    NameObject("/S"): NameObject("/Part"),
+                    NameObject("/K"): generic.ArrayObject(kids),
+                })
+                part_ref = writer._add_object(part)
+                for kid in kids:
+                    if isinstance(kid, generic.IndirectObject) and isinstance(kid.get_object(), dict):
+                        kid.get_object()[NameObject("/P")] = part_ref
+                top_elem = part
+            else:
+                continue
+            if renames:
+                _rename_struct_entries(part_ref, renames)
+            top_elem[NameObject("/P")] = doc_ref
+            if chapter_lang is not None and chapter_lang != book_lang and "/Lang" not in top_elem:
+                top_elem[NameObject("/Lang")] = chapter_lang
+            doc_kids.append(part_ref)
+
+        if not doc_kids:
+            self._drop(root_ref)
+            self._drop(doc_ref)
+            return {"tagged": 0, "untagged": untagged, "parent_tree_keys": 0, "renamed": renamed}
+
+        document[NameObject("/K")] = doc_kids
+        nums_array = generic.ArrayObject()
+        for key, value in sorted(nums, key=lambda kv: kv[0]):
+            nums_array.append(generic.NumberObject(key))
+            nums_array.append(value)
+        root_dict.update({
+            NameObject("/Type"): NameObject("/StructTreeRoot"),
+            NameObject("/K"): generic.ArrayObject([doc_ref]),
+            NameObject("/ParentTree"): writer._add_object(
+                generic.DictionaryObject({NameObject("/Nums"): nums_array})),
+            NameObject("/ParentTreeNextKey"): generic.NumberObject(next_key),
+        })
+        for map_key in ("/RoleMap", "/ClassMap"):
+            if maps[map_key]:
+                root_dict[NameObject(map_key)] = generic.DictionaryObject(
+                    {NameObject(k): v for k, v in maps[map_key].items()})
+        if maps["/IDTree"]:
+            names = generic.ArrayObject()
+            for key, value in sorted(maps["/IDTree"].items()):
+                names.append(generic.TextStringObject(key))
+                names.append(value)
+            root_dict[NameObject("/IDTree")] = writer._add_object(
+                generic.DictionaryObject({NameObject("/Names"): names}))
+
+        catalog = writer._root_object
+        catalog[NameObject("/StructTreeRoot")] = root_ref
+        catalog[NameObject("/MarkInfo")] = generic.DictionaryObject(
+            {NameObject("/Marked"): generic.BooleanObject(True)})
+        if book_lang is not None and "/Lang" not in catalog:
+            catalog[NameObject("/Lang")] = generic.TextStringObject(str(book_lang))
+
+        return {"tagged": len(doc_kids), "untagged": untagged,
+                "parent_tree_keys": len(nums), "renamed": renamed}
+
+    # --- outlines ------------------------------------------------------------
+    def read_outline(self, r_idx):
+        catalog = self.inputs[r_idx]["reader"].trailer["/Root"]
+        if "/Outlines" not in catalog:
+            return []
+        seen = set()
+
+        def _items(ref):
+            nodes = []
+            while isinstance(ref, generic.IndirectObject) and ref.idnum not in seen:
+                seen.add(ref.idnum)
+                item = ref.get_object()
+                dest = item.raw_get("/Dest") if "/Dest" in item else None
+                other_action = None
+                if dest is None and "/A" in item:
+                    action = _resolved(item.raw_get("/A"))
+                    if isinstance(action, dict) and action.get("/S") == "/GoTo" and "/D" in action:
+                        dest = action.raw_get("/D")
+                    elif isinstance(action, dict):
+                        # URI / Launch / Named / GoToR...: copied into the book unchanged
+                        other_action = action.clone(self.writer)
+                nodes.append({
+                    "title": _decode_pdf_string(item.get("/Title")) or "",
+                    "dest": dest,
+                    "action": other_action,
+                    "open": int(item.get("/Count", 0) or 0) > 0,
+                    "children": _items(item.raw_get("/First")) if "/First" in item else [],
+                })
+                ref = item.raw_get("/Next") if "/Next" in item else None
+            return nodes
+
+        outlines = catalog["/Outlines"]
+        return _items(outlines.raw_get("/First")) if "/First" in outlines else []
+
+    def document_title(self, r_idx):
+        try:
+            info = self.inputs[r_idx]["reader"].metadata
+            title = info.get("/Title") if info else None
         except Exception:
-            pass
+            return None
+        if not title:
+            return None
+        return _decode_pdf_string(title).strip() or None
 
-        return None
+    def _link_outline_items(self, parent_ref, nodes):
+        """Add `nodes` below `parent_ref`; return the number of visible items."""
+        NameObject = generic.NameObject
+        refs = []
+        for node in nodes:
+            item = generic.DictionaryObject({
+                NameObject("/Title"): generic.TextStringObject(node["title"]),
+                NameObject("/Parent"): parent_ref,
+            })
+            if node["dest"] is not None:
+                item[NameObject("/Dest")] = node["dest"]
+            elif node.get("action") is not None:
+                item[NameObject("/A")] = node["action"]
+            refs.append(self.writer._add_object(item))
+        if not refs:
+            return 0
+        parent = parent_ref.get_object()
+        parent[NameObject("/First")] = refs[0]
+        parent[NameObject("/Last")] = refs[-1]
 
-    # Now walk merged pages and process annotations
-    print("\n=== Post-processing annotations & actions ===")
-    links_updated = 0
-    links_converted = 0
-    links_normalized = 0
-    links_remapped_internal = 0
-
-    for m_idx in range(len(writer.pages)):
-        page = writer.pages[m_idx]
-        # try to find source reader for this merged page (best-effort)
-        src_reader_idx = None
-        for ridx, rinfo in enumerate(readers):
-            if rinfo["start_page"] <= m_idx < rinfo["start_page"] + rinfo["num_pages"]:
-                src_reader_idx = ridx
-                break
+        visible = len(refs)
+        for i, (ref, node) in enumerate(zip(refs, nodes)):
+            item = ref.get_object()
+            if i > 0:
+                item[NameObject("/Prev")] = refs[i - 1]
+            if i < len(refs) - 1:
+                item[NameObject("/Next")] = refs[i + 1]
+            if node["children"]:
+                n = self._link_outline_items(ref, node["children"])
+                item[NameObject("/Count")] = generic.NumberObject(n if node["open"] else -n)
+                if node["open"]:
+                    visible += n
+        return visible
 
-        if "/Annots" not in page:
-            continue
+    def write_outline(self, nodes):
+        NameObject = generic.NameObject
+        root = generic.DictionaryObject({NameObject("/Type"): NameObject("/Outlines")})
+        root_ref = self.writer._add_object(root)
+        count = self._link_outline_items(root_ref, nodes)
+        if count:
+            root[NameObject("/Count")] = generic.NumberObject(count)
+        self.writer._root_object[NameObject("/Outlines")] = root_ref
 
+    # --- annotations & dictionaries ---------------------------------------
+    def iter_link_annots(self, m_idx):
+        page = self.writer.pages[m_idx]
+        if "/Annots" not in page:
+            return
         annots = page["/Annots"]
         if isinstance(annots, generic.IndirectObject):
+            annots = annots.get_object()
+        if not annots:
+            return
+        for a_ref in list(annots):
             try:
-                annots = annots.get_object()
+                annot = a_ref.get_object() if isinstance(a_ref, generic.IndirectObject) else a_ref
+                subtype = annot.get("/Subtype")
             except Exception:
                 continue
-        if not annots:
-            continue
+            if subtype == generic.NameObject("/Link") or str(subtype) == "/Link":
+                yield annot
+
+    def get_action(self, annot):
+        if "/A" not in annot:
+            return None
+        action = annot["/A"]
+        if isinstance(action, generic.IndirectObject):
+            try:
+                action = action.get_object()
+            except Exception:
+                return None
+        return action if isinstance(action, dict) else None
+
+    def has(self, d, key):
+        return key in d
 
+    def get(self, d, key):
+        value = d.raw_get(key) if hasattr(d, "raw_get") else d[key]
+        # destinations and filespecs stay raw: page references must keep their identity
+        if key in ("/Dest", "/D", "/F") or not isinstance(value, generic.IndirectObject):
+            return value
         try:
-            annots_list = list(annots)
+            return value.get_object()
         except Exception:
-            continue
+            return value
 
-        for a_ref in annots_list:
+    def set(self, d, key, value):
+        d[generic.NameObject(key)] = value
+
+    def delete(self, d, key):
+        del d[key]
+
+    def name_of(self, obj):
+        return str(obj) if obj is not None else None
+
+    def text_of(self, obj):
+        if isinstance(obj, generic.IndirectObject):
             try:
-                annot = a_ref.get_object() if isinstance(a_ref, generic.IndirectObject) else a_ref
+                obj = obj.get_object()
             except Exception:
-                continue
+                pass
+        if isinstance(obj, bytes):
+            obj = _decode_pdf_string(obj)
+        return str(obj) if obj is not None else None
+
+    def filespec_filename(self, fspec):
+        return _extract_filespec_filename(fspec)
+
+    # --- shared actions ----------------------------------------------------
+    def action_key(self, action):
+        try:
+            return _canonical_key(action)
+        except Exception:
+            return None
+
+    def share_action(self, annot):
+        ref = annot.raw_get("/A")
+        if not isinstance(ref, generic.IndirectObject):
+            ref = self.writer._add_object(ref)
+            annot[generic.NameObject("/A")] = ref
+        return ref
 
-            # only handle link annotations
+    def use_shared_action(self, annot, shared):
+        old = annot.raw_get("/A")
+        if isinstance(old, generic.IndirectObject) and old.idnum != shared.idnum:
+            self._replaced_actions[old.idnum] = old
+        annot[generic.NameObject("/A")] = shared
+
+    def sweep_replaced_actions(self):
+        # pypdf writes every object it holds, reachable or not
+        if not self._replaced_actions:
+            return 0
+        in_use = set()
+        open_action = self.writer._root_object.raw_get("/OpenAction") if "/OpenAction" in self.writer._root_object else None
+        if isinstance(open_action, generic.IndirectObject):
+            in_use.add(open_action.idnum)
+        for page in self.writer.flattened_pages:
+            annots = _resolved(page.raw_get("/Annots")) if "/Annots" in page else None
+            for a_ref in annots or []:
+                annot = _resolved(a_ref)
+                if isinstance(annot, dict) and "/A" in annot:
+                    ref = annot.raw_get("/A")
+                    if isinstance(ref, generic.IndirectObject):
+                        in_use.add(ref.idnum)
+        dropped = 0
+        for idnum, ref in self._replaced_actions.items():
+            if idnum not in in_use:
+                self._drop(ref)
+                dropped += 1
+        self._replaced_actions = {}
+        return dropped
+
+    # --- destinations ------------------------------------------------------
+    def parse_dest(self, dest_obj):
+        if isinstance(dest_obj, generic.IndirectObject):
             try:
-                subtype = annot.get("/Subtype")
+                target = dest_obj.get_object()
             except Exception:
-                subtype = None
-            if not (subtype == generic.NameObject("/Link") or str(subtype) == "/Link"):
-                continue
+                return None
+            if isinstance(target, (generic.ArrayObject, list)):
+                dest_obj = target
+            else:
+                # bare page reference
+                return ("page", dest_obj, [])
+
+        if isinstance(dest_obj, (generic.ArrayObject, list, tuple)):
+            arr = list(dest_obj)
+            if not arr:
+                return None
+            first, tail = arr[0], arr[1:]
+            if isinstance(first, generic.IndirectObject):
+                return ("page", first, tail)
+            if isinstance(first, (int, float, generic.NumberObject)):
+                return ("number", int(first), tail)
+            if isinstance(first, (generic.NameObject, generic.TextStringObject, str, bytes)):
+                return ("name", _decode_pdf_string(first) if isinstance(first, bytes) else first, tail)
+            return None
+
+        if isinstance(dest_obj, (int, float, generic.NumberObject)):
+            return ("number", int(dest_obj), [])
+        if isinstance(dest_obj, (generic.NameObject, generic.TextStringObject, str, bytes)):
+            return ("name", _decode_pdf_string(dest_obj) if isinstance(dest_obj, bytes) else dest_obj, [])
+        return None
+
+    def _source_of_writer_object(self, idnum):
+        # pypdf clones a page that is referenced before it is added; the
+        # translation table tells us which source object such a copy came from
+        if self._writer_to_source is None:
+            self._writer_to_source = {}
+            translated = getattr(self.writer, "_id_translated", {}) or {}
+            for r_idx, r in enumerate(self.inputs):
+                table = translated.get(id(r["reader"]), {})
+                for src_id, dst_id in table.items():
+                    if isinstance(src_id, int) and isinstance(dst_id, int):
+                        self._writer_to_source[dst_id] = (r_idx, src_id)
+        return self._writer_to_source.get(idnum)
+
+    def locate_page(self, page_obj):
+        if not isinstance(page_obj, generic.IndirectObject):
+            page_obj = getattr(page_obj, "indirect_reference", None)
+            if page_obj is None:
+                return None
+        idnum = page_obj.idnum
+        pdf = getattr(page_obj, "pdf", None)
 
-            # Annot-level /Dest (some links use /Dest instead of /A)
+        if pdf is self.writer:
+            m_idx = self._writer_page_index.get(idnum)
+            if m_idx is not None:
+                r_idx = bisect.bisect_right(self._start_pages, m_idx) - 1
+                return (r_idx, m_idx - self._start_pages[r_idx])
+            src = self._source_of_writer_object(idnum)
+            if src is None:
+                return None
+            r_idx, idnum = src
+        else:
+            r_idx = self._reader_index.get(id(pdf))
+            if r_idx is None:
+                return None
+
+        p_idx = self._src_page_index.get((r_idx, idnum))
+        return (r_idx, p_idx) if p_idx is not None else None
+
+    def resolve_named_dest(self, r_idx, name):
+        if name is None:
+            return None
+        if isinstance(name, bytes):
+            name = _decode_pdf_string(name)
+        reader = self.inputs[r_idx]["reader"]
+        if r_idx not in self._named:
+            # resolve the whole name tree once instead of once per link
+            table = {}
             try:
-                if "/Dest" in annot:
-                    new_dest = _remap_dest(annot["/Dest"], src_reader_idx if src_reader_idx is not None else 0)
-                    if new_dest is not None:
-                        annot[generic.NameObject("/Dest")] = new_dest
-                        links_remapped_internal += 1
-                        print(f"Page {m_idx}: remapped annotation-level /Dest")
+                for key, dest in (reader.named_destinations or {}).items():
+                    try:
+                        pn = reader.get_destination_page_number(dest)
+                    except Exception:
+                        pn = None
+                    if pn is not None and pn >= 0:
+                        table[str(key)] = int(pn)
             except Exception:
-                traceback.print_exc()
+                table = None
+            self._named[r_idx] = table
+        table = self._named[r_idx]
+        if table is None:
+            # older PyPDF2: fall back to the per-name lookup
+            return _resolve_named_dest_to_page(reader, name)
+        return table.get(str(name))
 
-            # Action dictionary
-            if "/A" not in annot:
-                continue
-            action = annot["/A"]
-            if isinstance(action, generic.IndirectObject):
-                try:
-                    action = action.get_object()
-                except Exception:
-                    action = annot["/A"]
+    # --- object construction ------------------------------------------------
+    def make_dest(self, merged_idx, tail=None):
+        ref = self.writer.pages[merged_idx].indirect_reference
+        if tail:
+            return generic.ArrayObject([ref] + list(tail))
+        return generic.ArrayObject([ref, generic.NameObject("/Fit")])
 
-            s_val = action.get("/S")
-            s_type = str(s_val) if s_val is not None else None
+    def make_name(self, name):
+        return generic.NameObject(name)
 
-            # Internal GoTo remap
-            if s_type == "/GoTo":
-                try:
-                    if "/D" in action:
-                        newd = _remap_dest(action["/D"], src_reader_idx if src_reader_idx is not None else 0)
-                        if newd is not None:
-                            action[generic.NameObject("/D")] = newd
-                            links_remapped_internal += 1
-                            links_updated += 1
-                            print(f"Page {m_idx}: remapped internal /GoTo")
-                except Exception:
-                    traceback.print_exc()
+    def make_text(self, text):
+        return generic.TextStringObject(str(text))
 
-            # Remote GoToR handling
-            if s_type == "/GoToR":
-                try:
-                    # Extract and decode filespec /F
-                    target_raw = action.get("/F")
-                    target_fname = _extract_filespec_filename(target_raw) if target_raw is not None else None
-
-                    # If not decoded, try fallback to str()
-                    if target_fname is None and target_raw is not None:
-                        try:
-                            target_fname = str(target_raw)
-                        except Exception:
-                            target_fname = None
-
-                    # Normalize target filename for matching
-                    target_basename = os.path.basename(target_fname) if target_fname else None
-                    target_basename_lower = target_basename.lower() if target_basename else None
-
-                    matched_ridx = None
-
-                    # Match heuristics (ordered): exact basename, basename without ext, target contains filename, substring
-                    if target_basename_lower:
-                        for rr_idx, rr in enumerate(readers):
-                            try:
-                                # exact basename match
-                                if rr["filename"].lower() == target_basename_lower:
-                                    matched_ridx = rr_idx
-                                    break
-                            except Exception:
-                                pass
-
-                    # basename without extension
-                    if matched_ridx is None and target_basename_lower:
-                        tb0 = os.path.splitext(target_basename_lower)[0]
-                        for rr_idx, rr in enumerate(readers):
-                            try:
-                                if os.path.splitext(rr["filename"])[0].lower() == tb0:
-                                    matched_ridx = rr_idx
-                                    break
-                            except Exception:
-                                pass
-
-                    # target contains reader filename (some InDesign references use partial paths)
-                    if matched_ridx is None and target_fname:
-                        tnorm_lower = target_fname.lower()
-                        for rr_idx, rr in enumerate(readers):
-                            try:
-                                if rr["filename"].lower() in tnorm_lower:
-                                    matched_ridx = rr_idx
-                                    break
-                            except Exception:
-                                pass
-
-                    # last: substring of basename (very permissive)
-                    if matched_ridx is None and target_basename_lower:
-                        for rr_idx, rr in enumerate(readers):
-                            try:
-                                if rr["filename"].lower().replace(" ", "") in target_basename_lower.replace(" ", ""):
-                                    matched_ridx = rr_idx
-                                    break
-                            except Exception:
-                                pass
-
-                    # If matched, compute destination page relative to that reader
-                    converted = False
-                    if matched_ridx is not None:
-                        tgt_reader = readers[matched_ridx]
-                        dest_page = 0
-                        # compute dest_page from /D if present
-                        if "/D" in action:
-                            try:
-                                D = action["/D"]
-                                # array style
-                                if isinstance(D, (list, generic.ArrayObject)) and len(D) > 0:
-                                    first_item = D[0]
-                                    # if page object (indirect) referencing target doc's page
-                                    if isinstance(first_item, generic.IndirectObject):
-                                        try:
-                                            page_obj = first_item.get_object()
-                                            for idx, p in enumerate(tgt_reader["reader"].pages):
-                                                if p == page_obj:
-                                                    dest_page = idx
-                                                    break
-                                        except Exception:
-                                            dest_page = 0
-                                    elif isinstance(first_item, (int, float, generic.NumberObject)):
-                                        dest_page = int(first_item)
-                                    elif isinstance(first_item, (generic.NameObject, generic.TextStringObject, str, bytes)):
-                                        # named destination — try to resolve in target reader
-                                        nm = first_item
-                                        if isinstance(nm, bytes):
-                                            nm = _decode_pdf_string(nm)
-                                        try:
-                                            pn = _resolve_named_dest_to_page(tgt_reader["reader"], nm)
-                                            if pn is not None:
-                                                dest_page = int(pn)
-                                        except Exception:
-                                            dest_page = 0
-                                    else:
-                                        dest_page = 0
-                                # if D is number
-                                elif isinstance(D, (int, float, generic.NumberObject)):
-                                    dest_page = int(D)
-                                # if D is namelike
-                                elif isinstance(D, (generic.NameObject, generic.TextStringObject, str, bytes)):
-                                    nm = D
-                                    if isinstance(nm, bytes):
-                                        nm = _decode_pdf_string(nm)
-                                    try:
-                                        pn = _resolve_named_dest_to_page(tgt_reader["reader"], nm)
-                                        if pn is not None:
-                                            dest_page = int(pn)
-                                    except Exception:
-                                        dest_page = 0
-                            except Exception:
-                                dest_page = 0
-
-                        # compute merged page index
-                        try:
-                            new_page = tgt_reader["start_page"] + dest_page
-                            # convert to internal GoTo
-                            action[generic.NameObject('/S')] = generic.NameObject('/GoTo')
-                            action[generic.NameObject('/D')] = generic.ArrayObject([
-                                writer.pages[new_page].indirect_reference,
-                                generic.NameObject('/Fit')
-                            ])
-                            # remove /F
-                            if '/F' in action:
-                                try:
-                                    del action['/F']
-                                except Exception:
-                                    pass
-                            links_updated += 1
-                            links_converted += 1
-                            converted = True
-                            print(f"Page {m_idx}: converted GoToR -> GoTo (target {tgt_reader['filename']} page {dest_page} => merged page {new_page})")
-                        except Exception:
-                            converted = False
-
-                    # If not converted (no match) — normalize /F to direct filespec so it is not an IndirectObject or dangling reference
-                    if not converted:
-                        if target_fname:
-                            try:
-                                fsdict = generic.DictionaryObject()
-                                try:
-                                    fsdict[generic.NameObject("/F")] = generic.TextStringObject(_decode_pdf_string(target_fname))
-                                except Exception:
-                                    fsdict["/F"] = _decode_pdf_string(target_fname)
-                                try:
-                                    fsdict[generic.NameObject("/UF")] = generic.TextStringObject(_decode_pdf_string(target_fname))
-                                except Exception:
-                                    pass
-                                try:
-                                    action[generic.NameObject("/F")] = fsdict
-                                except Exception:
-                                    action["/F"] = fsdict
-                                links_normalized += 1
-                                print(f"Page {m_idx}: normalized external GoToR /F -> {target_fname}")
-                            except Exception:
-                                # unexpected failure; leave as is but log
-                                print(f"[WARN] could not normalize external filespec on merged page {m_idx}, target={target_fname}")
-                                traceback.print_exc()
-                        else:
-                            # no filename decoded — nothing to do but log
-                            print(f"[WARN] GoToR on page {m_idx} had no decodable /F filespec (raw: {repr(target_raw)})")
-                except Exception:
-                    traceback.print_exc()
+    def make_filespec(self, filename):
+        fsdict = generic.DictionaryObject()
+        fsdict[generic.NameObject("/F")] = generic.TextStringObject(_decode_pdf_string(filename))
+        fsdict[generic.NameObject("/UF")] = generic.TextStringObject(_decode_pdf_string(filename))
+        return fsdict
 
-            # URI handling: ensure it's string
-            if s_type == "/URI" and "/URI" in action:
-                try:
-                    uri = action.get("/URI")
-                    if isinstance(uri, generic.IndirectObject):
-                        try:
-                            uri = uri.get_object()
-                        except Exception:
-                            pass
-                    if isinstance(uri, bytes):
-                        uri = _decode_pdf_string(uri)
-                    if uri is not None:
-                        action[generic.NameObject("/URI")] = generic.TextStringObject(str(uri))
-                except Exception:
-                    traceback.print_exc()
 
-    print(f"\nLinks converted: {links_converted}, normalized externals: {links_normalized}, internal remapped: {links_remapped_internal}")
-    print(f"Total link actions updated: {links_updated}")
+MERGE_BACKENDS = ("pypdf", "pikepdf")
 
-    # Save output PDF
-    print("\n=== Saving merged PDF ===")
-    with open(output_path, "wb") as out_f:
-        writer.write(out_f)
-    print(f"Saved to: {output_path}")
 
-    # close source filehandles
-    for r in readers:
-        try:
-            r["fileobj"].close()
-        except Exception:
-            pass
+def get_merge_backend(backend=None):
+    """Backend instance from a name ("pypdf", "pikepdf") or pass an instance through."""
+    if isinstance(backend, MergeBackend):
+        return backend
+    if backend in (None, "pypdf", "PyPDF2"):
+        return PypdfMergeBackend()
+    if backend == "pikepdf":
+        from pikepdf_backend import PikepdfMergeBackend
+        return PikepdfMergeBackend()
+    raise ValueError(f"Unknown merge backend: {backend!r} (expected one of {MERGE_BACKENDS})")
+
+
+def merge_pdfs_preserve_links(pdf_files, output_path, sleep_between_files=0.0, sleep_between_pages=0.0,
+                              dedupe_resources=False, compact_output=False, backend="pypdf", verbose=True,
+                              preserve_structure=False, csv_report=None, merge_outlines=False,
+                              outline_filters=DEFAULT_OUTLINE_FILTERS, inventory=None, linearize=False,
+                              page_tree_fanout=None):
+    """
+    Merge PDFs and preserve/repair internal and external hyperlinks.
+    Uses robust extraction & matching for external GoToR links (based on filename).
+
+    dedupe_resources: write identical fonts / images / ICC profiles / form XObjects
+    shared by several chapters only once (see dedupe_shared_resources). Off by
+    default: it changes the output's object layout.
+    compact_output: pack non-stream objects into object streams and use an xref
+    stream (needs pikepdf); prints size/time against the classic output.
+    backend: "pypdf" (default) or "pikepdf"; the link rules are the same for both
+    (link_remap.LinkRemapper).
+    verbose: print one line per remapped link.
+    preserve_structure: keep the chapters' tags. Their structure trees are
+    combined under one /Document (each chapter becomes a /Part), the
+    StructParents / ParentTree keys are renumbered and the RoleMaps, ClassMaps
+    and IDTrees are unioned (an entry that clashes with an earlier chapter is
+    renamed in that chapter).
+    csv_report: path of a CSV listing every GoToR link converted to GoTo
+    ("Source Page", "Destination Page"; same report as task/1st_step.py), so
+    the merged book does not need a separate link-fixing pass.
+    merge_outlines: build the book outline: one bookmark per input with that
+    input's bookmarks below it (see outline_merge.build_book_outline). Off by
+    default: the output then has no outline, as before.
+    outline_filters: bookmarks whose title matches one of these filters
+    (Bookmark_cleaning/bookmark_filter.py rules: case-insensitive substring,
+    "word:", "re:") are dropped and their children moved up.
+    inventory: link_inventory.LinkInventory (or a database path) that receives
+    every processed link and every unresolved target of this merge.
+    linearize: write the book linearized ("fast web view", with hint tables,
+    needs pikepdf) so a web reader can show the first page before the whole
+    file has downloaded; the result is checked with qpdf's linearization check.
+    page_tree_fanout: write a balanced page tree with at most this many kids per
+    /Pages node (see page_tree.py; pikepdf backend only). None (default) keeps
+    the single flat /Kids array; pypdf and qpdf show no gain from the balanced
+    tree (bench_page_tree.py).
+    """
+    engine = get_merge_backend(backend)
+    own_inventory = None
+    readers = []
+    total_pages = 0
+
+    # Open input PDFs and build readers list (backend keeps file handles open)
+    print(f"=== Opening input PDFs ({engine.name}) ===")
+    try:
+        for path in pdf_files:
+            abs_path = os.path.abspath(path)
+            if not os.path.isfile(abs_path):
+                raise FileNotFoundError(f"Input file not found: {abs_path}")
+            num_pages = engine.open_input(abs_path)
+            filename = os.path.basename(abs_path)
+            rinfo = {
+                "filename": filename,
+                "path": abs_path,
+                "start_page": total_pages,
+                "num_pages": num_pages
+            }
+            readers.append(rinfo)
+            total_pages += num_pages
+            print(f"  {filename}: {num_pages} pages (path: {abs_path})")
+
+        print(f"Total pages expected: {total_pages}")
+
+        # Copy pages into the output
+        print("\n=== Copying pages into writer ===")
+        for r_idx, rinfo in enumerate(readers):
+            engine.append_pages(r_idx, sleep_between_pages=sleep_between_pages)
+            if sleep_between_files:
+                time.sleep(sleep_between_files)
+            print(f"  Added {rinfo['num_pages']} pages from {rinfo['filename']} (merged pages {rinfo['start_page']}..{rinfo['start_page'] + rinfo['num_pages'] - 1})")
+
+        if preserve_structure:
+            print("\n=== Merging structure trees ===")
+            stats = engine.merge_structure_trees(readers)
+            print(f"Structure trees merged: {stats['tagged']} tagged input(s), "
+                  f"{stats['parent_tree_keys']} ParentTree entries")
+            if stats["untagged"]:
+                print(f"[WARN] inputs without tags (left untagged): {', '.join(stats['untagged'])}")
+            for map_key, name, new_name, filename in stats["renamed"]:
+                print(f"  {map_key} {name} of {filename} differs from an earlier input; renamed to {new_name}")
+
+        # Now walk merged pages and process annotations
+        print("\n=== Post-processing annotations & actions ===")
+        if isinstance(inventory, str):
+            inventory = own_inventory = LinkInventory(inventory)
+        if inventory is not None:
+            inventory.start_run("merge", book=os.path.splitext(os.path.basename(output_path))[0],
+                                input_path=os.pathsep.join(r["path"] for r in readers),
+                                output_path=os.path.abspath(output_path))
+        remapper = LinkRemapper(engine, readers, verbose=verbose, inventory=inventory)
+        remapper.run()
+        remapper.print_summary()
+
+        if merge_outlines:
+            print("\n=== Building book outline ===")
+            nodes, stats = build_book_outline(engine, readers, remapper, outline_filters)
+            engine.write_outline(nodes)
+            print(f"Outline: {stats['chapters']} chapter entries, {stats['items']} bookmarks kept, "
+                  f"{stats['filtered']} filtered")
+            if stats["actions"]:
+                print(f"Outline: {stats['actions']} bookmark(s) keep their URI/Launch/Named/GoToR action")
+            if stats["unresolved"]:
+                print(f"[WARN] {stats['unresolved']} bookmark(s) kept without a destination (target page not found)")
+
+        # Collapse resources shared between chapters before writing
+        if dedupe_resources:
+            print("\n=== Deduplicating shared resources ===")
+            stats = engine.dedupe_resources()
+            counts = stats["counts"]
+            if counts:
+                summary = ", ".join(f"{kind}: {n}" for kind, n in sorted(counts.items()))
+                print(f"Removed duplicate objects ({summary}); stream bytes saved: {stats['bytes_saved']}")
+            else:
+                print("No duplicate resources found.")
+
+        if page_tree_fanout and not engine.balances_page_tree:
+            print(f"[WARN] page_tree_fanout needs the pikepdf backend; {engine.name} keeps the flat page tree")
+        elif page_tree_fanout:
+            print("\n=== Balancing page tree ===")
+            stats = engine.balance_page_tree(page_tree_fanout)
+            print(f"Page tree: {stats['pages']} pages under {stats['nodes']} /Pages node(s), "
+                  f"depth {stats['depth']}, fan-out <= {page_tree_fanout}")
+            if stats["pages"] != total_pages:
+                print(f"[WARN] page tree holds {stats['pages']} pages, expected {total_pages}")
+
+        # Save output PDF
+        print("\n=== Saving merged PDF ===")
+        engine.save(output_path, compact=compact_output, linearize=linearize)
+        print(f"Saved to: {output_path}")
+
+        if csv_report:
+            export_csv_report(remapper.report_rows, csv_report)
+    finally:
+        # close source filehandles
+        engine.close()
+        if own_inventory is not None:
+            own_inventory.close()
+        elif inventory is not None:
+            inventory.flush()
 
     return True
 
@@ -610,11 +1151,19 @@ if __name__ == "__main__":
         r"C:\Users\is6076\Downloads\merge\09_9780443184529_ind.pdf",
     ]
     output_path = r"C:\Users\is6076\Downloads\merge\merged_with_links_improved.pdf"
+    csv_report = os.path.splitext(output_path)[0] + "_link_report.csv"
 
     try:
         ok = merge_pdfs_preserve_links(pdf_files, output_path,
                                        sleep_between_files=0.0,
-                                       sleep_between_pages=0.0)
+                                       sleep_between_pages=0.0,
+                                       dedupe_resources=False,
+                                       compact_output=False,
+                                       linearize=False,
+                                       merge_outlines=False,
+                                       backend="pypdf",
+                                       preserve_structure=True,
+                                       csv_report=csv_report)
         if ok:
             print("\n" + "="*60)
             print("SUCCESS: PDFs merged with hyperlinks preserved/converted.")